@@ -0,0 +1,13 @@
+#!/usr/bin/env python
+""" Headless BlueSky batch runner start script
+
+    Usage: python BlueSky_batch.py [-n WORKERS] [--max-time SEC] file1.scn file2.scn ...
+"""
+from __future__ import print_function
+import sys
+from bluesky.simulation import runner
+
+
+if __name__ == '__main__':
+    # Run the scenario files passed on the command line
+    sys.exit(0 if runner.main() else 1)
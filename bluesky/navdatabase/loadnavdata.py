@@ -29,15 +29,15 @@ sourcedir = settings.navdata_path
 
 def load_coastlines():
     ''' Load coastline data for gui. '''
-    with cachefile.openfile('coastlines.p', coast_version) as cache:
-        try:
-            coastvertices = cache.load()
-            coastindices = cache.load()
-        except (pickle.PickleError, cachefile.CacheError) as e:
-            print(e.args[0])
-            coastvertices, coastindices = load_coastline_txt()
-            cache.dump(coastvertices)
-            cache.dump(coastindices)
+    cache = cachefile.opendir('coastlines', coast_version)
+    try:
+        coastdata = cache.load()['coast']
+        coastvertices = coastdata['vertices']
+        coastindices = coastdata['indices']
+    except (OSError, ValueError, KeyError, cachefile.CacheError) as e:
+        print(e)
+        coastvertices, coastindices = load_coastline_txt()
+        cache.dump(dict(coast=dict(vertices=coastvertices, indices=coastindices)))
 
     return coastvertices, coastindices
 
@@ -71,25 +71,22 @@ def load_aptsurface():
 
 def load_navdata():
     ''' Load navigation database. '''
-    with cachefile.openfile('navdata.p', navdb_version) as cache:
-        try:
-            wptdata       = cache.load()
-            awydata       = cache.load()
-            aptdata       = cache.load()
-            firdata       = cache.load()
-            codata        = cache.load()
-            rwythresholds = cache.load()
-        except (pickle.PickleError, cachefile.CacheError) as e:
-            print(e.args[0])
-
-            wptdata, aptdata, awydata, firdata, codata = load_navdata_txt()
-            rwythresholds = navdata_load_rwythresholds()
-
-            cache.dump(wptdata)
-            cache.dump(awydata)
-            cache.dump(aptdata)
-            cache.dump(firdata)
-            cache.dump(codata)
-            cache.dump(rwythresholds)
+    cache = cachefile.opendir('navdata', navdb_version)
+    try:
+        tables = cache.load()
+        wptdata       = tables['wpt']
+        awydata       = tables['awy']
+        aptdata       = tables['apt']
+        firdata       = tables['fir']
+        codata        = tables['co']
+        rwythresholds = tables['rwy']['thresholds']
+    except (OSError, ValueError, KeyError, pickle.PickleError, cachefile.CacheError) as e:
+        print(e)
+
+        wptdata, aptdata, awydata, firdata, codata = load_navdata_txt()
+        rwythresholds = navdata_load_rwythresholds()
+
+        cache.dump(dict(wpt=wptdata, awy=awydata, apt=aptdata, fir=firdata,
+                        co=codata, rwy=dict(thresholds=rwythresholds)))
 
     return wptdata, aptdata, awydata, firdata, codata, rwythresholds
@@ -2,9 +2,9 @@ from math import *
 import numpy as np
 
 from .loadnavdata import load_navdata
+from .navindex import NameIndex, GridIndex
 from bluesky.tools import geo
 from bluesky.tools.aero import nm
-from bluesky.tools.misc import findall
 import bluesky as bs
 
 class Navdatabase:
@@ -57,6 +57,7 @@ class Navdatabase:
         self.wpvar    = wptdata['wpvar']      # magn variation [deg]
         self.wpfreq   = wptdata['wpfreq']       # frequency [kHz/MHz]
         self.wpdesc   = wptdata['wpdesc']     # description
+        self.nwploaded = len(self.wpid)       # number of loaded (not user-defined) waypoints
 
         # Get airway legs data
         self.awfromwpid = awydata['awfromwpid']  # identifier (string)
@@ -95,6 +96,28 @@ class Navdatabase:
 
         self.rwythresholds = rwythresholds
 
+        # Name and spatial indexes, built on first use
+        self.wpindex    = NameIndex(self.wpid)
+        self.aptindex   = NameIndex(self.aptid)
+        self.awindex    = NameIndex(self.awid)
+        self.awfromindex = NameIndex(self.awfromwpid)
+        self.awtoindex  = NameIndex(self.awtowpid)
+        self.wpgrid     = GridIndex()
+        self.aptgrid    = GridIndex()
+
+    def reset_userdata(self):
+        """Remove the user-defined waypoints (DEFWPT), but keep the loaded
+           navigation data, to reset without reloading it."""
+        n = self.nwploaded
+        if len(self.wpid) == n:
+            return
+        for lst in (self.wpid, self.wptype, self.wpelev, self.wpvar,
+                    self.wpfreq, self.wpdesc):
+            del lst[n:]
+        self.wplat = self.wplat[:n]
+        self.wplon = self.wplon[:n]
+        self.wpindex = NameIndex(self.wpid)
+
     def defwpt(self,name=None,lat=None,lon=None,wptype=None):
 
         # Prevent polluting the database: check arguments
@@ -106,7 +129,7 @@ class Navdatabase:
         # No data: give info on waypoint
         elif lat==None or lon==None:
             reflat, reflon = bs.scr.getviewctr()
-            if self.wpid.count(name.upper()) > 0:
+            if name.upper() in self.wpindex:
                 i = self.getwpidx(name.upper(),reflat,reflon)
                 txt = self.wpid[i]+" : "+str(self.wplat[i])+","+str(self.wplon[i])
                 if len(self.wptype[i]+self.wpco[i])>0:
@@ -119,6 +142,7 @@ class Navdatabase:
 
         # Still here? So there is data, then we add this waypoint
         self.wpid.append(name.upper())
+        self.wpindex.add(name.upper(), len(self.wpid) - 1)
         self.wplat = np.append(self.wplat,lat)
         self.wplon = np.append(self.wplon,lon)
 
@@ -139,82 +163,40 @@ class Navdatabase:
 
     def getwpidx(self, txt, reflat=999999., reflon=999999):
         """Get waypoint index to access data"""
-        name = txt.upper()
-        try:
-            i = self.wpid.index(name)
-        except:
+        idx = self.wpindex.find(txt.upper())
+        if not idx:
             return -1
 
-        # if no pos is specified, get first occurence
-        if not reflat < 99999.:
-            return i
+        # if no pos is specified, or there is only one, get first occurence
+        if not reflat < 99999. or len(idx) == 1:
+            return idx[0]
 
-        # If pos is specified check for more and return closest
-        else:
-            idx = []
-            idx.append(i)
-            found = True
-            while i < len(self.wpid) - 1 and found:
-                try:
-                    i = self.wpid.index(name, i + 1)
-                    idx.append(i)
-                except:
-                    found = False
-            if len(idx) == 1:
-                return idx[0]
-            else:
-                imin = idx[0]
-                dmin = geo.kwikdist(reflat, reflon, self.wplat[imin], self.wplon[imin])
-                for i in idx[1:]:
-                    d = geo.kwikdist(reflat, reflon, self.wplat[i], self.wplon[i])
-                    if d < dmin:
-                        imin = i
-                        dmin = d
-                return imin
+        # If pos is specified return closest
+        d = geo.kwikdist(reflat, reflon, self.wplat[idx], self.wplon[idx])
+        return idx[np.argmin(d)]
 
     def getwpindices(self, txt, reflat=999999., reflon=999999,crit=1852.0):
         """Get waypoint index to access data"""
-        name = txt.upper()
-        try:
-            i = self.wpid.index(name)
-        except:
+        idx = self.wpindex.find(txt.upper())
+        if not idx:
             return [-1]
 
-        # if no pos is specified, get first occurence
-        if not reflat < 99999.:
-            return [i]
+        # if no pos is specified, or there is only one, get first occurence
+        if not reflat < 99999. or len(idx) == 1:
+            return [idx[0]]
 
-        # If pos is specified check for more and return closest
-        else:
-            idx = findall(self.wpid,name) # find indices of al occurences
+        # If pos is specified return closest
+        d = geo.kwikdist(reflat, reflon, self.wplat[idx], self.wplon[idx])
+        imin = idx[np.argmin(d)]
 
-            if len(idx) == 1:
-                return [idx[0]]
-            else:
-                imin = idx[0]
-                dmin = geo.kwikdist(reflat, reflon, self.wplat[imin], self.wplon[imin])
-                for i in idx[1:]:
-                    d = geo.kwikdist(reflat, reflon, self.wplat[i], self.wplon[i])
-                    if d < dmin:
-                        imin = i
-                        dmin = d
-                # Find co-located
-                indices = [imin]
-                for i in idx:
-                    if i!=imin:
-                        dist = nm*geo.kwikdist(self.wplat[i], self.wplon[i], \
-                                            self.wplat[imin], self.wplon[imin])
-                        if dist<=crit:
-                            indices.append(i)
-
-                return indices
+        # Find co-located
+        dist = nm * geo.kwikdist(self.wplat[idx], self.wplon[idx],
+                                 self.wplat[imin], self.wplon[imin])
+        return [imin] + [i for i, di in zip(idx, dist) if i != imin and di <= crit]
 
     def getaptidx(self, txt):
         """Get waypoint index to access data"""
-        try:
-            return self.aptid.index(txt.upper())
-        except:
-            return -1
+        return self.aptindex.first(txt.upper())
 
     def getinear(self, wlat, wlon, lat, lon):  # lat,lon in degrees
         # t0 = time.clock()
@@ -229,11 +211,17 @@ class Navdatabase:
 
     def getwpinear(self, lat, lon):  # lat,lon in degrees
         """Get closest waypoint index"""
-        return self.getinear(self.wplat, self.wplon, lat, lon)
+        idx = self.wpgrid.nearest(self.wplat, self.wplon, lat, lon)
+        if idx is None:
+            return self.getinear(self.wplat, self.wplon, lat, lon)
+        return idx
 
     def getapinear(self, lat, lon):  # lat,lon in degrees
         """Get closest airport index"""
-        return self.getinear(self.aptlat, self.aptlon, lat, lon)
+        idx = self.aptgrid.nearest(self.aptlat, self.aptlon, lat, lon)
+        if idx is None:
+            return self.getinear(self.aptlat, self.aptlon, lat, lon)
+        return idx
 
     def getinside(self, wlat, wlon, lat0, lat1, lon0, lon1):
         """Get indices inside given box"""
@@ -249,10 +237,18 @@ class Navdatabase:
 
     def getwpinside(self, lat0, lat1, lon0, lon1):
         """Get waypoint indices inside box"""
+        if lat0 < lat1:
+            idx = self.wpgrid.inside(self.wplat, self.wplon, lat0, lat1, lon0, lon1)
+            if idx is not None:
+                return list(idx)
         return self.getinside(self.wplat, self.wplon, lat0, lat1, lon0, lon1)
 
     def getapinside(self, lat0, lat1, lon0, lon1):
         """Get airport indicex inside box"""
+        if lat0 < lat1:
+            idx = self.aptgrid.inside(self.aptlat, self.aptlon, lat0, lat1, lon0, lon1)
+            if idx is not None:
+                return list(idx)
         return self.getinside(self.aptlat, self.aptlon, lat0, lat1, lon0, lon1)
 
     # returns all runways of given airport
@@ -262,7 +258,7 @@ class Navdatabase:
         airway = []     # identifier of waypoint   0 .. N-1
 
         # Does this airway exist?
-        if self.awid.count(awkey)>0:
+        if awkey in self.awindex:
             # Collect leg indices
             i = 0
             found = True
@@ -270,7 +266,7 @@ class Navdatabase:
             left  = []  # wps in left column in file
             right = []  # wps in right coumn in file
 
-            idx = findall(self.awid,awkey)
+            idx = self.awindex.find(awkey)
             for i in idx:
                 newleg = self.awfromwpid[i]+"-"+self.awtowpid[i]
                 if newleg not in legs:
@@ -354,8 +350,8 @@ class Navdatabase:
         connect = []
 
         # Check from-list first
-        if wpid in self.awfromwpid:
-            idx = findall(self.awfromwpid,wpid)
+        if wpid in self.awfromindex:
+            idx = self.awfromindex.find(wpid)
             for i in idx:
                 newitem = [self.awid[i],self.awtowpid[i]]
                 if (newitem not in connect) and \
@@ -364,8 +360,8 @@ class Navdatabase:
                     connect.append(newitem)
 
         # Check to-list nextt
-        if wpid in self.awtowpid:
-            idx = findall(self.awtowpid,wpid)
+        if wpid in self.awtoindex:
+            idx = self.awtoindex.find(wpid)
             for i in idx:
                 newitem = [self.awid[i],self.awfromwpid[i]]
                 if (newitem not in connect) and \
@@ -0,0 +1,141 @@
+''' Name and spatial indexes for the navigation database.
+
+    Both indexes are built on first use, so that they don't add to the
+    start-up time of the simulation when they are not used. '''
+from math import cos, radians
+import numpy as np
+
+
+class NameIndex:
+    ''' Hash index of a list of names: name -> ascending list of indices. '''
+    def __init__(self, names):
+        self.names = names
+        self.index = None
+
+    def _build(self):
+        self.index = index = dict()
+        for i, name in enumerate(self.names):
+            if name in index:
+                index[name].append(i)
+            else:
+                index[name] = [i]
+
+    def add(self, name, i):
+        ''' Add name at index i of the list (i.e., after it is appended). '''
+        if self.index is not None:
+            self.index.setdefault(name, []).append(i)
+
+    def find(self, name):
+        ''' Indices of all occurences of name (an empty list if not found). '''
+        if self.index is None:
+            self._build()
+        return list(self.index.get(name, []))
+
+    def first(self, name):
+        ''' Index of the first occurence of name, or -1 if not found. '''
+        if self.index is None:
+            self._build()
+        idx = self.index.get(name)
+        return idx[0] if idx else -1
+
+    def count(self, name):
+        if self.index is None:
+            self._build()
+        return len(self.index.get(name, []))
+
+    def __contains__(self, name):
+        return self.first(name) >= 0
+
+
+class GridIndex:
+    ''' Spatial index of points on a lat/lon grid.
+
+        The index is kept for the first n points of the lat/lon arrays that
+        are passed to the queries. Points that are added to these arrays
+        later on (e.g., with DEFWPT) are checked one by one, until there
+        are more than maxextra of them, and the index is rebuilt.
+
+        Arguments:
+        - cellsize: size of the grid cells [deg], should divide 180
+        - maxextra: number of added points before the index is rebuilt '''
+    def __init__(self, cellsize=1.0, maxextra=1000):
+        self.cellsize = cellsize
+        self.maxextra = maxextra
+        self.nlat = int(round(180.0 / cellsize))
+        self.nlon = 2 * self.nlat
+        self.n = -1
+        self.order = self.keys = None
+
+    def cells(self, lat, lon):
+        ''' Grid cell indices of the given position(s). '''
+        ilat = np.clip(np.floor((np.asarray(lat) + 90.0) / self.cellsize), 0, self.nlat - 1)
+        ilon = np.clip(np.floor((np.asarray(lon) + 180.0) / self.cellsize), 0, self.nlon - 1)
+        return ilat.astype(np.int64), ilon.astype(np.int64)
+
+    def update(self, wlat, wlon):
+        ''' (Re)build the index when necessary. '''
+        if self.n < 0 or len(wlat) < self.n or len(wlat) - self.n > self.maxextra:
+            ilat, ilon = self.cells(wlat, wlon)
+            keys = ilat * self.nlon + ilon
+            self.order = np.argsort(keys, kind='stable')
+            self.keys = keys[self.order]
+            self.n = len(wlat)
+
+    def lookup(self, ilat, ilon):
+        ''' Indices of the indexed points in the given cells. '''
+        keys = np.asarray(ilat, dtype=np.int64) * self.nlon + ilon
+        lo = np.searchsorted(self.keys, keys, 'left')
+        cnt = np.searchsorted(self.keys, keys, 'right') - lo
+        ntot = cnt.sum()
+        # Expand the [lo, lo + cnt) ranges to individual points
+        return self.order[np.arange(ntot) + np.repeat(lo - np.cumsum(cnt) + cnt, cnt)]
+
+    def nearest(self, wlat, wlon, lat, lon, maxring=10):
+        ''' Index of the point closest to lat, lon, in the same (flat earth)
+            distance measure as Navdatabase.getinear, and with the same
+            result (the lowest index in case of a tie). The grid is searched
+            in rings of cells around the position until no closer point can
+            be found outside the searched cells, or until maxring, after
+            which all points are searched. Returns None if this doesn't
+            find a point either. '''
+        self.update(wlat, wlon)
+        f = cos(radians(lat))
+        qi, qj = self.cells(lat, lon)
+        best = np.arange(self.n, len(wlat))
+        for k in range(maxring + 1):
+            # The cells of ring k around the position
+            di, dj = np.mgrid[-k:k + 1, -k:k + 1]
+            onring = np.maximum(np.abs(di), np.abs(dj)) == k
+            ilat, ilon = qi + di[onring], (qj + dj[onring]) % self.nlon
+            inside = (ilat >= 0) * (ilat < self.nlat)
+            cells = np.unique(ilat[inside] * self.nlon + ilon[inside])
+            idx = np.concatenate((best, self.lookup(cells // self.nlon, cells % self.nlon)))
+            if len(idx):
+                dlat = (wlat[idx] - lat + 180.) % 360. - 180.
+                dlon = f * ((wlon[idx] - lon + 180.) % 360. - 180.)
+                d2 = dlat * dlat + dlon * dlon
+                best = idx[d2 == d2.min()]
+                # Points outside the searched cells are at least this far away
+                dmin = k * self.cellsize * f * (1.0 - 1e-9)
+                if d2.min() < dmin * dmin:
+                    return best.min()
+            if 2 * k + 1 >= self.nlon and qi - k <= 0 and qi + k >= self.nlat - 1:
+                return best.min() if len(best) else None
+        return None
+
+    def inside(self, wlat, wlon, lat0, lat1, lon0, lon1, maxcells=10000):
+        ''' Indices of the points inside the given box, in the same way as
+            Navdatabase.getinside, for lat0 < lat1. Returns None when
+            the box covers more than maxcells grid cells. '''
+        self.update(wlat, wlon)
+        ilat0, ilon0 = self.cells(lat0, lon0)
+        ilat1, ilon1 = self.cells(lat1, lon1)
+        if lon0 >= lon1:
+            ilon1 = ilon0 - 1
+        if (ilat1 - ilat0 + 1) * (ilon1 - ilon0 + 1) > maxcells:
+            return None
+        ilat, ilon = np.mgrid[ilat0:ilat1 + 1, ilon0:ilon1 + 1]
+        idx = np.concatenate((self.lookup(ilat.ravel(), ilon.ravel()),
+                              np.arange(self.n, len(wlat))))
+        sel = (wlat[idx] > lat0) * (wlat[idx] < lat1) * (wlon[idx] > lon0) * (wlon[idx] < lon1)
+        return np.sort(idx[sel])
@@ -0,0 +1,137 @@
+''' Encoding and decoding of the ACDATA stream.
+
+    ACDATA messages are dicts with aircraft data, sent at the aircraft update
+    rate of the simulation. To limit the size of these messages:
+    - Per-aircraft floats are sent in single precision.
+    - Static fields (the aircraft ids, and the ASAS and transition level
+      settings) are only sent when they change. The ids are sent when the
+      traffic generation counter changes (when aircraft are created or
+      deleted). Messages that contain all (selected) static fields are
+      key frames. A key frame is also sent periodically, so clients that
+      (re)connect can fill their cache.
+    - Clients can select the fields they use with an ACFIELDS event. The
+      stream is shared by all clients, so the union of the selections is sent.
+    - Clients can register a region of interest with an ACROI event. They
+      get their own stream, with only the aircraft in the region, and a
+      coarse density summary of the aircraft outside it.
+'''
+import numpy as np
+
+# Version of the ACDATA protocol
+VERSION = 2
+
+# Fields that are sent only when they change
+STATIC_FIELDS = ['id', 'vmin', 'vmax', 'translvl']
+
+# Per-aircraft fields that are sent in single precision
+FLOAT_FIELDS = ['lat', 'lon', 'alt', 'tas', 'cas', 'gs', 'trk', 'vs',
+                'tcpamax', 'asasn', 'asase']
+
+# Other per-aircraft fields, and the trail segments
+OTHER_FIELDS = ['ingroup', 'inconf', 'trails']
+
+ALL_FIELDS = STATIC_FIELDS + FLOAT_FIELDS + OTHER_FIELDS
+
+
+class ACDataEncoder:
+    ''' Simulation side of the ACDATA stream. '''
+    def __init__(self, keyframe_interval=5):
+        # Number of messages between periodic key frames
+        self.keyframe_interval = keyframe_interval
+        self.client_fields = dict()
+        self.reset()
+
+    def reset(self):
+        self.sent = dict()
+        self.generation = None
+        self.sel = None
+        self.gen = 0
+        self.count = 0
+
+    def subscribe(self, client_id, fields):
+        ''' Set the fields that client_id uses, and send a key frame. '''
+        self.client_fields[client_id] = set(fields)
+        self.generation = None
+
+    def fields(self):
+        ''' The selected fields: the union of the client selections, or all
+            fields when no client has made a selection. '''
+        if not self.client_fields:
+            return set(ALL_FIELDS)
+        return set.union(*self.client_fields.values())
+
+    def encode(self, generation, static, pertraf, other, sel=None):
+        ''' Make an ACDATA message.
+            Arguments:
+            - generation: traffic generation counter
+            - static: dict with the static fields
+            - pertraf: dict with the per-aircraft fields
+            - other: dict with fields that are always sent
+            - sel: indices of the aircraft to send (default all) '''
+        fields = self.fields()
+        # The ids only change with the traffic generation and the selection
+        changed = generation != self.generation or sel is not None and \
+            (self.sel is None or not np.array_equal(sel, self.sel))
+        if changed:
+            self.gen += 1
+        keyframe = changed or self.count % self.keyframe_interval == 0
+        self.count += 1
+        self.generation = generation
+        self.sel = sel
+
+        data = dict(other)
+        data['ver'] = VERSION
+        data['gen'] = self.gen
+        data['key'] = keyframe
+        for name, value in static.items():
+            if name in fields and (keyframe or name != 'id' and value != self.sent.get(name)):
+                if name == 'id' and sel is not None:
+                    value = [value[i] for i in sel]
+                data[name] = value
+                self.sent[name] = value
+
+        for name, value in pertraf.items():
+            if name in fields:
+                if sel is not None:
+                    value = np.asarray(value)[sel]
+                data[name] = np.asarray(value, dtype=np.float32) \
+                    if name in FLOAT_FIELDS else value
+        return data
+
+
+class ACDataDecoder:
+    ''' Client side of the ACDATA stream: keeps the static fields. '''
+    def __init__(self):
+        self.static = dict()
+        self.generation = None
+
+    def decode(self, data):
+        ''' Complete an ACDATA message with the static fields of earlier
+            messages. Returns None when the static fields of this message
+            are not known yet, i.e., until the next key frame. '''
+        if data.get('ver', 1) < VERSION:
+            return data
+        if data['key']:
+            self.generation = data['gen']
+        elif data['gen'] != self.generation:
+            return None
+        for name in STATIC_FIELDS:
+            if name in data:
+                self.static[name] = data[name]
+            elif name in self.static:
+                data[name] = self.static[name]
+        return data
+
+
+
+def density(lat, lon, cellsize):
+    ''' Coarse density summary: the centre coordinates of the cells of a
+        lat/lon grid with cell size cellsize [deg] that contain aircraft,
+        and the number of aircraft in these cells. '''
+    nlon = int(np.ceil(360.0 / cellsize))
+    ilat = np.floor((np.asarray(lat) + 90.0) / cellsize).astype(int)
+    ilon = np.floor((np.asarray(lon) + 180.0) % 360.0 / cellsize).astype(int)
+    cells, count = np.unique(ilat * nlon + ilon, return_counts=True)
+    return ((cells // nlon + 0.5) * cellsize - 90.0).astype(np.float32), \
+        ((cells % nlon + 0.5) * cellsize - 180.0).astype(np.float32), \
+        count.astype(np.int32)
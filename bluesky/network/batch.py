@@ -0,0 +1,118 @@
+''' Scheduling of batch scenarios over the simulation nodes of a server. '''
+import time
+import heapq
+from itertools import count
+
+
+def split_scenarios(scentime, scencmd):
+    ''' Split the contents of a batch file into individual scenarios. '''
+    start = 0
+    for i in range(1, len(scencmd) + 1):
+        if i == len(scencmd) or scencmd[i][:4] == 'SCEN':
+            scenname = scencmd[start].split()[1].strip()
+            yield dict(name=scenname, scentime=scentime[start:i], scencmd=scencmd[start:i])
+            start = i
+
+
+def scenario_cost(scen):
+    ''' Estimate the cost of running a scenario, from its number of commands,
+        its number of created aircraft, and its simulated duration. Each
+        aircraft costs one unit per simulated second, each command one unit. '''
+    scentime = scen['scentime']
+    duration = scentime[-1] - scentime[0] if scentime else 0.0
+    ncre = sum(1 for cmd in scen['scencmd'] if cmd.lstrip()[:3].upper() == 'CRE')
+    return len(scentime) + max(1, ncre) * duration
+
+
+class BatchScheduler:
+    ''' Dispatches the scenarios of a batch to the nodes, with the most
+        expensive scenarios first, and keeps track of their status.
+
+        Scenarios of nodes that die while running them are queued again, up
+        to maxretries times, after which they are marked as failed.
+
+        Arguments:
+        - maxretries: number of times a scenario is retried '''
+    def __init__(self, maxretries=2):
+        self.maxretries = maxretries
+        self.clear()
+
+    def clear(self):
+        ''' Forget the current batch. '''
+        self.queue = []
+        self.seq = count()
+        self.status = []
+        self.running = dict()
+        self.tstart = None
+
+    def __len__(self):
+        ''' The number of scenarios that wait to be dispatched. '''
+        return len(self.queue)
+
+    def load(self, scentime, scencmd):
+        ''' Replace the batch with the scenarios of a batch file.
+            Returns the number of scenarios in the batch. '''
+        self.clear()
+        self.tstart = time.time()
+        for scen in split_scenarios(scentime, scencmd):
+            status = dict(name=scen['name'], cost=scenario_cost(scen),
+                          state='queued', node=None, retries=0,
+                          tstart=None, walltime=None, simt=None)
+            self.status.append(status)
+            self.push(scen, status)
+        return len(self.status)
+
+    def push(self, scen, status):
+        heapq.heappush(self.queue, (-status['cost'], next(self.seq), scen, status))
+
+    def next(self, node_id):
+        ''' Take the next scenario to run on node node_id, or None when
+            there are no more scenarios to run. '''
+        if not self.queue:
+            return None
+        scen, status = heapq.heappop(self.queue)[2:]
+        status.update(state='running', node=node_id, tstart=time.time())
+        self.running[node_id] = (scen, status)
+        return scen
+
+    def finished(self, node_id, simt=None):
+        ''' The scenario that ran on node node_id is finished. '''
+        scen, status = self.running.pop(node_id, (None, None))
+        if status:
+            status.update(state='done', walltime=time.time() - status['tstart'], simt=simt)
+
+    def failed(self, node_id):
+        ''' Node node_id died: queue its scenario again (or mark it as failed).
+            Returns True when the scenario is queued again. '''
+        scen, status = self.running.pop(node_id, (None, None))
+        if not status:
+            return False
+        if status['retries'] >= self.maxretries:
+            status.update(state='failed', walltime=time.time() - status['tstart'])
+            return False
+        status['retries'] += 1
+        status.update(state='queued', node=None, tstart=None)
+        self.push(scen, status)
+        return True
+
+    def count(self, state):
+        ''' Number of scenarios in the given state. '''
+        return sum(1 for status in self.status if status['state'] == state)
+
+    def report(self):
+        ''' Progress and throughput of the current batch. '''
+        if not self.status:
+            return 'No batch simulation running'
+        done = [s for s in self.status if s['state'] == 'done']
+        elapsed = time.time() - self.tstart
+        speeds = [s['simt'] / s['walltime'] for s in done if s['simt'] and s['walltime'] > 0.0]
+        lines = ['Batch: {} of {} scenarios done, {} running, {} queued, {} failed'.format(
+            len(done), len(self.status), self.count('running'), self.count('queued'),
+            self.count('failed'))]
+        lines.append('Elapsed {:.0f} s, {:.1f} scenarios/hour, mean speed {}'.format(
+            elapsed, 3600.0 * len(done) / max(elapsed, 1e-9),
+            '{:.1f}x real time'.format(sum(speeds) / len(speeds)) if speeds else 'n/a'))
+        for status in self.status:
+            if status['state'] == 'failed':
+                lines.append('Failed: {} ({} retries)'.format(status['name'], status['retries']))
+        return '\n'.join(lines)
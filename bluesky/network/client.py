@@ -5,7 +5,7 @@ import msgpack
 import bluesky
 from bluesky.tools import Signal
 from bluesky.network.discovery import Discovery
-from bluesky.network.npcodec import encode_ndarray, decode_ndarray
+from bluesky.network.npcodec import encode_ndarray, decode_ndarray, decode_frames
 
 
 class Client(object):
@@ -116,11 +116,12 @@ class Client(object):
                     self.event(eventname, pydata, self.sender_id)
 
             if socks.get(self.stream_in) == zmq.POLLIN:
-                msg = self.stream_in.recv_multipart()
-
-                strmname = msg[0][:-5]
-                sender_id = msg[0][-5:]
-                pydata = msgpack.unpackb(msg[1], object_hook=decode_ndarray, encoding='utf-8')
+                # Receive without copying: arrays are decoded as views on the frames
+                msg = self.stream_in.recv_multipart(copy=False)
+                topic = msg[0].bytes
+                strmname = topic[:-5]
+                sender_id = topic[-5:]
+                pydata = decode_frames(msg[1:])
                 self.stream(strmname, pydata, sender_id)
 
             # If we are in discovery mode, parse this message
@@ -38,5 +38,8 @@ class Node(object):
     def send_event(self, eventname, data=None, target=None):
         pass
 
+    def subscribed(self, name):
+        return False
+
     def send_stream(self, name, data):
         pass
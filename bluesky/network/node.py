@@ -5,7 +5,7 @@ import msgpack
 import bluesky
 from bluesky import stack
 from bluesky.tools import Timer
-from bluesky.network.npcodec import encode_ndarray, decode_ndarray
+from bluesky.network.npcodec import encode_ndarray, decode_ndarray, encode_frames
 
 
 class Node(object):
@@ -15,7 +15,9 @@ class Node(object):
         self.running = True
         ctx = zmq.Context.instance()
         self.event_io = ctx.socket(zmq.DEALER)
-        self.stream_out = ctx.socket(zmq.PUB)
+        # The stream socket also receives the subscriptions of the clients
+        self.stream_out = ctx.socket(zmq.XPUB)
+        self.subscriptions = set()
         self.event_port = event_port
         self.stream_port = stream_port
         # Tell bluesky that this client will manage the network I/O
@@ -43,6 +45,16 @@ class Node(object):
                     data, object_hook=decode_ndarray, encoding='utf-8')
                 self.event(eventname, pydata, route)
 
+        # Keep track of the streams that clients subscribe to. The server
+        # only forwards the first subscription and the last unsubscription
+        # of a topic, also when a client leaves.
+        while self.stream_out.getsockopt(zmq.EVENTS) & zmq.POLLIN:
+            msg = self.stream_out.recv()
+            if msg[:1] == b'\x01':
+                self.subscriptions.add(msg[1:])
+            else:
+                self.subscriptions.discard(msg[1:])
+
     def connect(self):
         ''' Connect node to the BlueSky server. '''
         # Initialization of sockets.
@@ -50,8 +62,9 @@ class Node(object):
         self.event_io.connect('tcp://localhost:{}'.format(self.event_port))
         self.stream_out.connect('tcp://localhost:{}'.format(self.stream_port))
 
-        # Start communication, and receive this node's ID
-        self.send_event(b'REGISTER')
+        # Start communication, and receive this node's ID. The process id
+        # is sent along, so that the server can detect when this node dies
+        self.send_event(b'REGISTER', os.getpid())
         self.host_id = self.event_io.recv_multipart()[0]
         # print('Node connected, id={}'.format(self.node_id))
 
@@ -75,5 +88,11 @@ class Node(object):
         pydata = msgpack.packb(data, default=encode_ndarray, use_bin_type=True)
         self.event_io.send_multipart(target + [eventname, pydata])
 
+    def subscribed(self, name):
+        ''' True when a client subscribes to stream name of this node. '''
+        topic = name + self.node_id
+        return any(topic.startswith(sub) for sub in self.subscriptions)
+
     def send_stream(self, name, data):
-        self.stream_out.send_multipart([name + self.node_id, msgpack.packb(data, default=encode_ndarray, use_bin_type=True)])
+        # Array data is sent in separate frames, without copying
+        self.stream_out.send_multipart([name + self.node_id] + encode_frames(data), copy=False)
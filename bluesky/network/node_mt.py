@@ -4,7 +4,7 @@ import zmq
 import msgpack
 from bluesky import stack
 from bluesky.tools import Timer
-from bluesky.network.npcodec import encode_ndarray, decode_ndarray
+from bluesky.network.npcodec import encode_ndarray, decode_ndarray, encode_frames
 
 class IOThread(Thread):
     ''' Separate thread for node I/O. '''
@@ -122,4 +122,5 @@ class Node(object):
         self.event_io.send_multipart([stack.sender() or b'*', name, msgpack.packb(data, default=encode_ndarray, use_bin_type=True)])
 
     def send_stream(self, name, data):
-        self.stream_out.send_multipart([name + self.node_id, msgpack.packb(data, default=encode_ndarray, use_bin_type=True)])
+        # Array data is sent in separate frames, without copying
+        self.stream_out.send_multipart([name + self.node_id] + encode_frames(data), copy=False)
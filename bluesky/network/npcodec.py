@@ -1,16 +1,75 @@
+''' Msgpack encoding and decoding of data with numpy arrays.
+
+    Two encodings are supported:
+    - encode_ndarray/decode_ndarray: msgpack hooks that embed the array
+      data in the msgpack message. Used for event messages.
+    - encode_frames/decode_frames: the array data is sent as separate
+      (ZMQ) frames after the msgpack header, which only contains the dtype,
+      shape and frame number of each array. The arrays can then be sent
+      without copying them into the msgpack message (zmq copy=False), and
+      decoded as views on the received frames (np.frombuffer). Used for
+      stream messages. Arrays smaller than FRAME_THRESHOLD bytes are
+      embedded in the msgpack header instead: for these, the overhead of
+      extra frames outweighs the copy.
+'''
+import msgpack
 import numpy as np
 
+# Minimum size [bytes] of arrays that are sent in a separate frame
+FRAME_THRESHOLD = 32768
+
+
 def encode_ndarray(o):
     '''Msgpack encoder for numpy arrays.'''
     if isinstance(o, np.ndarray):
         return {b'numpy': True,
                 b'type': o.dtype.str,
                 b'shape': o.shape,
-                b'data': o.tobytes()}
+                b'data': np.ascontiguousarray(o).data}
     return o
 
 def decode_ndarray(o):
     '''Msgpack decoder for numpy arrays.'''
     if o.get(b'numpy'):
-        return np.fromstring(o[b'data'], dtype=np.dtype(o[b'type'])).reshape(o[b'shape'])
+        return np.frombuffer(o[b'data'], dtype=np.dtype(o[b'type'])).reshape(o[b'shape'])
     return o
+
+def encode_frames(data, threshold=FRAME_THRESHOLD):
+    ''' Encode data into a list of frames: a msgpack header, followed by the
+        buffers of the numpy arrays in data of at least threshold bytes.
+        Smaller arrays are embedded in the header.
+
+        Arrays that don't own their data (e.g., views on the traffic arrays)
+        are copied, because the simulation can change them before the frames
+        are actually sent. Other arrays are passed as they are: they
+        shouldn't be changed after they are sent. '''
+    frames = []
+
+    def encode(o):
+        if isinstance(o, np.ndarray):
+            if o.nbytes < threshold:
+                return encode_ndarray(o)
+            if not (o.flags.owndata and o.flags.c_contiguous):
+                o = o.copy()
+            frames.append(o)
+            return {b'numpy': True,
+                    b'type': o.dtype.str,
+                    b'shape': o.shape,
+                    b'frame': len(frames)}
+        return o
+
+    header = msgpack.packb(data, default=encode, use_bin_type=True)
+    return [header] + frames
+
+def decode_frames(frames):
+    ''' Decode a list of frames made with encode_frames. Frames can be bytes
+        or zmq.Frame objects. Arrays are read-only views on the frames. '''
+    frames = [getattr(frame, 'buffer', frame) for frame in frames]
+
+    def decode(o):
+        if o.get(b'numpy'):
+            buf = frames[o[b'frame']] if b'frame' in o else o[b'data']
+            return np.frombuffer(buf, dtype=np.dtype(o[b'type'])).reshape(o[b'shape'])
+        return o
+
+    return msgpack.unpackb(frames[0], object_hook=decode, raw=False)
@@ -11,22 +11,14 @@ import msgpack
 import bluesky as bs
 
 from .discovery import Discovery
+from .batch import BatchScheduler
 
 
 # Register settings defaults
 bs.settings.set_variable_defaults(max_nnodes=cpu_count(),
                                   event_port=9000, stream_port=9001,
                                   simevent_port=10000, simstream_port=10001,
-                                  enable_discovery=False)
-
-def split_scenarios(scentime, scencmd):
-    ''' Split the contents of a batch file into individual scenarios. '''
-    start = 0
-    for i in range(1, len(scencmd) + 1):
-        if i == len(scencmd) or scencmd[i][:4] == 'SCEN':
-            scenname = scencmd[start].split()[1].strip()
-            yield dict(name=scenname, scentime=scentime[start:i], scencmd=scencmd[start:i])
-            start = i
+                                  enable_discovery=False, batch_maxretries=2)
 
 
 class Server(Thread):
@@ -37,12 +29,13 @@ class Server(Thread):
         self.spawned_processes = list()
         self.running = True
         self.max_nnodes = min(cpu_count(), bs.settings.max_nnodes)
-        self.scenarios = []
+        self.scenarios = BatchScheduler(bs.settings.batch_maxretries)
         self.host_id = b'\x00' + os.urandom(4)
         self.clients = []
         self.workers = []
         self.servers = {self.host_id : dict(route=[], nodes=self.workers)}
         self.avail_workers = dict()
+        self.worker_pids = dict()
 
         if bs.settings.enable_discovery or headless:
             self.discovery = Discovery(self.host_id, is_client=False)
@@ -51,10 +44,46 @@ class Server(Thread):
 
     def sendScenario(self, worker_id):
         # Send a new scenario to the target sim process
-        scen = self.scenarios.pop(0)
+        scen = self.scenarios.next(worker_id)
         data = msgpack.packb(scen)
         self.be_event.send_multipart([worker_id, self.host_id, b'BATCH', data])
 
+    def dispatch(self):
+        ''' Send scenarios to available nodes (nodes that are in init or hold mode). '''
+        while self.avail_workers and self.scenarios:
+            worker_id = next(iter(self.avail_workers))
+            self.sendScenario(worker_id)
+            self.avail_workers.pop(worker_id)
+
+    def nodeschanged(self):
+        ''' Notify clients of a change in the nodes of this server. '''
+        data = msgpack.packb({self.host_id : self.servers[self.host_id]}, use_bin_type=True)
+        for client_id in self.clients:
+            self.fe_event.send_multipart([client_id, self.host_id, b'NODESCHANGED', data])
+
+    def checknodes(self):
+        ''' Check for local nodes that died. Their batch scenarios are queued
+            again, and they are replaced by new nodes when there are still
+            scenarios left. '''
+        died = [p for p in self.spawned_processes if p.poll() is not None]
+        if not died:
+            return
+        for p in died:
+            self.spawned_processes.remove(p)
+            worker_id = next((w for w, pid in self.worker_pids.items() if pid == p.pid), None)
+            if worker_id is None:
+                continue
+            print('Node {} exited with code {}'.format(worker_id, p.returncode))
+            self.worker_pids.pop(worker_id)
+            self.avail_workers.pop(worker_id, None)
+            if worker_id in self.workers:
+                self.workers.remove(worker_id)
+            self.scenarios.failed(worker_id)
+        self.nodeschanged()
+        self.dispatch()
+        reqd_nnodes = min(len(self.scenarios), max(0, self.max_nnodes - len(self.workers)))
+        self.addnodes(reqd_nnodes)
+
     def addnodes(self, count=1):
         ''' Add [count] nodes to this server. '''
         for _ in range(count):
@@ -98,11 +127,14 @@ class Server(Thread):
 
         while self.running:
             try:
-                events = dict(poller.poll(None))
+                # Poll with a timeout, to regularly check on the local nodes
+                events = dict(poller.poll(1000))
             except zmq.ZMQError:
                 print('ERROR while polling')
                 break  # interrupted
 
+            self.checknodes()
+
             # The socket with incoming data
             for sock, event in events.items():
                 if event != zmq.POLLIN:
@@ -149,9 +181,11 @@ class Server(Thread):
                             src.send_multipart([sender_id, self.host_id, b'NODESCHANGED', data])
                         else:
                             self.workers.append(sender_id)
-                            data = msgpack.packb({self.host_id : self.servers[self.host_id]}, use_bin_type=True)
-                            for client_id in self.clients:
-                                dest.send_multipart([client_id, self.host_id, b'NODESCHANGED', data])
+                            # Nodes send their process id, to detect when they die
+                            pid = msgpack.unpackb(data)
+                            if pid:
+                                self.worker_pids[sender_id] = pid
+                            self.nodeschanged()
                         continue # No message needs to be forwarded
 
                     elif eventname == b'NODESCHANGED':
@@ -174,8 +208,10 @@ class Server(Thread):
                         continue # No message needs to be forwarded
 
                     elif eventname == b'STATECHANGE':
-                        state = msgpack.unpackb(data)
+                        state, simt = msgpack.unpackb(data)
                         if state < bs.OP:
+                            # A node that stops running has finished its scenario
+                            self.scenarios.finished(sender_id, simt)
                             # If we have batch scenarios waiting, send
                             # the worker a new scenario, otherwise store it in
                             # the available worker list
@@ -194,17 +230,13 @@ class Server(Thread):
 
                     elif eventname == b'BATCH':
                         scentime, scencmd = msgpack.unpackb(data, encoding='utf-8')
-                        self.scenarios = [scen for scen in split_scenarios(scentime, scencmd)]
                         # Check if the batch list contains scenarios
-                        if not self.scenarios:
+                        if not self.scenarios.load(scentime, scencmd):
                             echomsg = 'No scenarios defined in batch file!'
                         else:
                             echomsg = 'Found {} scenarios in batch'.format(len(self.scenarios))
                             # Send scenario to available nodes (nodes that are in init or hold mode):
-                            while self.avail_workers and self.scenarios:
-                                worker_id = next(iter(self.avail_workers))
-                                self.sendScenario(worker_id)
-                                self.avail_workers.pop(worker_id)
+                            self.dispatch()
 
                             # If there are still scenarios left, determine and
                             # start the required number of local nodes
@@ -214,6 +246,12 @@ class Server(Thread):
                         eventname = b'ECHO'
                         data = msgpack.packb(dict(text=echomsg, flags=0), use_bin_type=True)
 
+                    elif eventname == b'BATCHSTAT':
+                        # ECHO the progress of the batch to the calling client
+                        eventname = b'ECHO'
+                        data = msgpack.packb(dict(text=self.scenarios.report(), flags=0),
+                                             use_bin_type=True)
+
                     # ============================================================
                     # If we get here there is a message that needs to be forwarded
                     # Cycle the route by one step to get the next hop in the route
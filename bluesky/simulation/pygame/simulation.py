@@ -134,6 +134,9 @@ class Simulation:
         return False, "Batch comand not available in Pygame version," + \
                  "use Qt-version for batch simulations"
 
+    def batchstat(self):
+        return self.batch('')
+
     def addnodes(self, count):
         return
 
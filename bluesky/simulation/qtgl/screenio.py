@@ -6,6 +6,7 @@ import numpy as np
 import bluesky as bs
 from bluesky import stack
 from bluesky.tools import Timer, areafilter
+from bluesky.network.acdata import ACDataEncoder, density
 
 
 class ScreenIO(object):
@@ -20,6 +21,14 @@ class ScreenIO(object):
     # Update rate of aircraft update messages [Hz]
     acupdate_rate = 5
 
+    # Margin around the view of clients with a region of interest, as a
+    # fraction of the view size
+    roi_margin = 0.5
+
+    # Grid cell size of the density summary of aircraft outside the region
+    # of interest [deg]
+    roi_cellsize = 1.0
+
     # =========================================================================
     # Functions
     # =========================================================================
@@ -31,12 +40,27 @@ class ScreenIO(object):
         self.client_pan  = dict()
         self.client_zoom = dict()
         self.client_ar   = dict()
+        self.client_filteralt = dict()
+        self.def_filteralt = False
         self.route_acid  = dict()
+        # Aircraft of the navigation display and with a state-space diagram
+        self.client_nd   = dict()
+        self.def_nd      = ''
+        self.client_ssd  = dict()
+        self.def_ssd     = set()
 
         # Dicts of custom aircraft and group colors
         self.custacclr = dict()
         self.custgrclr = dict()
 
+        # Encoder of the aircraft data stream, with a key frame every second,
+        # and the encoders of the clients with a region of interest. The
+        # clients of which the stream was subscribed are kept, to drop
+        # their region of interest when they leave.
+        self.acencoder = ACDataEncoder(self.acupdate_rate)
+        self.client_roi = dict()
+        self.roi_subscribed = set()
+
         # Timing bookkeeping counters
         self.prevtime    = 0.0
         self.samplecount = 0
@@ -62,6 +86,9 @@ class ScreenIO(object):
         self.samplecount = 0
         self.prevcount   = 0
         self.prevtime    = 0.0
+        self.acencoder.reset()
+        for encoder in self.client_roi.values():
+            encoder.reset()
 
         # Communicate reset to gui
         bs.sim.send_event(b'RESET', b'ALL')
@@ -76,9 +103,9 @@ class ScreenIO(object):
     def getviewctr(self):
         return self.client_pan.get(stack.sender()) or self.def_pan
 
-    def getviewbounds(self):
+    def getviewbounds(self, sender=None):
         # Get appropriate lat/lon/zoom/aspect ratio
-        sender   = stack.sender()
+        sender   = sender or stack.sender()
         lat, lon = self.client_pan.get(sender) or self.def_pan
         zoom     = self.client_zoom.get(sender) or self.def_zoom
         ar       = self.client_ar.get(sender) or 1.0
@@ -109,7 +136,7 @@ class ScreenIO(object):
             groupmask = bs.traf.groups.groups[name]
             data['groupid'] = groupmask
             self.custgrclr[groupmask] = (r, g, b)
-        elif name in bs.traf.id:
+        elif name in bs.traf.idindex:
             data['acid'] = name
             self.custacclr[name] = (r, g, b)
         elif areafilter.hasArea(name):
@@ -151,17 +178,42 @@ class ScreenIO(object):
         bs.sim.send_event(b'PANZOOM', dict(pan=(lat,lon), absolute=absolute))
 
     def shownd(self, acid):
+        # Keep the aircraft of the navigation display in the regions of interest
+        sender = stack.sender()
+        if sender:
+            self.client_nd[sender] = acid
+        else:
+            self.def_nd = acid
+            self.client_nd.clear()
         bs.sim.send_event(b'SHOWND', acid)
 
     def symbol(self):
         bs.sim.send_event(b'DISPLAYFLAG', dict(flag='SYM'))
 
     def feature(self, switch, argument=None):
+        if switch == 'SSD':
+            self.showssd(argument)
         bs.sim.send_event(b'DISPLAYFLAG', dict(flag=switch, args=argument))
 
     def trails(self,sw):
         bs.sim.send_event(b'DISPLAYFLAG', dict(flag='TRAIL', args=sw))
 
+    def showssd(self, args):
+        ''' Keep track of the aircraft with a state-space diagram, which are
+            also kept in the regions of interest. '''
+        sender = stack.sender()
+        ownship = self.client_ssd.get(sender, self.def_ssd)
+        if 'OFF' in args:
+            ownship = set()
+        elif 'ALL' not in args and 'CONFLICTS' not in args:
+            # Toggle the SSD of the given aircraft
+            ownship = ownship.symmetric_difference(args)
+        if sender:
+            self.client_ssd[sender] = ownship
+        else:
+            self.def_ssd = ownship
+            self.client_ssd.clear()
+
     def showroute(self, acid):
         ''' Toggle show route for this aircraft '''
         self.route_acid[stack.sender()] = acid
@@ -180,6 +232,13 @@ class ScreenIO(object):
         bs.sim.send_event(b'SHOWDIALOG', dict(dialog='DOC', args=cmd))
 
     def filteralt(self, *args):
+        # Also keep the altitude filter for the regions of interest
+        sender = stack.sender()
+        if sender:
+            self.client_filteralt[sender] = args[0] and args[1:]
+        else:
+            self.def_filteralt = args[0] and args[1:]
+            self.client_filteralt.clear()
         bs.sim.send_event(b'DISPLAYFLAG', dict(flag='FILTERALT', args=args))
 
     def objappend(self, objtype, objname, data):
@@ -199,6 +258,23 @@ class ScreenIO(object):
             self.client_zoom[sender_rte[-1]] = eventdata['zoom']
             self.client_ar[sender_rte[-1]]   = eventdata['ar']
             return True
+        if eventname == b'ACFIELDS':
+            self.acencoder.subscribe(sender_rte[-1], eventdata)
+            if sender_rte[-1] in self.client_roi:
+                self.client_roi[sender_rte[-1]].subscribe(sender_rte[-1], eventdata)
+            return True
+        if eventname == b'ACROI':
+            # Switch the region of interest stream of this client on or off
+            if eventdata:
+                encoder = ACDataEncoder(self.acupdate_rate)
+                fields = self.acencoder.client_fields.get(sender_rte[-1])
+                if fields:
+                    encoder.subscribe(sender_rte[-1], fields)
+                self.client_roi[sender_rte[-1]] = encoder
+            else:
+                self.client_roi.pop(sender_rte[-1], None)
+                self.roi_subscribed.discard(sender_rte[-1])
+            return True
 
         return False
 
@@ -217,49 +293,111 @@ class ScreenIO(object):
     def send_aircraft_data(self):
         data = dict()
         data['simt']       = bs.sim.simt
-        data['id']         = bs.traf.id
-        data['lat']        = bs.traf.lat
-        data['lon']        = bs.traf.lon
-        data['alt']        = bs.traf.alt
-        data['tas']        = bs.traf.tas
-        data['cas']        = bs.traf.cas
-        data['gs']         = bs.traf.gs
-        data['ingroup']    = bs.traf.groups.ingroup
-        data['inconf'] = bs.traf.asas.inconf
-        data['tcpamax'] = bs.traf.asas.tcpamax
         data['nconf_cur'] = len(bs.traf.asas.confpairs_unique)
         data['nconf_tot'] = len(bs.traf.asas.confpairs_all)
         data['nlos_cur'] = len(bs.traf.asas.lospairs_unique)
         data['nlos_tot'] = len(bs.traf.asas.lospairs_all)
-        data['trk']        = bs.traf.trk
-        data['vs']         = bs.traf.vs
-        data['vmin']       = bs.traf.asas.vmin
-        data['vmax']       = bs.traf.asas.vmax
 
         # Trails, send only new line segments to be added
-        data['swtrails']  = bs.traf.trails.active
-        data['traillat0'] = bs.traf.trails.newlat0
-        data['traillon0'] = bs.traf.trails.newlon0
-        data['traillat1'] = bs.traf.trails.newlat1
-        data['traillon1'] = bs.traf.trails.newlon1
+        if 'trails' in self.acencoder.fields():
+            data['swtrails']  = bs.traf.trails.active
+            data['traillat0'] = bs.traf.trails.newlat0
+            data['traillon0'] = bs.traf.trails.newlon0
+            data['traillat1'] = bs.traf.trails.newlat1
+            data['traillon1'] = bs.traf.trails.newlon1
+
+            # Last segment which is being built per aircraft
+            data['traillastlat']   = bs.traf.trails.lastlat
+            data['traillastlon']   = bs.traf.trails.lastlon
         bs.traf.trails.clearnew()
 
-        # Last segment which is being built per aircraft
-        data['traillastlat']   = bs.traf.trails.lastlat
-        data['traillastlon']   = bs.traf.trails.lastlon
-
-        # Transition level as defined in traf
-        data['translvl']   = bs.traf.translvl
+        # Fields that only need to be sent when they change. The transition
+        # level is as defined in traf
+        static = dict()
+        static['id']         = bs.traf.id
+        static['vmin']       = bs.traf.asas.vmin
+        static['vmax']       = bs.traf.asas.vmax
+        static['translvl']   = bs.traf.translvl
+
+        pertraf = dict()
+        pertraf['lat']        = bs.traf.lat
+        pertraf['lon']        = bs.traf.lon
+        pertraf['alt']        = bs.traf.alt
+        pertraf['tas']        = bs.traf.tas
+        pertraf['cas']        = bs.traf.cas
+        pertraf['gs']         = bs.traf.gs
+        pertraf['ingroup']    = bs.traf.groups.ingroup
+        pertraf['inconf']     = bs.traf.asas.inconf
+        pertraf['tcpamax']    = bs.traf.asas.tcpamax
+        pertraf['trk']        = bs.traf.trk
+        pertraf['vs']         = bs.traf.vs
 
         # ASAS resolutions for visualization. Only send when evaluated
         if bs.traf.asas.asaseval:
-            data['asasn']  = bs.traf.asas.asasn
-            data['asase']  = bs.traf.asas.asase
+            pertraf['asasn']  = bs.traf.asas.asasn
+            pertraf['asase']  = bs.traf.asas.asase
         else:
-            data['asasn']  = np.zeros(bs.traf.ntraf, dtype=np.float32)
-            data['asase']  = np.zeros(bs.traf.ntraf, dtype=np.float32)
-
-        bs.sim.send_stream(b'ACDATA', data)
+            pertraf['asasn']  = np.zeros(bs.traf.ntraf, dtype=np.float32)
+            pertraf['asase']  = np.zeros(bs.traf.ntraf, dtype=np.float32)
+
+        # Clients with a region of interest get their own stream. The stream
+        # name doesn't start with ACDATA, so that subscribers of the shared
+        # stream don't get it.
+        for client, encoder in list(self.client_roi.items()):
+            if bs.net.subscribed(b'ROIDATA' + client):
+                self.roi_subscribed.add(client)
+            elif client in self.roi_subscribed:
+                # The client left
+                self.leave(client)
+                continue
+            inroi = self.roi_mask(client)
+            outside = np.logical_not(inroi)
+            sel = np.flatnonzero(inroi)
+            roidata = dict(data)
+            # The last trail segments are per aircraft, like lat and lon
+            for name in ('traillastlat', 'traillastlon'):
+                if name in data:
+                    roidata[name] = np.asarray(data[name])[sel]
+            roidata['denslat'], roidata['denslon'], roidata['denscount'] = \
+                density(bs.traf.lat[outside], bs.traf.lon[outside], self.roi_cellsize)
+            bs.sim.send_stream(b'ROIDATA' + client, encoder.encode(
+                bs.traf.generation, static, pertraf, roidata, sel))
+
+        # The shared stream is only needed when it is subscribed, which isn't
+        # the case when all clients get their own stream
+        if bs.net.subscribed(b'ACDATA'):
+            bs.sim.send_stream(b'ACDATA', self.acencoder.encode(
+                bs.traf.generation, static, pertraf, data))
+
+    def leave(self, client):
+        ''' Forget the region of interest and the aircraft data fields of a
+            client that left. '''
+        self.client_roi.pop(client, None)
+        self.roi_subscribed.discard(client)
+        self.acencoder.client_fields.pop(client, None)
+
+    def roi_mask(self, client):
+        ''' Aircraft in the region of interest of client: its view with a
+            margin, within its altitude filter, and the aircraft of which it
+            shows the route, the navigation display, or the state-space
+            diagram. '''
+        lat0, lat1, lon0, lon1 = self.getviewbounds(client)
+        dlat = self.roi_margin * (lat1 - lat0)
+        dlon = self.roi_margin * (lon1 - lon0)
+        lat0, lat1, lon0, lon1 = lat0 - dlat, lat1 + dlat, lon0 - dlon, lon1 + dlon
+        mask = (bs.traf.lat >= lat0) & (bs.traf.lat <= lat1)
+        if lon1 - lon0 < 360.0:
+            mask &= (bs.traf.lon - lon0) % 360.0 <= lon1 - lon0
+
+        filteralt = self.client_filteralt.get(client, self.def_filteralt)
+        if filteralt:
+            mask &= (bs.traf.alt >= filteralt[0]) & (bs.traf.alt <= filteralt[1])
+
+        acids = [self.route_acid.get(client, ''), self.client_nd.get(client, self.def_nd)]
+        acids.extend(self.client_ssd.get(client, self.def_ssd))
+        idx = np.array(bs.traf.id2idx([acid.upper() for acid in acids]), dtype=int)
+        mask[idx[idx >= 0]] = True
+        return mask
 
     def send_route_data(self):
         for sender, acid in self.route_acid.items():
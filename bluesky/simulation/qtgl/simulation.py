@@ -90,7 +90,7 @@ def Simulation(detached):
                 if self.syst < 0.0:
                     self.syst = time.time()
 
-                if bs.traf.ntraf > 0 or len(stack.get_scendata()[0]) > 0:
+                if bs.traf.ntraf > 0 or len(stack.scenqueue) > 0:
                     self.op()
                     if self.benchdt > 0.0:
                         self.fastforward(self.benchdt)
@@ -146,7 +146,10 @@ def Simulation(detached):
             self.syst = time.time()
             self.state = bs.HOLD
 
-        def reset(self):
+        def reset(self, keepnavdb=False):
+            ''' Reset the simulation. With keepnavdb, the loaded navigation
+                data is kept, and only the user-defined waypoints are
+                removed. '''
             self.state = bs.INIT
             self.syst = -1.0
             self.simt = 0.0
@@ -156,7 +159,10 @@ def Simulation(detached):
             self.ffmode = False
             self.setDtMultiplier(1.0)
             plugin.reset()
-            bs.navdb.reset()
+            if keepnavdb:
+                bs.navdb.reset_userdata()
+            else:
+                bs.navdb.reset()
             bs.traf.reset()
             stack.reset()
             datalog.reset()
@@ -192,7 +198,7 @@ def Simulation(detached):
             self.benchdt = dt
 
         def sendState(self):
-            self.send_event(b'STATECHANGE', self.state)
+            self.send_event(b'STATECHANGE', (self.state, self.simt))
 
         def batch(self, filename):
             # The contents of the scenario file are meant as a batch list: send to server and clear stack
@@ -203,6 +209,11 @@ def Simulation(detached):
                 self.reset()
             return result
 
+        def batchstat(self):
+            # Progress of the batch simulation is kept by the server
+            self.send_event(b'BATCHSTAT')
+            return True
+
         def event(self, eventname, eventdata, sender_rte):
             # Keep track of event processing
             event_processed = False
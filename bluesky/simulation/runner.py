@@ -0,0 +1,137 @@
+''' Headless batch runner: runs scenario files in parallel worker processes
+    on one machine, without a server and networked simulation nodes.
+
+    The navigation database, performance coefficients and other data are
+    loaded only once, in the main process. When the platform supports it,
+    each scenario runs in a fresh (copy-on-write) fork of this initialised
+    process. Otherwise, or when reuse is selected, each worker is initialised
+    once, and reset between scenarios. '''
+from __future__ import print_function
+import os
+import time
+import argparse
+import traceback
+import multiprocessing as mp
+from functools import partial
+
+import bluesky as bs
+from bluesky import stack
+from bluesky.tools import datalog
+
+
+def init(cfgfile=''):
+    ''' Initialise a detached simulation in this process. '''
+    bs.init('sim-detached', cfgfile=cfgfile)
+    # Process the start-up commands, so that all scenarios start from this state
+    stack.process()
+
+
+def finished(maxsimt=None):
+    ''' Check whether the current scenario is finished: when the simulation
+        is held or ended, when there is no traffic and there are no more
+        commands to process, or when the simulation time reaches maxsimt. '''
+    if bs.sim.state in (bs.HOLD, bs.END):
+        return True
+    if maxsimt is not None and bs.sim.simt >= maxsimt:
+        return True
+    return bs.traf.ntraf == 0 and not len(stack.scenqueue) and not stack.cmdstack
+
+
+def run(fname, maxsimt=None, reset=True):
+    ''' Run scenario file fname in fast time until it is finished.
+        Returns a dict with the scenario name, the simulated time, the wall
+        time, and an error text (empty when successful). '''
+    tstart = time.time()
+    result = dict(scenario=fname, simt=0.0, walltime=0.0, error='')
+    try:
+        if reset:
+            # Keep the navigation database that was loaded by init
+            bs.sim.reset(keepnavdb=True)
+        success = stack.openfile(fname)
+        if success is not True:
+            result['error'] = success[1]
+        else:
+            while True:
+                bs.sim.step()
+                # The simulation is started in real time: switch to fast time
+                if bs.sim.state == bs.OP and not bs.sim.ffmode:
+                    bs.sim.fastforward()
+                if finished(maxsimt):
+                    break
+    except Exception:
+        result['error'] = traceback.format_exc()
+
+    result['simt'] = bs.sim.simt
+    try:
+        # Close the logs and wait until they are written: forked workers
+        # exit without running the exit handlers, and pools are terminated
+        datalog.reset()
+    except Exception:
+        result['error'] += traceback.format_exc()
+    result['walltime'] = time.time() - tstart
+    return result
+
+
+def run_all(fnames, nworkers=None, maxsimt=None, cfgfile='', reuse=False):
+    ''' Run the scenario files fnames on nworkers processes.
+        Yields the result of each scenario (see run) when it is finished. '''
+    nworkers = nworkers or mp.cpu_count()
+    fork = 'fork' in mp.get_all_start_methods()
+    if fork or nworkers <= 1:
+        # Load all data once, in this process
+        init(cfgfile)
+
+    if nworkers <= 1:
+        for fname in fnames:
+            yield run(fname, maxsimt)
+        return
+
+    if fork:
+        # Forked workers start from the initialised state of this process.
+        # Unless they are reused, each scenario gets a fresh fork.
+        pool = mp.get_context('fork').Pool(nworkers, maxtasksperchild=None if reuse else 1)
+        runscn = partial(run, maxsimt=maxsimt, reset=reuse)
+    else:
+        pool = mp.get_context('spawn').Pool(nworkers, initializer=init, initargs=(cfgfile,))
+        runscn = partial(run, maxsimt=maxsimt, reset=True)
+
+    try:
+        for result in pool.imap_unordered(runscn, fnames):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def main(args=None):
+    ''' Command-line entry point of the batch runner. '''
+    parser = argparse.ArgumentParser(
+        description='Run BlueSky scenario files headless, in parallel worker processes.')
+    parser.add_argument('scenarios', nargs='+', help='Scenario (.scn) files')
+    parser.add_argument('-n', '--workers', type=int, default=mp.cpu_count(),
+                        help='Number of worker processes (default: number of cpus)')
+    parser.add_argument('--max-time', type=float, default=None,
+                        help='Maximum simulated time per scenario [s]')
+    parser.add_argument('--reuse', action='store_true',
+                        help='Reset and reuse workers instead of forking one per scenario')
+    parser.add_argument('--config-file', default='', help='Alternative configuration file')
+    args = parser.parse_args(args)
+
+    # Files that exist relative to the working directory are passed with
+    # their full path, others are looked up in the scenario folder
+    fnames = [os.path.abspath(f) if os.path.isfile(f) else f for f in args.scenarios]
+
+    tstart = time.time()
+    nfailed = 0
+    for result in run_all(fnames, args.workers, args.max_time, args.config_file, args.reuse):
+        if result['error']:
+            nfailed += 1
+            print('FAILED {}:\n{}'.format(result['scenario'], result['error']))
+        else:
+            print('{}: {:.0f} s simulated in {:.1f} s'.format(
+                result['scenario'], result['simt'], result['walltime']))
+
+    elapsed = time.time() - tstart
+    print('{} scenarios ({} failed) in {:.1f} s: {:.1f} scenarios/hour'.format(
+        len(fnames), nfailed, elapsed, 3600.0 * len(fnames) / max(elapsed, 1e-9)))
+    return nfailed == 0
@@ -0,0 +1,148 @@
+''' Scenario files and the scenario command queue.
+
+    Scenario files are parsed once into an array of command times and a
+    string table of commands. This parsed form is cached in a __scncache__
+    folder next to the scenario file, and is used as long as the scenario
+    file is not changed.
+
+    Commands are dispatched from a priority queue, so adding commands (from
+    PCALL, SCHEDULE and DELAY) and taking the next due command are
+    O(log n). Commands with the same time are dispatched in the order in
+    which they are added. '''
+import os
+import heapq
+import zipfile
+from itertools import count
+import numpy as np
+
+# Version of the cached scenario format
+CACHE_VERSION = 1
+
+
+def parseline(line):
+    ''' Split a scenario file line in its time [s] and command.
+        Returns None for comments, empty lines and syntax errors. '''
+    # Skip emtpy lines and comments
+    if len(line.strip()) < 12 or line.strip()[0] == "#":
+        return None
+
+    # Try reading timestamp and command
+    try:
+        icmdline = line.index('>')
+        ttxt = line[:icmdline].strip().split(':')
+        cmdtime = int(ttxt[0]) * 3600.0 + int(ttxt[1]) * 60.0 + float(ttxt[2])
+        return cmdtime, line[icmdline + 1:].strip("\n")
+    except:
+        print("except this:" + line)
+        return None  # nice try, we will just ignore this syntax error
+
+
+def parsefile(fname):
+    ''' Parse a scenario file. Returns an array of command times (NaN for
+        lines with PCALL arguments (%0, %1, ...), which can only be parsed
+        after the arguments are replaced), and the commands (the complete
+        lines for lines with arguments). '''
+    times, cmds = [], []
+    with open(fname, 'r') as fscen:
+        for line in fscen:
+            if '%' in line:
+                times.append(np.nan)
+                cmds.append(line)
+                continue
+            parsed = parseline(line)
+            if parsed:
+                times.append(parsed[0])
+                cmds.append(parsed[1])
+    return np.array(times, dtype=np.float64), cmds
+
+
+def cachename(fname):
+    ''' Name of the cache file of scenario file fname. '''
+    path, name = os.path.split(fname)
+    return os.path.join(path, '__scncache__', name + '.npz')
+
+
+def readfile(fname):
+    ''' Read a scenario file, from its cache if it is up to date, and
+        otherwise parse the file and update the cache. '''
+    fcache = cachename(fname)
+    stat = os.stat(fname)
+    source = np.array([CACHE_VERSION, stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+    try:
+        with np.load(fcache) as cache:
+            if np.array_equal(cache['source'], source):
+                cmds = cache['cmds'].tobytes().decode('utf-8')
+                return cache['times'], cmds.split('\0') if len(cache['times']) else []
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile):
+        pass
+
+    times, cmds = parsefile(fname)
+    try:
+        if not any('\0' in cmd for cmd in cmds):
+            os.makedirs(os.path.dirname(fcache), exist_ok=True)
+            ftmp = '{}.tmp{}.npz'.format(fcache[:-4], os.getpid())
+            np.savez(ftmp, source=source, times=times, cmds=np.frombuffer(
+                '\0'.join(cmds).encode('utf-8'), dtype=np.uint8))
+            os.replace(ftmp, fcache)
+    except OSError:
+        # The scenario folder may be read-only: just don't cache
+        pass
+    return times, cmds
+
+
+def loadscn(fname, t_offset=0.0, args=None):
+    ''' Load a scenario file. The PCALL arguments args replace %0, %1, ...
+        in the commands, and t_offset is added to the command times.
+        Returns the command times and commands. '''
+    times, cmds = readfile(fname)
+    template = np.isnan(times)
+    if template.any():
+        times, cmds = times.copy(), list(cmds)
+        for i in np.flatnonzero(template):
+            line = cmds[i]
+            # Replace possible arguments: %0 by first argument, %1 by second, ..
+            for iarg, txtarg in enumerate(args or []):
+                line = line.replace("%" + str(iarg), txtarg)
+            times[i], cmds[i] = parseline(line) or (np.nan, '')
+        valid = ~np.isnan(times)
+        times = times[valid]
+        cmds = [cmd for cmd, v in zip(cmds, valid) if v]
+    return times + t_offset, cmds
+
+
+class ScenarioQueue:
+    ''' Priority queue of scenario commands, ordered on time, and on the
+        order in which they are added for commands with the same time. '''
+    def __init__(self):
+        self.heap = []
+        self.seq = count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def clear(self):
+        self.heap = []
+
+    def push(self, time, cmd):
+        ''' Add a command. '''
+        heapq.heappush(self.heap, (time, next(self.seq), cmd))
+
+    def extend(self, times, cmds):
+        ''' Add a list of commands. '''
+        entries = [(float(t), next(self.seq), cmd) for t, cmd in zip(times, cmds)]
+        if len(entries) * np.log2(len(self.heap) + 2) < len(self.heap) + len(entries):
+            for entry in entries:
+                heapq.heappush(self.heap, entry)
+        else:
+            self.heap.extend(entries)
+            heapq.heapify(self.heap)
+
+    def popdue(self, simt):
+        ''' Take the commands that are due at simulation time simt. '''
+        while self.heap and simt >= self.heap[0][0]:
+            yield heapq.heappop(self.heap)[2]
+
+    def data(self):
+        ''' The times and commands in the queue, in order. '''
+        entries = sorted(self.heap)
+        return [e[0] for e in entries], [e[2] for e in entries]
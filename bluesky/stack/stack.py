@@ -10,6 +10,7 @@ Methods:
     checkfile(t)            : check whether commands need to be
                               processed from scenario file
     process()               : central command processing method
+    call(cmd, *args)        : call a command with already parsed arguments
 Created by  : Jacco M. Hoekstra (TU Delft)
 """
 from __future__ import print_function
@@ -17,6 +18,7 @@ from math import *
 from random import seed
 import re
 import os
+from functools import lru_cache
 import os.path
 import webbrowser
 import subprocess
@@ -34,6 +36,9 @@ from bluesky import settings
 
 # Temporary fix for synthetic
 from . import synthetic as syn
+from . import scenario
+from .scenario import ScenarioQueue
+
 # Register settings defaults
 settings.set_variable_defaults(start_location='EHAM', scenario_path='scenario')
 
@@ -126,8 +131,7 @@ cmdstack = []  # The actual stack: Current commands to be processed
 # Scenario file which is read
 scenfile = ""  # Currently used scenario file (for reading)
 scenname = ""  # Currently used scenario name (for reading)
-scentime = []  # Times of the commands from the read scenario file
-scencmd = []  # Commands from the scenario file
+scenqueue = ScenarioQueue()  # Time-ordered commands from the scenario file(s)
 sender_rte = None  # bs net route to sender
 
 # When SAVEIC is used, we will also have a recoding scenario file handle
@@ -260,6 +264,12 @@ def init(startup_scnfile):
             bs.sim.batch,
             "Start a scenario file as batch simulation"
         ],
+        "BATCHSTAT": [
+            "BATCHSTAT",
+            "",
+            bs.sim.batchstat,
+            "Show the progress and throughput of the batch simulation"
+        ],
         "BEFORE": [
             "acid BEFORE beforewp ADDWPT (wpname/lat,lon),[alt,spd]",
             "acid,wpinroute,txt,wpt,[alt,spd]",
@@ -543,6 +553,12 @@ def init(startup_scnfile):
             bs.traf.ap.setLNAV,
             "LNAV (lateral FMS mode) switch for autopilot"
         ],
+        "LOGSTAT": [
+            "LOGSTAT [RESET]",
+            "[txt]",
+            datalog.logstat,
+            "Show the queue depth and write latency of the log writer"
+        ],
         "LSVAR": [
             "LSVAR path.to.variable",
             "[word]",
@@ -885,14 +901,13 @@ def get_scenname():
 
 def get_scendata():
     ''' Return the scenario data that was loaded from a scenario file. '''
-    return scentime, scencmd
+    return scenqueue.data()
 
 
 def set_scendata(newtime, newcmd):
     ''' Set the scenario data. This is used by the batch logic. '''
-    global scentime, scencmd
-    scentime = newtime
-    scencmd = newcmd
+    scenqueue.clear()
+    scenqueue.extend(newtime, newcmd)
 
 
 def scenarioinit(name):
@@ -921,6 +936,10 @@ def append_commands(newcommands):
             argisopt += [opt or t == '...' for t in types]
             args = args[cut:].lstrip(',]')
 
+        # Argtypes are stored as a tuple, so that their alternatives are
+        # compiled once (see compile_argtypes)
+        argtypes = tuple(argtypes)
+        compile_argtypes(argtypes)
         cmddict[cmd] = (smallhelp, argtypes, argisopt, fun, largehelp)
 
 
@@ -998,7 +1017,7 @@ def showhelp(cmd=''):
             line = item + "\t"
             if len(lst) > 4:
                 line = line + lst[4]
-            line = line + "\t" + lst[0] + "\t" + str(lst[1]) + "\t"
+            line = line + "\t" + lst[0] + "\t" + str(list(lst[1])) + "\t"
 
             # Clean up string with function name and add if not a lambda function
             funct = str(lst[3]).replace("<", "").replace(">", "")
@@ -1054,10 +1073,9 @@ def setSeed(value):
 
 def reset():
     ''' Reset the stack. '''
-    global scentime, scencmd, scenname, saveexcl
+    global scenname, saveexcl
 
-    scentime = []
-    scencmd = []
+    scenqueue.clear()
     scenname = ''
 
     # Close recording file and reset scenario recording settings
@@ -1079,26 +1097,17 @@ def sched_cmd(time, args, relative=False):
     if relative:
         time += bs.sim.simt
 
-    try:
-        # Find index of first scentime greater than 'time'
-        idx = next(idx for idx, t in enumerate(scentime) if t > time)
-        # Insert time and cmd at position before idx
-        scentime.insert(idx, time)
-        scencmd.insert(idx, tostack)
-    except StopIteration:
-        # Append to end when reaching end or when scentime,scencmd are empty
-        scentime.append(time)
-        scencmd.append(tostack)
+    # Commands at the same time are executed in the order they were added
+    scenqueue.push(time, tostack)
 
     return True
 
 
 def openfile(fname, pcall_arglst=None, mergeWithExisting=False):
-    global scentime, scencmd
 
     # Check for a/c id as first argument (use case: procedure files)
     # CALL KL204 myproc should have effect as if: CALL myproc KL204
-    if mergeWithExisting and pcall_arglst and fname in bs.traf.id:
+    if mergeWithExisting and pcall_arglst and fname in bs.traf.idindex:
         acid = fname
         fname = pcall_arglst[0]
         pcall_arglst = [acid]+list(pcall_arglst[1:])
@@ -1131,59 +1140,15 @@ def openfile(fname, pcall_arglst=None, mergeWithExisting=False):
         print("Openfile error: Cannot find file", fname_full)
         return False, "Error: cannot find file: " + fname_full
 
-    # Split scenario file line in times and commands
+    # Read the (cached) scenario file, and replace the PCALL arguments
+    scentime, scencmd = scenario.loadscn(fname_full, t_offset, pcall_arglst)
+
     if not mergeWithExisting:
         # When a scenario file is read with PCALL the resulting commands
         # need to be merged with the existing commands. Otherwise the
         # old scenario commands are cleared.
-        scentime = []
-        scencmd = []
-
-    insidx = 0
-    instime = bs.sim.simt
-    with open(fname_full, 'r') as fscen:
-        for line in fscen:
-
-            # Replace possible arguments: %0 by first argument, %1 by second, ..
-            if pcall_arglst and line.find("%") >= 0:
-                for iarg, txtarg in enumerate(pcall_arglst):
-                    line = line.replace("%" + str(iarg), pcall_arglst[iarg])
-
-            # Skip emtpy lines and comments
-            if len(line.strip()) < 12 or line.strip()[0] == "#":
-                continue
-
-            # Try reading timestamp and command
-            try:
-                icmdline = line.index('>')
-                tstamp = line[:icmdline]
-                ttxt = tstamp.strip().split(':')
-                ihr = int(ttxt[0]) * 3600.0
-                imin = int(ttxt[1]) * 60.0
-                xsec = float(ttxt[2])
-                cmdtime = ihr + imin + xsec + t_offset
-                if not scentime or cmdtime >= scentime[-1]:
-                    scentime.append(cmdtime)
-                    scencmd.append(line[icmdline + 1:].strip("\n"))
-                else:
-                    if cmdtime > instime:
-                        insidx, instime = next(((i, t)
-                                                for i, t in enumerate(scentime) if t >= cmdtime),
-                                               (len(scentime), scentime[-1]))
-                    scentime.insert(insidx, cmdtime)
-                    scencmd.insert(insidx, line[icmdline + 1:].strip("\n"))
-                    insidx += 1
-            except:
-                if not(len(line.strip()) > 0 and line.strip()[0] == "#"):
-                    print("except this:" + line)
-                pass  # nice try, we will just ignore this syntax error
-
-    # for t, c in zip(scentime, scencmd):
-    #     print(t, '>', c)
-    # if mergeWithExisting:
-    #     # If we are merging we need to sort the resulting command list
-    #     scentime, scencmd = [list(x) for x in zip(*sorted(
-    #         zip(scentime, scencmd), key=lambda pair: pair[0]))]
+        scenqueue.clear()
+    scenqueue.extend(scentime, scencmd)
 
     return True
 
@@ -1246,10 +1211,8 @@ def ic(filename=''):
 
 def checkfile(simt):
     ''' Check if commands from the scenario buffer need to be stacked. '''
-    while len(scencmd) > 0 and simt >= scentime[0]:
-        stack(scencmd[0])
-        del scencmd[0]
-        del scentime[0]
+    for cmd in scenqueue.popdue(simt):
+        stack(cmd)
 
 
 def saveic(fname=None):
@@ -1423,6 +1386,9 @@ def saveclose():
 re_getarg = re.compile(r'"?((?<=")[^"]*|(?<!")[^\s,]*)"?\s*,?\s*(.*)')
 
 
+# Repeated command lines (e.g., from traffic feeds and external controllers)
+# are only tokenised once
+@lru_cache(maxsize=4096)
 def getnextarg(line):
     ''' Returns the next argument in "line", and the remaining text in "line".
         separators are comma and (multiple) whitespace, except when an argument
@@ -1431,6 +1397,49 @@ def getnextarg(line):
     return re_getarg.match(line).groups()
 
 
+@lru_cache(maxsize=None)
+def compile_argtypes(argtypes):
+    ''' Split the argtypes (a tuple of e.g. 'acid', 'wpt/txt', '...') in
+        their alternative argument types. '''
+    return tuple(tuple(argtype.strip().split('/')) for argtype in argtypes)
+
+
+# Consecutive CRE commands on the stack (e.g., all aircraft created at the same
+# time in a scenario file) are collected, and created with one bulk create.
+crebatch = dict()  # Parsed CRE arguments per callsign, in order of the stack
+
+
+def batchcre(stackfun, args):
+    ''' Add the aircraft of a CRE command to the batch of aircraft that are
+        created together. Returns False when the command can't be batched. '''
+    # An aircraft in the batch can be used as position reference: create
+    # the batch first in that case
+    if crebatch and not crebatch.keys().isdisjoint(re.split(r'[\s,]+', args.upper())[1:]):
+        flushcre()
+
+    helptext, argtypes, argisopt, function = stackfun[:4]
+    parser = Argparser(argtypes, argisopt, args, function.__defaults__)
+    if not parser.parse() or len(parser.arglist) != 7 or None in parser.arglist:
+        return False
+
+    # Callsigns that already exist are handled (and reported) by the regular CRE
+    acid = parser.arglist[0]
+    if acid in crebatch or bs.traf.id2idx(acid) >= 0:
+        return False
+
+    crebatch[acid] = parser.arglist
+    return True
+
+
+def flushcre():
+    ''' Create all aircraft in the CRE batch. '''
+    if not crebatch:
+        return
+    acid, actype, lat, lon, hdg, alt, spd = zip(*crebatch.values())
+    crebatch.clear()
+    bs.traf.create(len(acid), list(actype), alt, spd, None, lat, lon, hdg, list(acid))
+
+
 def process():
     global savefile, saveexcl, orgcmd
 
@@ -1461,8 +1470,16 @@ def process():
         orgcmd = cmd.upper()
         cmd = cmdsynon.get(orgcmd) or orgcmd
         stackfun = cmddict.get(cmd)
+
+        # Collect consecutive CRE commands, create them before any other command
+        if cmd == 'CRE' and stackfun and batchcre(stackfun, args):
+            if savefile != None and cmd not in saveexcl:
+                savecmd(line)
+            continue
+        flushcre()
+
         # If no function is found for 'cmd', check if cmd is actually an aircraft id
-        if not stackfun and orgcmd in bs.traf.id:
+        if not stackfun and orgcmd in bs.traf.idindex:
             cmd, args = getnextarg(args)
             args = orgcmd + ' ' + args
             orgcmd = cmd.upper()
@@ -1487,22 +1504,7 @@ def process():
             if parser.parse():
                 # * = unpack list to call arguments
                 results = function(*parser.arglist)
-                if isinstance(results, bool):  # Only flag is returned
-                    if not results:
-                        if not args:
-                            echotext = helptext
-                        else:
-                            echotext = "Syntax error: " + helptext
-                            echoflags = bs.BS_FUNERR
-
-                elif isinstance(results, tuple) and results:
-                    if not results[0]:
-                        echoflags = bs.BS_FUNERR
-                        echotext = "Syntax error: " + \
-                            (helptext if len(results) < 2 else "")
-                    # Maybe there is also an error/info message returned?
-                    if len(results) >= 2:
-                        echotext += "{}: {}".format(cmd, results[1])
+                echotext, echoflags = cmdresult(cmd, helptext, results, args)
 
             else:  # syntax error:
                 echoflags = bs.BS_ARGERR
@@ -1538,9 +1540,72 @@ def process():
         #**********************************************************************
 
     # End of for-loop of cmdstack
+    flushcre()
     del cmdstack[:]
 
 
+def cmdresult(cmd, helptext, results, args):
+    ''' Make the echo text and flags of the results of stack command cmd.
+        Commands return either a success flag, or a tuple with a success
+        flag and an (error) message. '''
+    echotext = ''
+    echoflags = 0
+    if isinstance(results, bool):  # Only flag is returned
+        if not results:
+            if not args:
+                echotext = helptext
+            else:
+                echotext = "Syntax error: " + helptext
+                echoflags = bs.BS_FUNERR
+
+    elif isinstance(results, tuple) and results:
+        if not results[0]:
+            echoflags = bs.BS_FUNERR
+            echotext = "Syntax error: " + \
+                (helptext if len(results) < 2 else "")
+        # Maybe there is also an error/info message returned?
+        if len(results) >= 2:
+            echotext += "{}: {}".format(cmd, results[1])
+
+    return echotext, echoflags
+
+
+def call(cmd, *args):
+    ''' Call stack command cmd directly with already parsed arguments, i.e.,
+        the arguments as they are passed to the command function (an aircraft
+        index for acid, altitude in m, etc.), without text parsing.
+        Direct calls are executed immediately (not via the command stack),
+        and are not recorded with SAVEIC.
+        Returns the success flag and echo text of the command. '''
+    orgcmd = cmd.upper()
+    cmd = cmdsynon.get(orgcmd) or orgcmd
+    stackfun = cmddict.get(cmd)
+    if not stackfun:
+        echotext = "Unknown command: " + cmd
+        bs.scr.echo(echotext, bs.BS_CMDERR)
+        return False, echotext
+
+    helptext, function = stackfun[0], stackfun[3]
+    results = function(*args)
+    echotext, echoflags = cmdresult(cmd, helptext, results, args)
+    if echotext:
+        bs.scr.echo(echotext, echoflags)
+    success = results[0] if isinstance(results, tuple) and results else \
+        results is not False
+    return success, echotext
+
+
+def callbatch(calls):
+    ''' Call a batch of stack commands directly with already parsed
+        arguments (see call).
+        Arguments:
+        - calls: iterable of (cmd, args) tuples
+        Returns the list of results of each call. '''
+    # Aircraft collected from CRE commands on the stack are created first
+    flushcre()
+    return [call(cmd, *args) for cmd, args in calls]
+
+
 class Argparser:
     # Global variables
     reflat = -999.  # Reference latitude for searching in nav db
@@ -1550,6 +1615,7 @@ class Argparser:
 
     def __init__(self, argtypes, argisopt, argstring, argdefaults=None):
         self.argtypes = argtypes
+        self.argalts = compile_argtypes(tuple(argtypes))
         self.argisopt = argisopt
         self.argdefaults = list(argdefaults or [])
         self.argstring = argstring
@@ -1569,7 +1635,7 @@ class Argparser:
             if self.argtypes[curtype][:3] == '...':
                 repeatsize = len(self.argtypes) - curtype
                 curtype = curtype - repeatsize
-            argtype = self.argtypes[curtype].strip().split('/')
+            argtype = self.argalts[curtype]
 
             # Reset error messages
             self.error = ''
@@ -1723,7 +1789,7 @@ class Argparser:
                 name = curargu + "," + nextarg
 
             # apt,runway ? Combine into one string with a slash as separator
-            elif args[:2].upper() == "RW" and curargu in bs.navdb.aptid:
+            elif args[:2].upper() == "RW" and curargu in bs.navdb.aptindex:
                 nextarg, args = getnextarg(args)
                 name = curargu + "/" + nextarg.upper()
 
@@ -152,8 +152,8 @@ def process(*cmdargs):
                 wrapcreate(acid=acidh, actype="SUPER",aclat=lat, aclon=lon,
                                achdg=track, acalt=highalt*ft, acspd=hispd)
 
-                idxl = bs.traf.id.index(acidl)
-                idxh = bs.traf.id.index(acidh)
+                idxl = bs.traf.id2idx(acidl)
+                idxh = bs.traf.id2idx(acidh)
 
                 bs.traf.vs[idxl]     =  vs
                 bs.traf.vs[idxh]     = -vs
@@ -267,7 +267,7 @@ def process(*cmdargs):
         wrapcreate(acid="OWNSHIP", actype="FLOOR",
                        aclat=-1, aclon=0,
                        achdg=90, acalt=(20000+altdif)*ft, acspd=200)
-        idx = bs.traf.id.index("OWNSHIP")
+        idx = bs.traf.id2idx("OWNSHIP")
         bs.traf.selvs[idx]=-10
         bs.traf.selalt[idx]=20000-altdif
         for i in range(20):
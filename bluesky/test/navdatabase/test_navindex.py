@@ -0,0 +1,108 @@
+"""
+Tests the name and spatial indexes of the navigation database.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+import bluesky as bs
+from bluesky.navdatabase import navdatabase
+from bluesky.navdatabase.navindex import GridIndex
+
+
+def waypoints(seed=0):
+    """
+    Random waypoints: dense clusters, points near the poles and the
+    dateline, and a few duplicated names.
+    """
+    rng = np.random.RandomState(seed)
+    lat = np.concatenate((rng.uniform(-90.0, 90.0, 500), rng.normal(52.0, 0.3, 2000),
+                          rng.uniform(88.0, 90.0, 20), [0.0, 0.0, 10.0, 90.0, -90.0]))
+    lon = np.concatenate((rng.uniform(-180.0, 180.0, 500), rng.normal(4.0, 0.3, 2000),
+                          rng.uniform(-180.0, 180.0, 20), [-180.0, 180.0, 179.99, 0.0, 0.0]))
+    wpid = ['WP%d' % (i % 2000) for i in range(len(lat))]
+    return wpid, lat, lon
+
+
+@pytest.fixture
+def navdb(monkeypatch):
+    """
+    Navdatabase with random waypoints and airports.
+    """
+    wpid, lat, lon = waypoints()
+    n = len(wpid)
+    wptdata = dict(wpid=wpid, wplat=lat, wplon=lon, wptype=n * ['FIX'], wpelev=n * [0.0],
+                   wpvar=n * [0.0], wpfreq=n * [0.0], wpdesc=n * [''])
+    aptid, aptlat, aptlon = waypoints(1)
+    aptdata = dict(apid=aptid, apname=aptid, aplat=aptlat, aplon=aptlon, apmaxrwy=None,
+                   aptype=None, apco=None, apelev=None)
+    awydata = dict(awfromwpid=['WP1', 'WP2', 'WP1'], awtowpid=['WP2', 'WP3', 'WP4'],
+                   awid=['A1', 'A1', 'B2'], awfromlat=lat[[1, 2, 1]], awfromlon=lon[[1, 2, 1]],
+                   awtolat=lat[[2, 3, 4]], awtolon=lon[[2, 3, 4]], awndir=None,
+                   awlowfl=None, awupfl=None)
+    firdata = dict(fir=None, firlat0=None, firlon0=None, firlat1=None, firlon1=None)
+    codata = dict(coname=None, cocode2=None, cocode3=None, conr=None)
+    monkeypatch.setattr(navdatabase, 'load_navdata', lambda: (
+        wptdata, aptdata, awydata, firdata, codata, dict()))
+    monkeypatch.setattr(bs, 'scr', SimpleNamespace(addnavwpt=lambda *args: None), raising=False)
+    return navdatabase.Navdatabase()
+
+
+def test_nearest_equals_linear(navdb):
+    """
+    Grid-based nearest point queries should give the same results as a
+    scan of all points.
+    """
+    rng = np.random.RandomState(2)
+    queries = np.column_stack((rng.uniform(-90.0, 90.0, 200), rng.uniform(-180.0, 180.0, 200)))
+    queries = np.vstack((queries, navdb.wplat[:50, np.newaxis].repeat(2, 1) * [1.0, 0.0],
+                         [[52.0, 4.0], [89.9, 100.0], [0.0, -179.9], [10.0, -179.99]]))
+    for lat, lon in queries:
+        assert navdb.getwpinear(lat, lon) == navdb.getinear(navdb.wplat, navdb.wplon, lat, lon)
+        assert navdb.getapinear(lat, lon) == navdb.getinear(navdb.aptlat, navdb.aptlon, lat, lon)
+
+
+def test_inside_equals_linear(navdb):
+    """
+    Grid-based box queries should give the same results as a scan of all
+    points.
+    """
+    for box in [(51.0, 53.0, 3.0, 5.0), (-90.0, 90.0, -180.0, 180.0), (52.0, 52.1, 4.0, 4.1),
+                (51.0, 53.0, 5.0, 3.0), (53.0, 51.0, 3.0, 5.0), (89.0, 90.0, 170.0, 180.0)]:
+        assert navdb.getwpinside(*box) == navdb.getinside(navdb.wplat, navdb.wplon, *box)
+
+
+def test_name_lookups(navdb):
+    """
+    Name lookups should find the closest waypoint of the same name, and
+    should include waypoints added with DEFWPT.
+    """
+    assert navdb.getwpidx('wp5') == 5
+    assert navdb.getwpidx('WP5', navdb.wplat[2005], navdb.wplon[2005]) == 2005
+    assert navdb.getwpidx('NOWPT') == -1
+    assert navdb.getwpindices('WP5', navdb.wplat[2005], navdb.wplon[2005]) == [2005]
+    assert navdb.getaptidx('wp7') == 7
+
+    navdb.defwpt('WP5', 10.0, 20.0)
+    navdb.defwpt('WP5', 10.001, 20.0)
+    assert navdb.getwpidx('WP5', 10.0, 20.0) == len(navdb.wpid) - 2
+    assert navdb.getwpindices('WP5', 10.0, 20.0) == [len(navdb.wpid) - 2, len(navdb.wpid) - 1]
+    assert navdb.getwpinear(10.0, 20.0) == len(navdb.wpid) - 2
+    assert navdb.getwpinside(9.0, 11.0, 19.0, 21.0)[-2:] == \
+        [len(navdb.wpid) - 2, len(navdb.wpid) - 1]
+
+    assert navdb.listconnections('WP1', navdb.wplat[1], navdb.wplon[1]) == \
+        [['A1', 'WP2'], ['B2', 'WP4']]
+
+
+def test_grid_rebuild():
+    """
+    The grid should be rebuilt when many points are added.
+    """
+    _, lat, lon = waypoints()
+    grid = GridIndex(maxextra=10)
+    assert grid.nearest(lat, lon, 52.0, 4.0) is not None
+    assert grid.n == len(lat)
+    lat, lon = np.append(lat, 11 * [0.5]), np.append(lon, 11 * [0.5])
+    assert grid.nearest(lat, lon, 0.5, 0.5) == len(lat) - 11
+    assert grid.n == len(lat)
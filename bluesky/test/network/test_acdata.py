@@ -0,0 +1,97 @@
+"""
+Tests the encoding and decoding of the ACDATA stream.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip('zmq')
+msgpack = pytest.importorskip('msgpack')
+from bluesky.network.acdata import ACDataEncoder, ACDataDecoder, density
+from bluesky.network.npcodec import encode_ndarray, decode_ndarray
+
+
+def send(encoder, decoders, generation, ids, translvl=1500.0, sel=None):
+    """
+    Encode aircraft data, and pass it through msgpack to the decoders.
+    """
+    static = dict(id=ids, vmin=100.0, vmax=200.0, translvl=translvl)
+    pertraf = dict(lat=np.linspace(50.0, 52.0, len(ids)), inconf=np.zeros(len(ids), dtype=bool))
+    msg = msgpack.packb(encoder.encode(generation, static, pertraf, dict(simt=1.0), sel),
+                        default=encode_ndarray, use_bin_type=True)
+    data = msgpack.unpackb(msg, object_hook=decode_ndarray, raw=False)
+    return data, [decoder.decode(dict(data)) for decoder in decoders]
+
+
+def test_acdata_static_fields():
+    """
+    Ids should only be sent in key frames, and other static fields when
+    they change. Decoded messages should always contain all fields.
+    """
+    encoder = ACDataEncoder(keyframe_interval=3)
+    decoder = ACDataDecoder()
+    ids = ['KL204', 'BA12']
+
+    data, (result,) = send(encoder, [decoder], 0, ids)
+    assert data['key'] and data['id'] == ids
+    assert result['lat'].dtype == np.float32
+
+    data, (result,) = send(encoder, [decoder], 0, ids, translvl=2000.0)
+    assert not data['key'] and 'id' not in data and 'vmin' not in data
+    assert data['translvl'] == 2000.0
+    assert result['id'] == ids and result['vmin'] == 100.0
+
+    # A new traffic generation should give a key frame
+    data, (result,) = send(encoder, [decoder], 1, ids + ['AF3'])
+    assert data['key'] and result['id'] == ids + ['AF3']
+
+
+def test_acdata_late_client():
+    """
+    A client that misses a key frame should skip messages until the next
+    key frame.
+    """
+    encoder = ACDataEncoder(keyframe_interval=3)
+    ids = ['KL204', 'BA12']
+    send(encoder, [], 0, ids)
+    late = ACDataDecoder()
+    results = [send(encoder, [late], 0, ids)[1][0] for _ in range(3)]
+    assert results[0] is None and results[1] is None
+    assert results[2]['id'] == ids
+
+
+def test_acdata_fields():
+    """
+    Only the union of the fields selected by the clients should be sent.
+    """
+    encoder = ACDataEncoder()
+    encoder.subscribe(b'client1', ['id', 'lat'])
+    encoder.subscribe(b'client2', ['lat', 'translvl'])
+    data = send(encoder, [], 0, ['KL204'])[0]
+    assert {'id', 'lat', 'translvl'} <= set(data)
+    assert 'inconf' not in data and 'vmin' not in data
+
+
+def test_acdata_selection():
+    """
+    Only the selected aircraft should be sent, and a change in the
+    selection should give a key frame.
+    """
+    encoder = ACDataEncoder()
+    decoder = ACDataDecoder()
+    ids = ['KL204', 'BA12', 'AF3']
+    send(encoder, [decoder], 0, ids, sel=np.array([0, 2]))
+    data, (result,) = send(encoder, [decoder], 0, ids, sel=np.array([0, 2]))
+    assert not data['key']
+    assert result['id'] == ['KL204', 'AF3']
+    np.testing.assert_allclose(result['lat'], [50.0, 52.0])
+
+    data, (result,) = send(encoder, [decoder], 0, ids, sel=np.array([1]))
+    assert data['key'] and result['id'] == ['BA12']
+
+
+def test_acdata_density():
+    """
+    The density summary should count the aircraft per grid cell.
+    """
+    lat, lon, count = density([52.1, 52.9, 10.5, -33.2], [4.5, 4.1, 179.9, -70.6], 1.0)
+    assert list(zip(lat, lon, count)) == [(-33.5, -70.5, 1), (10.5, 179.5, 1), (52.5, 4.5, 2)]
@@ -0,0 +1,60 @@
+"""
+Tests the scheduling of batch scenarios.
+"""
+import pytest
+
+pytest.importorskip('zmq')
+from bluesky.network.batch import BatchScheduler, scenario_cost
+
+
+def batch():
+    """
+    A batch with a short, a long and a busy scenario.
+    """
+    scentime = [0.0, 0.0, 100.0,
+                0.0, 0.0, 3600.0,
+                0.0, 0.0, 0.0, 0.0, 600.0]
+    scencmd = ['SCEN short', 'CRE KL1 B744 52 4 0 FL100 250', 'HOLD',
+               'SCEN long', 'CRE KL2 B744 52 4 0 FL100 250', 'HOLD',
+               'SCEN busy', 'CRE KL3 B744 52 4 0 FL100 250', 'cre KL4 B744 52 4 0 FL100 250',
+               'CRE KL5 B744 52 4 0 FL100 250', 'HOLD']
+    return scentime, scencmd
+
+
+def test_longest_first():
+    """
+    Scenarios should be dispatched in order of decreasing cost.
+    """
+    scheduler = BatchScheduler()
+    assert scheduler.load(*batch()) == 3
+    assert [s['cost'] for s in scheduler.status] == [103.0, 3603.0, 1805.0]
+    assert [scheduler.next(node)['name'] for node in (b'A', b'B', b'C')] == \
+        ['long', 'busy', 'short']
+    assert scheduler.next(b'D') is None and len(scheduler) == 0
+    assert scenario_cost(dict(scentime=[], scencmd=[])) == 0.0
+
+
+def test_status_and_retries():
+    """
+    Scenarios of nodes that died should be retried, until they fail, and
+    the report should show the progress of the batch.
+    """
+    scheduler = BatchScheduler(maxretries=1)
+    scheduler.load(*batch())
+    scheduler.next(b'A')
+    scheduler.finished(b'A', 3600.0)
+    assert scheduler.status[1]['state'] == 'done'
+    assert scheduler.status[1]['simt'] == 3600.0
+
+    assert scheduler.next(b'B')['name'] == 'busy'
+    assert scheduler.failed(b'B')
+    assert scheduler.status[2]['state'] == 'queued' and len(scheduler) == 2
+    assert scheduler.next(b'C')['name'] == 'busy'
+    assert not scheduler.failed(b'C')
+    assert scheduler.status[2]['state'] == 'failed'
+    assert not scheduler.failed(b'C')
+
+    report = scheduler.report()
+    assert report.startswith('Batch: 1 of 3 scenarios done, 0 running, 1 queued, 1 failed')
+    assert 'Failed: busy (1 retries)' in report
+    assert BatchScheduler().report() == 'No batch simulation running'
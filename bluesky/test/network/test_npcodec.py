@@ -0,0 +1,68 @@
+"""
+Tests the msgpack encoding of numpy arrays.
+"""
+import numpy as np
+import pytest
+
+pytest.importorskip('zmq')
+msgpack = pytest.importorskip('msgpack')
+from bluesky.network.npcodec import encode_ndarray, decode_ndarray, \
+    encode_frames, decode_frames
+
+
+def sample():
+    base = np.arange(20.0)
+    return dict(simt=1.5, id=['AC0', 'AC1'],
+                lat=base[::2],                          # non-contiguous view
+                alt=np.ones((2, 3), dtype=np.float32),
+                inconf=np.array([True, False]),
+                nested=dict(empty=np.zeros(0, dtype=np.int32)))
+
+
+def assert_equal_data(data, reference):
+    assert data.keys() == reference.keys()
+    for name, value in reference.items():
+        if isinstance(value, np.ndarray):
+            assert data[name].dtype == value.dtype
+            assert np.array_equal(data[name], value)
+        elif isinstance(value, dict):
+            assert_equal_data(data[name], value)
+        else:
+            assert data[name] == value
+
+
+def test_encode_ndarray():
+    """
+    Arrays embedded in msgpack messages should survive a round trip.
+    """
+    msg = msgpack.packb(sample(), default=encode_ndarray, use_bin_type=True)
+    assert_equal_data(msgpack.unpackb(msg, object_hook=decode_ndarray, raw=False), sample())
+
+
+def test_encode_frames():
+    """
+    Large arrays should be sent as separate frames, decoded as views on
+    these frames, and small arrays embedded in the header. Messages with
+    embedded arrays should also be decoded.
+    """
+    data = sample()
+    frames = encode_frames(data)
+    assert len(frames) == 1
+    assert_equal_data(decode_frames(frames), sample())
+
+    frames = encode_frames(data, threshold=data['lat'].nbytes)
+    assert len(frames) == 2 and np.array_equal(frames[1], data['lat'])
+
+    frames = encode_frames(data, threshold=0)
+    assert len(frames) == 5
+    # Views are copied, arrays that own their data are passed as they are
+    assert not np.shares_memory(frames[1], data['lat'])
+    assert frames[2] is data['alt']
+
+    frames = [bytes(frame) for frame in frames]
+    decoded = decode_frames(frames)
+    assert_equal_data(decoded, sample())
+    assert not decoded['alt'].flags.writeable
+
+    msg = msgpack.packb(data, default=encode_ndarray, use_bin_type=True)
+    assert_equal_data(decode_frames([msg]), sample())
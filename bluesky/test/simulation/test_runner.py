@@ -0,0 +1,110 @@
+"""
+Tests the headless in-process batch runner.
+"""
+import os
+from collections import defaultdict
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('zmq')
+import bluesky as bs
+from bluesky import settings, stack
+from bluesky.navdatabase import navdatabase
+from bluesky.simulation import runner
+import bluesky.traffic  # selects the performance model
+from bluesky.tools.trafficarrays import TrafficArrays
+
+SCN = """00:00:00.00>CRELOG TESTLOG 1.0
+00:00:00.00>TESTLOG ADD traf.id, traf.alt
+00:00:00.00>TESTLOG ON
+00:00:00.00>DEFWPT TESTWPT 52.0 4.0
+00:00:00.00>CRE KL204 B744 52 4 90 FL100 250
+00:00:10.00>HOLD
+"""
+
+
+def test_finished(monkeypatch):
+    """
+    A scenario should be finished when the simulation is held or ended,
+    at the maximum simulation time, or when there is nothing left to do.
+    """
+    sim = SimpleNamespace(state=bs.OP, simt=10.0)
+    traf = SimpleNamespace(ntraf=1)
+    monkeypatch.setattr(bs, 'sim', sim, raising=False)
+    monkeypatch.setattr(bs, 'traf', traf, raising=False)
+    monkeypatch.setattr(stack, 'cmdstack', [])
+    assert not runner.finished()
+    assert runner.finished(maxsimt=10.0)
+    assert not runner.finished(maxsimt=20.0)
+
+    for state in (bs.HOLD, bs.END):
+        sim.state = state
+        assert runner.finished()
+    sim.state = bs.OP
+
+    traf.ntraf = 0
+    assert len(stack.scenqueue) == 0
+    assert runner.finished()
+    stack.cmdstack.append(('ECHO', None))
+    assert not runner.finished()
+
+
+@pytest.fixture
+def nonavdata(monkeypatch):
+    """
+    Initialise the simulation with an empty navigation database, and count
+    how often it is loaded.
+    """
+    loads = []
+
+    def load_navdata():
+        loads.append(1)
+        return tuple(defaultdict(list) for _ in range(5)) + (dict(),)
+
+    monkeypatch.setattr(navdatabase, 'load_navdata', load_navdata)
+    for name in ('navdb', 'traf', 'sim', 'scr'):
+        monkeypatch.setattr(bs, name, getattr(bs, name, None), raising=False)
+    monkeypatch.setattr(TrafficArrays, 'root', TrafficArrays.root)
+    yield loads
+
+
+def test_run_all(nonavdata, tmp_path, monkeypatch):
+    """
+    Scenarios should run in fast time until they are finished, with their
+    logs written, and in a reset simulation that keeps the navigation data.
+    """
+    # The configuration is read by init. Keep the performance model that
+    # was selected when the traffic module was imported
+    init = runner.init
+    model = settings.performance_model
+    monkeypatch.setattr(settings, 'log_path', settings.log_path)
+    monkeypatch.setattr(settings, 'performance_model', model)
+
+    def init_tmp(cfgfile=''):
+        init(cfgfile)
+        settings.log_path = str(tmp_path)
+        settings.performance_model = model
+    monkeypatch.setattr(runner, 'init', init_tmp)
+    fname = str(tmp_path / 'test.scn')
+    with open(fname, 'w') as f:
+        f.write(SCN)
+
+    results = runner.run_all([fname, str(tmp_path / 'missing.scn'), fname], nworkers=1)
+    result = next(results)
+    assert result['error'] == ''
+    assert 10.0 <= result['simt'] < 11.0
+    assert bs.navdb.wpid == ['TESTWPT']
+    logs = [name for name in os.listdir(str(tmp_path)) if name.startswith('TESTLOG')]
+    assert len(logs) == 1
+    with open(str(tmp_path / logs[0])) as f:
+        rows = [line for line in f if not line.startswith('#')]
+    assert len(rows) >= 10 and rows[0].split(',')[1] == 'KL204'
+
+    result = next(results)
+    assert result['error'] and result['simt'] == 0.0
+    assert bs.navdb.wpid == []
+
+    result = next(results)
+    assert result['error'] == ''
+    assert bs.navdb.wpid == ['TESTWPT']
+    assert len(nonavdata) == 1
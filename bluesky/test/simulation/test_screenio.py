@@ -0,0 +1,122 @@
+"""
+Tests the aircraft data streams with a region of interest of ScreenIO.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+pytest.importorskip('zmq')
+import bluesky as bs
+from bluesky import stack
+from bluesky.simulation.qtgl.screenio import ScreenIO
+
+CLIENT = b'\x00gui1'
+
+
+@pytest.fixture
+def scr(monkeypatch):
+    """
+    A ScreenIO with four aircraft, of which only the first is in the view
+    of CLIENT, and a network node that records the streams it sends.
+    """
+    n = 4
+    ids = ['KL204', 'BA12', 'AF3', 'LH7']
+    traf = SimpleNamespace(
+        ntraf=n, id=ids, generation=0, translvl=1500.0,
+        lat=np.array([52.0, 10.0, -30.0, 60.0]), lon=np.array([4.0, 100.0, -60.0, 150.0]),
+        alt=np.full(n, 3000.0), tas=np.zeros(n), cas=np.zeros(n), gs=np.zeros(n),
+        trk=np.zeros(n), vs=np.zeros(n),
+        groups=SimpleNamespace(ingroup=np.zeros(n, dtype=int)),
+        trails=SimpleNamespace(clearnew=lambda: None),
+        asas=SimpleNamespace(confpairs_unique=[], confpairs_all=[], lospairs_unique=[],
+                             lospairs_all=[], vmin=0.0, vmax=1.0, asaseval=False,
+                             inconf=np.zeros(n, dtype=bool), tcpamax=np.zeros(n)),
+        id2idx=lambda acids: [ids.index(acid) if acid in ids else -1 for acid in acids])
+    streams = []
+    net = SimpleNamespace(subscriptions=set(), simt=0.0,
+                          send_stream=lambda name, data: streams.append((name, data)),
+                          send_event=lambda name, data=None, target=None: None)
+    net.subscribed = lambda name: any(name.startswith(sub) for sub in net.subscriptions)
+    monkeypatch.setattr(bs, 'traf', traf, raising=False)
+    monkeypatch.setattr(bs, 'sim', net, raising=False)
+    monkeypatch.setattr(bs, 'net', net, raising=False)
+
+    scr = ScreenIO()
+    scr.streams = streams
+    scr.event(b'PANZOOM', dict(pan=(52.0, 4.0), zoom=1.0, ar=1.0), [CLIENT])
+    scr.event(b'ACFIELDS', ['id', 'lat', 'lon'], [CLIENT])
+    scr.event(b'ACROI', True, [CLIENT])
+    return scr
+
+
+def test_shared_stream(scr):
+    """
+    The shared stream should only be sent while it is subscribed, and not
+    share its prefix with the streams of the regions of interest.
+    """
+    bs.net.subscriptions.add(b'ROIDATA' + CLIENT)
+    scr.send_aircraft_data()
+    assert [name for name, _ in scr.streams] == [b'ROIDATA' + CLIENT]
+    assert scr.streams[0][1]['id'] == ['KL204']
+
+    # A client without a region of interest, or a subscription to all streams
+    for sub in (b'ACDATA', b''):
+        bs.net.subscriptions.add(sub)
+        del scr.streams[:]
+        scr.send_aircraft_data()
+        assert [name for name, _ in scr.streams] == [b'ROIDATA' + CLIENT, b'ACDATA']
+        assert len(scr.streams[1][1]['lat']) == 4
+
+
+def test_client_leaves(scr):
+    """
+    The region of interest of a client should be dropped when the
+    subscription to its stream ends, but not before it was subscribed.
+    """
+    scr.send_aircraft_data()
+    assert CLIENT in scr.client_roi
+    bs.net.subscriptions.add(b'ROIDATA' + CLIENT)
+    scr.send_aircraft_data()
+    bs.net.subscriptions.clear()
+    scr.send_aircraft_data()
+    assert CLIENT not in scr.client_roi
+    assert CLIENT not in scr.acencoder.client_fields
+
+
+def test_roi_selected(scr, monkeypatch):
+    """
+    The aircraft of the route, navigation display and state-space diagram
+    of a client should always be in its region of interest.
+    """
+    assert np.flatnonzero(scr.roi_mask(CLIENT)).tolist() == [0]
+    monkeypatch.setattr(stack, 'sender', lambda: CLIENT)
+    scr.shownd('BA12')
+    scr.showroute('AF3')
+    scr.feature('SSD', ['LH7'])
+    assert np.flatnonzero(scr.roi_mask(CLIENT)).tolist() == [0, 1, 2, 3]
+
+    # SSD toggles the aircraft, and the scenario default applies to all
+    scr.feature('SSD', ['LH7'])
+    assert np.flatnonzero(scr.roi_mask(CLIENT)).tolist() == [0, 1, 2]
+    monkeypatch.setattr(stack, 'sender', lambda: None)
+    scr.feature('SSD', ['LH7'])
+    assert np.flatnonzero(scr.roi_mask(CLIENT)).tolist() == [0, 1, 2, 3]
+
+
+def test_roi_trails(scr):
+    """
+    The last trail segments in the stream of a region of interest should
+    belong to the aircraft in that region.
+    """
+    bs.traf.trails = SimpleNamespace(
+        active=True, clearnew=lambda: None,
+        newlat0=[], newlon0=[], newlat1=[], newlon1=[],
+        lastlat=np.array([51.0, 9.0, -31.0, 59.0]),
+        lastlon=np.array([3.0, 99.0, -61.0, 149.0]))
+    scr.event(b'ACFIELDS', ['id', 'lat', 'lon', 'trails'], [CLIENT])
+    bs.net.subscriptions.add(b'ROIDATA' + CLIENT)
+    scr.send_aircraft_data()
+    data = scr.streams[-1][1]
+    assert len(data['lat']) == len(data['traillastlat']) == len(data['traillastlon']) == 1
+    assert data['traillastlat'].tolist() == [51.0]
+    assert data['traillastlon'].tolist() == [3.0]
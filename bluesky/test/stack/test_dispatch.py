@@ -0,0 +1,71 @@
+"""
+Tests the compiled argument parsing and the direct call API of the stack.
+"""
+from types import SimpleNamespace
+import pytest
+
+import bluesky as bs
+from bluesky import stack
+from bluesky.tools.aero import ft, kts
+
+
+@pytest.fixture
+def commands(monkeypatch):
+    """
+    A test command in the stack command dictionary, and a screen stub
+    that collects the echoed texts.
+    """
+    calls, echoes = [], []
+
+    def testcmd(txt, alt, spd=None):
+        calls.append((txt, alt, spd))
+        if txt == 'FAIL':
+            return False, 'failed'
+        return True
+
+    # Removed from the command dictionary again after the test
+    monkeypatch.setitem(stack.cmddict, 'TEST', None)
+    monkeypatch.setitem(stack.cmdsynon, 'TESTSYN', 'TEST')
+    monkeypatch.setattr(bs, 'scr', SimpleNamespace(
+        echo=lambda text, flags=0: echoes.append((text, flags))), raising=False)
+    stack.append_commands({'TEST': ['TEST txt,alt,[spd]', 'txt,alt/float,[spd]', testcmd,
+                                    'Test command']})
+    return calls, echoes
+
+
+def test_argtypes_compiled(commands):
+    """
+    Argument types should be compiled once, when commands are added.
+    """
+    argtypes = stack.cmddict['TEST'][1]
+    assert argtypes == ('txt', 'alt/float', 'spd')
+    assert stack.compile_argtypes(argtypes) == (('txt',), ('alt', 'float'), ('spd',))
+    assert stack.compile_argtypes(argtypes) is stack.compile_argtypes(tuple(list(argtypes)))
+
+
+def test_parse_repeated_lines(commands):
+    """
+    Repeated command lines should be parsed to the same arguments.
+    """
+    calls, _ = commands
+    for _ in range(3):
+        stack.stack('TEST kl204, FL100 250')
+        stack.stack('TESTSYN "a b" 2000')
+    stack.process()
+    assert calls == 3 * [('KL204', 10000 * ft, 250 * kts), ('A B', 2000 * ft, None)]
+    assert stack.getnextarg('"a b" 2000') == ('a b', '2000')
+
+
+def test_call(commands):
+    """
+    Direct calls should pass the arguments unparsed, and report the
+    results like commands from the stack.
+    """
+    calls, echoes = commands
+    assert stack.call('testsyn', 'KL204', 100.0) == (True, '')
+    assert calls[-1] == ('KL204', 100.0, None)
+    assert stack.call('TEST', 'FAIL', 1.0, 2.0) == (False, 'Syntax error: TEST: failed')
+    assert echoes[-1] == ('Syntax error: TEST: failed', bs.BS_FUNERR)
+    assert stack.callbatch([('TEST', ('A', 1.0)), ('NOCMD', ())]) == \
+        [(True, ''), (False, 'Unknown command: NOCMD')]
+    assert echoes[-1] == ('Unknown command: NOCMD', bs.BS_CMDERR)
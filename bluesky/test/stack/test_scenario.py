@@ -0,0 +1,71 @@
+"""
+Tests the parsing, caching and scheduling of scenario files.
+"""
+import os
+import numpy as np
+
+from bluesky.stack import scenario
+from bluesky.stack.scenario import ScenarioQueue
+
+SCN = """# Test scenario
+00:00:00.00>CRE KL204,B744,52,4,90,FL100,250
+00:00:10.00>ECHO %0 at %1
+
+00:01:00.00>HOLD
+00:00:05.50>ECHO  not sorted
+this is not a command line
+"""
+
+
+def test_cache_roundtrip(tmp_path):
+    """
+    A cached scenario should give the same result as the parsed
+    scenario, and be replaced when the scenario file changes.
+    """
+    fname = str(tmp_path / 'test.scn')
+    with open(fname, 'w') as f:
+        f.write(SCN)
+
+    times, cmds = scenario.readfile(fname)
+    assert os.path.exists(scenario.cachename(fname))
+    cached = scenario.readfile(fname)
+    assert np.array_equal(cached[0], times, equal_nan=True) and cached[1] == cmds
+    assert np.isnan(times[1]) and cmds[1] == '00:00:10.00>ECHO %0 at %1\n'
+
+    with open(fname, 'a') as f:
+        f.write('00:02:00.00>RESET\n')
+    times, cmds = scenario.readfile(fname)
+    assert len(cmds) == 5 and cmds[-1] == 'RESET'
+
+
+def test_loadscn(tmp_path):
+    """
+    PCALL arguments should be replaced, and the time offset added.
+    """
+    fname = str(tmp_path / 'test.scn')
+    with open(fname, 'w') as f:
+        f.write(SCN)
+
+    times, cmds = scenario.loadscn(fname, 100.0, ['KL204', 'EHAM'])
+    assert list(times) == [100.0, 110.0, 160.0, 105.5]
+    assert cmds == ['CRE KL204,B744,52,4,90,FL100,250', 'ECHO KL204 at EHAM',
+                    'HOLD', 'ECHO  not sorted']
+
+
+def test_queue_order():
+    """
+    Commands should be dispatched in time order, and in the order in
+    which they were added for equal times.
+    """
+    queue = ScenarioQueue()
+    queue.extend([10.0, 0.0, 10.0], ['B', 'A', 'C'])
+    queue.push(10.0, 'D')
+    queue.push(5.0, 'E')
+    queue.extend([10.0], ['F'])
+    assert queue.data() == ([0.0, 5.0, 10.0, 10.0, 10.0, 10.0],
+                            ['A', 'E', 'B', 'C', 'D', 'F'])
+
+    assert list(queue.popdue(5.0)) == ['A', 'E']
+    assert list(queue.popdue(9.9)) == []
+    assert list(queue.popdue(10.0)) == ['B', 'C', 'D', 'F']
+    assert len(queue) == 0
@@ -0,0 +1,90 @@
+"""
+Tests the binary cache directories.
+"""
+import os
+import numpy as np
+import pytest
+
+from bluesky import settings
+from bluesky.tools import cachefile
+
+
+@pytest.fixture
+def tables(tmp_path, monkeypatch):
+    """
+    Tables with all column types, in a temporary cache path.
+    """
+    monkeypatch.setattr(settings, 'cache_path', str(tmp_path))
+    wpt = dict(wpid=['SPY', 'EH', '', 'ÄBC'], wplat=np.array([52.0, 53.0, 51.5, 50.0]),
+               wpelev=[0.0, 1.5, 2.0, 3.0], wpfreq=[350, 113.2, 0.0, 0.0],
+               wpdesc=[], empty=np.zeros(0, dtype=np.int32))
+    fir = dict(fir=[['EHAA', [52.0, 53.0], [4.0, 5.0]]])
+    rwy = dict(thresholds={'EHAM': {'18R': (52.3, 4.7, 183.0)}})
+    return dict(wpt=wpt, fir=fir, rwy=rwy)
+
+
+def test_cachedir_roundtrip(tables, tmp_path):
+    """
+    Tables should be loaded with the same types and values, with
+    numeric arrays memory-mapped.
+    """
+    cachefile.opendir('navdata', 'v1').dump(tables)
+    assert os.listdir(str(tmp_path)) == ['navdata']
+
+    loaded = cachefile.opendir('navdata', 'v1').load()
+    assert loaded.keys() == tables.keys()
+    for tablename, table in tables.items():
+        assert loaded[tablename].keys() == table.keys()
+        for name, value in table.items():
+            if isinstance(value, np.ndarray):
+                assert isinstance(loaded[tablename][name], np.memmap)
+                assert loaded[tablename][name].dtype == value.dtype
+                assert np.array_equal(loaded[tablename][name], value)
+            elif isinstance(value, list):
+                assert list(loaded[tablename][name]) == value
+            else:
+                assert loaded[tablename][name] == value
+    # Lists with mixed int and float elements keep their element types
+    assert [type(v) for v in loaded['wpt']['wpfreq']] == [int, float, float, float]
+
+
+def test_cachedir_version(tables):
+    """
+    A cache of another version should not be loaded, and should be
+    replaced when the tables are dumped again.
+    """
+    cachefile.opendir('navdata', 'v1').dump(tables)
+    with pytest.raises(cachefile.CacheError):
+        cachefile.opendir('navdata', 'v2').load()
+    with pytest.raises(cachefile.CacheError):
+        cachefile.opendir('other', 'v1').load()
+
+    tables['wpt']['wpid'][0] = 'SPL'
+    cachefile.opendir('navdata', 'v2').dump(tables)
+    assert cachefile.opendir('navdata', 'v2').load()['wpt']['wpid'][0] == 'SPL'
+
+
+def test_stringtable(tables):
+    """
+    String tables should be searched without converting them to a list,
+    and only be converted when they are changed.
+    """
+    wpid = ['SPY', 'EH', 'SPY', '', 'SP', 'ÄBC', 'SPY']
+    cachefile.opendir('navdata', 'v1').dump(dict(wpt=dict(wpid=wpid)))
+    table = cachefile.opendir('navdata', 'v1').load()['wpt']['wpid']
+    assert isinstance(table, cachefile.StringTable)
+    assert len(table) == 7
+    assert table[5] == 'ÄBC' and table[-1] == 'SPY' and table[3] == ''
+    assert table.index('SPY') == 0 and table.index('SPY', 1) == 2
+    assert table.index('', 1) == 3
+    assert table.count('SPY') == 3 and table.count('SP') == 1
+    assert 'EH' in table and 'E' not in table and 1 not in table
+    with pytest.raises(ValueError):
+        table.index('SPY', 3, 6)
+    with pytest.raises(IndexError):
+        table[7]
+    assert table._list is None
+
+    table.append('NEW')
+    assert table._list is not None
+    assert table.index('NEW') == 7 and table[1:3] == ['EH', 'SPY']
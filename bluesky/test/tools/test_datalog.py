@@ -0,0 +1,217 @@
+"""
+Tests the datalog chunk buffers and log formats.
+"""
+import os
+import signal
+from threading import Event, Thread
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+import bluesky as bs
+from bluesky import settings
+from bluesky.tools import datalog
+
+
+@pytest.fixture
+def logger(monkeypatch):
+    """
+    Logger of two log steps of three aircraft, with a chunk size of four rows,
+    so that the log is written in two chunks.
+    """
+    monkeypatch.setattr(bs, 'sim', SimpleNamespace(simt=0.0), raising=False)
+    monkeypatch.setattr(settings, 'log_chunksize', 4)
+    logger = datalog.CSVLogger('TESTLOG', 0.0, 'Test log\nsecond line')
+
+    def run(fname, fmt='CSV'):
+        assert logger.setformat(fmt) is True
+        logger.open(fname)
+        alt = np.array([1000.0, 2000.0, 3000.0])
+        for simt in (1.0, 2.0):
+            bs.sim.simt = simt
+            logger.log(['KL204', 'BA12', 'AF3'], alt, np.arange(3), 'x')
+            alt += 0.5
+        logger.reset()
+        datalog.writequeue.join()
+    return run
+
+
+def test_datalog_csv(logger, tmp_path):
+    """
+    The CSV log should contain the header and one line per aircraft per log step.
+    """
+    fname = str(tmp_path / 'test.log')
+    logger(fname)
+    with open(fname) as f:
+        lines = f.read().splitlines()
+    assert lines[:3] == ['# Test log', '# second line', '# simt']
+    assert len(lines) == 9
+    assert lines[3] == '1.00000000,KL204,1000.00000000,0,x'
+    assert lines[8] == '2.00000000,AF3,3000.50000000,2,x'
+
+
+def test_datalog_csv_each_step(monkeypatch, tmp_path):
+    """
+    The rows of a CSV log should be written at each log step, not only when
+    a chunk is full, and all logs should be closed at exit.
+    """
+    monkeypatch.setattr(bs, 'sim', SimpleNamespace(simt=1.0), raising=False)
+    monkeypatch.setattr(datalog, 'allloggers', dict())
+    fname = str(tmp_path / 'test.log')
+    log = datalog.crelog('TESTLOG')
+    assert log.setformat('CSV') is True
+    log.open(fname)
+    log.log(['KL204', 'BA12'], np.array([1000.0, 2000.0]))
+    datalog.writequeue.join()
+    with open(fname) as f:
+        assert f.read().splitlines()[2:] == [
+            '1.00000000,KL204,1000.00000000', '1.00000000,BA12,2000.00000000']
+
+    log.log(['AF3'], np.array([3000.0]))
+    datalog.closeall()
+    assert not log.isopen()
+    with open(fname) as f:
+        assert f.read().splitlines()[-1] == '1.00000000,AF3,3000.00000000'
+
+
+def test_datalog_npz(logger, tmp_path):
+    """
+    The NPZ log should contain the typed columns of both chunks.
+    """
+    fname = str(tmp_path / 'test.npz')
+    logger(fname, 'NPZ')
+    header, columns = datalog.readlog(fname)
+    assert header == 'Test log\nsecond line'
+    assert list(columns) == ['simt', 'var1', 'var2', 'var3', 'var4']
+    np.testing.assert_array_equal(columns['simt'], [1.0, 1.0, 1.0, 2.0, 2.0, 2.0])
+    np.testing.assert_array_equal(columns['var2'], [1000.0, 2000.0, 3000.0,
+                                                    1000.5, 2000.5, 3000.5])
+    assert columns['var3'].dtype.kind == 'i'
+    assert list(columns['var1']) == 2 * ['KL204', 'BA12', 'AF3']
+
+
+def test_datalog_parquet(logger, tmp_path):
+    """
+    The parquet log should contain the same columns as the NPZ log.
+    """
+    pytest.importorskip('pyarrow')
+    fname = str(tmp_path / 'test.parquet')
+    logger(fname, 'PARQUET')
+    header, columns = datalog.readlog(fname)
+    assert header == 'Test log\nsecond line'
+    np.testing.assert_array_equal(columns['var2'], [1000.0, 2000.0, 3000.0,
+                                                    1000.5, 2000.5, 3000.5])
+
+
+def test_logbuffer_promote():
+    """
+    Rows that don't fit in the buffer or the buffer type should be accepted.
+    """
+    buf = datalog.LogBuffer(2)
+    buf.append([np.arange(2)])
+    buf.append([np.array([0.5, 1.5, 2.5])])
+    np.testing.assert_array_equal(buf.take()[0], [0.0, 1.0, 0.5, 1.5, 2.5])
+
+
+def test_logbuffer_columns_changed(monkeypatch, tmp_path):
+    """
+    Rows with another number of columns should not overwrite the rows that
+    are already logged, and variables can't be added to an open log.
+    """
+    monkeypatch.setattr(bs, 'sim', SimpleNamespace(simt=0.0), raising=False)
+    buf = datalog.LogBuffer(4)
+    buf.append([np.arange(2)])
+    with pytest.raises(ValueError):
+        buf.append([np.arange(2), np.arange(2)])
+    np.testing.assert_array_equal(buf.take()[0], [0, 1])
+
+    fname = str(tmp_path / 'test.npz')
+    log = datalog.CSVLogger('TESTLOG', 0.0, '')
+    assert log.setformat('NPZ') is True
+    log.open(fname)
+    assert log.stackio('ADD', 'traf.lat')[0] is False
+    log.log(np.arange(3))
+    log.log(np.arange(3), np.arange(3.0))
+    log.reset()
+    datalog.writequeue.join()
+    header, columns = datalog.readlog(fname)
+    np.testing.assert_array_equal(columns['var1'], [0, 1, 2, 0, 1, 2])
+    np.testing.assert_array_equal(columns['var2'], [0.0, 1.0, 2.0])
+
+
+@pytest.mark.parametrize('policy', ['DROP', 'SPILL'])
+def test_writequeue_backpressure(policy, monkeypatch, tmp_path):
+    """
+    With a full queue, the oldest chunks should be dropped, or new chunks
+    should be spilled to disk and written later.
+    """
+    monkeypatch.setattr(settings, 'log_queuesize', 2)
+    monkeypatch.setattr(settings, 'log_backpressure', policy)
+    monkeypatch.setattr(settings, 'log_spillpath', str(tmp_path))
+    queue = datalog.WriteQueue()
+    written = []
+    # Keep the writer thread busy until all chunks are queued
+    gate, started = Event(), Event()
+    queue.put(lambda: started.set() or gate.wait())
+    started.wait()
+    for i in range(5):
+        queue.put(lambda chunk: written.append(chunk[0][0]), chunk=[np.array([i])])
+    gate.set()
+    queue.join()
+
+    if policy == 'DROP':
+        assert written == [3, 4]
+        assert queue.ndropped == 3
+    else:
+        assert written == [0, 1, 2, 3, 4]
+        assert queue.nspilled == 3
+        assert not os.listdir(str(tmp_path))
+    assert 'Chunks written: {}'.format(len(written)) in queue.stats()
+
+
+def test_writequeue_plugin_jobs(monkeypatch):
+    """
+    Jobs of plugins that write their own files should also count in the
+    queue size, and block when the queue is full.
+    """
+    monkeypatch.setattr(settings, 'log_queuesize', 2)
+    monkeypatch.setattr(settings, 'log_backpressure', 'DROP')
+    queue = datalog.WriteQueue()
+    written = []
+    gate, started, done = Event(), Event(), Event()
+    queue.put(lambda: started.set() or gate.wait())
+    started.wait()
+
+    def producer():
+        for i in range(4):
+            queue.put(written.append, i)
+        done.set()
+    thread = Thread(target=producer, daemon=True)
+    thread.start()
+    # Two jobs fit in the queue, the third waits, and none are dropped
+    assert not done.wait(0.2)
+    assert queue.inmemory == 2
+    gate.set()
+    thread.join()
+    queue.join()
+    assert written == [0, 1, 2, 3]
+    assert queue.ndropped == 0
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires fork')
+def test_writequeue_fork():
+    """
+    A forked child process should start its own writer thread, instead of
+    waiting for the thread of the parent.
+    """
+    written = []
+    datalog.writequeue.put(written.append, 0)
+    datalog.writequeue.join()
+    pid = os.fork()
+    if pid == 0:
+        # Don't wait forever when the child hangs
+        signal.alarm(5)
+        datalog.writequeue.put(written.append, 1)
+        datalog.writequeue.join()
+        os._exit(0 if written == [0, 1] else 1)
+    assert os.waitpid(pid, 0)[1] == 0
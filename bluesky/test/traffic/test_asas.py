@@ -0,0 +1,70 @@
+"""
+Tests the ASAS conflict bookkeeping.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+import bluesky as bs
+from bluesky.tools.trafficarrays import TrafficArrays
+from bluesky.traffic.asas import ASAS
+
+
+class Route:
+    """
+    Route stub without waypoints.
+    """
+    def findact(self, idx):
+        return -1
+
+
+@pytest.fixture
+def asas(monkeypatch):
+    """
+    ASAS object for five aircraft flying north in a row, 9 nm apart.
+    """
+    ntraf = 5
+    traf = SimpleNamespace(
+        ntraf=ntraf, id=['AC%d' % i for i in range(ntraf)],
+        lat=52.0 + 0.15 * np.arange(ntraf), lon=np.full(ntraf, 4.0),
+        gsnorth=np.full(ntraf, 200.0), gseast=np.zeros(ntraf),
+        trk=np.zeros(ntraf), ap=SimpleNamespace(route=[Route() for _ in range(ntraf)]))
+    traf.id2idx = lambda acids: [traf.id.index(acid) for acid in acids]
+    monkeypatch.setattr(bs, 'traf', traf)
+    monkeypatch.setattr(TrafficArrays, 'root', None)
+
+    asas = ASAS()
+    TrafficArrays.create(asas, ntraf)
+    return asas
+
+
+def test_resopairs_follow_delete(asas):
+    """
+    Deleting aircraft should shift the resolution pair indices, remove pairs
+    of deleted ownships, and mark deleted intruders.
+    """
+    asas.addresopairs([('AC0', 'AC3'), ('AC3', 'AC0'), ('AC1', 'AC4'),
+                       ('AC4', 'AC2'), ('AC0', 'AC3')])
+    assert len(asas.resoidx1) == 4
+
+    asas.delete(np.array([2, 3]))
+    pairs = set(zip(asas.resoidx1, asas.resoidx2))
+    assert pairs == {(0, -1), (1, 2), (2, -1)}
+
+
+def test_resumenav(asas):
+    """
+    Pairs past CPA, and pairs with a deleted intruder are removed, and only
+    ownships that are not in any other conflict switch off ASAS.
+    """
+    # AC1 and AC2 have the same speed: only AC2 closes in on AC3
+    bs.traf.gsnorth[2] = 250.0
+    asas.addresopairs([('AC1', 'AC2'), ('AC2', 'AC3'), ('AC2', 'AC1'), ('AC4', 'AC0')])
+    asas.resoidx2[asas.resoidx1 == 4] = -1
+    asas.active[:] = True
+
+    bs.traf.trk[:] = [0.0, 90.0, 0.0, 90.0, 0.0]
+    asas.ResumeNav()
+
+    assert set(zip(asas.resoidx1, asas.resoidx2)) == {(2, 3)}
+    assert list(asas.active) == [True, False, True, True, False]
@@ -0,0 +1,112 @@
+"""
+Tests the alternative ASAS conflict detection methods against the
+reference state-based implementation.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from bluesky.tools.aero import nm, ft, kts, fpm
+from bluesky import settings
+from bluesky.traffic.asas import StateBasedCD, SpatialCD, TiledCD
+
+RPZ = 5.0 * nm
+HPZ = 1000.0 * ft
+TLOOKAHEAD = 300.0
+
+
+def random_traffic(ntraf, seed):
+    """
+    Generate a dense block of random traffic with the attributes
+    used by the conflict detection methods.
+    """
+    rng = np.random.RandomState(seed)
+    return SimpleNamespace(
+        ntraf=ntraf,
+        id=['AC%04d' % i for i in range(ntraf)],
+        lat=rng.uniform(51.0, 53.0, ntraf),
+        lon=rng.uniform(3.0, 6.0, ntraf),
+        trk=rng.uniform(0.0, 360.0, ntraf),
+        gs=rng.uniform(150.0, 450.0, ntraf) * kts,
+        alt=rng.uniform(2000.0, 12000.0, ntraf) * ft,
+        vs=rng.choice([-1500.0, 0.0, 0.0, 1500.0], ntraf) * fpm)
+
+
+@pytest.fixture(params=[0, 1, 2])
+def traffic(request):
+    """
+    Random traffic sets of varying size.
+    """
+    return random_traffic(50 + 100 * request.param, request.param)
+
+
+def assert_same_detection(result, reference):
+    """
+    Compare two conflict detection result tuples.
+    """
+    confpairs, lospairs, inconf, tcpamax, qdr, dist, dcpa, tcpa, tinconf = result
+    assert confpairs == reference[0]
+    assert lospairs == reference[1]
+    assert np.array_equal(inconf, reference[2])
+    np.testing.assert_allclose(tcpamax, reference[3], atol=1e-6)
+    for value, refvalue in zip((qdr, dist, dcpa, tcpa, tinconf), reference[4:]):
+        np.testing.assert_allclose(np.ravel(value), np.ravel(refvalue),
+                                   rtol=1e-9, atol=1e-6)
+
+
+def test_spatialcd_equals_statebased(traffic):
+    """
+    The grid-based CD should find exactly the same conflicts.
+    """
+    reference = StateBasedCD.detect(traffic, traffic, RPZ, HPZ, TLOOKAHEAD)
+    assert reference[0], 'Test traffic should contain conflicts'
+    result = SpatialCD.detect(traffic, traffic, RPZ, HPZ, TLOOKAHEAD)
+    assert_same_detection(result, reference)
+
+
+@pytest.mark.parametrize('blocksize', [1, 64, 1000])
+def test_tiledcd_equals_statebased(traffic, blocksize, monkeypatch):
+    """
+    Block-wise CD should give the same results for any block size.
+    """
+    monkeypatch.setattr(settings, 'asas_cdblocksize', blocksize, raising=False)
+    monkeypatch.setattr(settings, 'asas_cdfloat32', False, raising=False)
+    reference = StateBasedCD.detect(traffic, traffic, RPZ, HPZ, TLOOKAHEAD)
+    result = TiledCD.detect(traffic, traffic, RPZ, HPZ, TLOOKAHEAD)
+    assert_same_detection(result, reference)
+
+
+def test_tiledcd_float32(traffic, monkeypatch):
+    """
+    Single precision CD should find the same conflicts, with small
+    differences in the conflict geometry.
+    """
+    monkeypatch.setattr(settings, 'asas_cdblocksize', 64, raising=False)
+    monkeypatch.setattr(settings, 'asas_cdfloat32', True, raising=False)
+    reference = StateBasedCD.detect(traffic, traffic, RPZ, HPZ, TLOOKAHEAD)
+    result = TiledCD.detect(traffic, traffic, RPZ, HPZ, TLOOKAHEAD)
+    assert result[0] == reference[0]
+    assert result[1] == reference[1]
+    np.testing.assert_allclose(result[5], reference[5], rtol=1e-4)
+    np.testing.assert_allclose(result[7], reference[7], rtol=1e-3, atol=0.1)
+
+
+def test_compiled_equals_statebased(traffic):
+    """
+    The compiled CD kernel (when it is built) should find the same conflicts
+    as the python implementation.
+    """
+    casas = pytest.importorskip('bluesky.traffic.asas.casas')
+    reference = StateBasedCD.detect(traffic, traffic, RPZ, HPZ, TLOOKAHEAD)
+    result = casas.detect(traffic, traffic, RPZ, HPZ, TLOOKAHEAD)
+    assert_same_detection(result, reference)
+
+
+def test_spatialcd_candidates_dateline():
+    """
+    Pairs on either side of the dateline and near the pole should be found.
+    """
+    lat = np.array([10.0, 10.0, 89.99, 89.99])
+    lon = np.array([179.99, -179.99, 0.0, 180.0])
+    i, j = SpatialCD.candidates(lat, lon, lat, lon, 5.0 * nm)
+    assert list(zip(i, j)) == [(0, 1), (1, 0), (2, 3), (3, 2)]
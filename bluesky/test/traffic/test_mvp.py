@@ -0,0 +1,93 @@
+"""
+Tests that the vectorised MVP resolution equals the pair-by-pair method.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from bluesky.tools.aero import nm, ft
+from bluesky.traffic.asas import MVP
+
+
+def resolution_pairwise(asas, traf):
+    """
+    The resolutions as they were summed per conflict pair.
+    """
+    dv = np.zeros((traf.ntraf, 3))
+    timesolveV = np.ones(traf.ntraf)*1e9
+    for ((ac1, ac2), qdr, dist, tcpa, tLOS) in zip(asas.confpairs, asas.qdr, asas.dist, asas.tcpa, asas.tLOS):
+        id1 = traf.id2idx(ac1)
+        id2 = traf.id2idx(ac2)
+        if id1 > -1 and id2 > -1:
+            dv_mvp, tsolV = MVP.MVP(traf, asas, qdr, dist, tcpa, tLOS, id1, id2)
+            if tsolV < timesolveV[id1]:
+                timesolveV[id1] = tsolV
+            if asas.swprio:
+                dv[id1], _ = MVP.prioRules(traf, asas.priocode, dv_mvp, dv[id1], dv[id2], id1, id2)
+            else:
+                dv_mvp[2] = 0.5 * dv_mvp[2]
+                dv[id1] = dv[id1] - dv_mvp
+            if asas.swnoreso:
+                if ac2 in asas.noresolst:
+                    dv[id1] = dv[id1] + dv_mvp
+            if asas.swresooff:
+                if ac1 in asas.resoofflst:
+                    dv[id1] = 0.0
+    return dv, timesolveV
+
+
+def scenario(seed, ntraf=60, npairs=2000):
+    """
+    Random traffic and conflict pairs, with head-on, level and unknown
+    aircraft pairs.
+    """
+    rng = np.random.RandomState(seed)
+    acids = ['AC%d' % i for i in range(ntraf)]
+    vs = rng.choice([0.0, 0.05, 5.0, -5.0], ntraf)
+    traf = SimpleNamespace(
+        ntraf=ntraf, id=acids, alt=rng.choice([3000.0, 3050.0, 3300.0], ntraf),
+        gseast=rng.uniform(-250.0, 250.0, ntraf), gsnorth=rng.uniform(-250.0, 250.0, ntraf),
+        vs=vs)
+    traf.id2idx = lambda acid: [acids.index(a) if a in acids else -1 for a in acid] \
+        if isinstance(acid, list) else (acids.index(acid) if acid in acids else -1)
+
+    idx = rng.randint(0, ntraf + 2, (npairs, 2))
+    confpairs = [('AC%d' % i, 'AC%d' % j) for i, j in idx]
+    dist = rng.uniform(0.0, 10.0 * nm, npairs)
+    dist[:10] = 0.0
+    tcpa = rng.uniform(-30.0, 300.0, npairs)
+    tcpa[10:20] = 0.0
+    asas = SimpleNamespace(
+        confpairs=confpairs, qdr=rng.uniform(-180.0, 180.0, npairs), dist=dist, tcpa=tcpa,
+        tLOS=rng.uniform(0.0, 300.0, npairs), Rm=5.0 * nm * 1.05, dhm=1000.0 * ft * 1.05,
+        dtlookahead=300.0, swprio=False, priocode='FF1', swnoreso=False,
+        noresolst=acids[::7], swresooff=False, resoofflst=acids[::11])
+    return asas, traf
+
+
+@pytest.mark.parametrize('priocode', [None, 'FF1', 'FF2', 'FF3', 'LAY1', 'LAY2'])
+@pytest.mark.parametrize('noreso,resooff', [(False, False), (True, False), (True, True)])
+def test_resolution_equals_pairwise(priocode, noreso, resooff):
+    """
+    Resolutions of all pairs at once should be bit-for-bit equal to the
+    resolutions applied pair by pair.
+    """
+    asas, traf = scenario(0)
+    asas.swprio = priocode is not None
+    asas.priocode = priocode
+    asas.swnoreso, asas.swresooff = noreso, resooff
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dv_ref, tsolV_ref = resolution_pairwise(asas, traf)
+    dv, tsolV = MVP.resolution(asas, traf)
+    assert dv.tobytes() == dv_ref.tobytes()
+    assert tsolV.tobytes() == tsolV_ref.tobytes()
+
+
+def test_resolution_no_conflicts():
+    """
+    Without conflicts, there should be no resolutions.
+    """
+    asas, traf = scenario(1)
+    asas.confpairs = []
+    dv, tsolV = MVP.resolution(asas, traf)
+    assert not dv.any() and (tsolV == 1e9).all()
@@ -0,0 +1,126 @@
+"""
+Tests the prefilter, process pool and reuse of the SSD resolution method.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+pytest.importorskip('pyclipper')
+
+from bluesky import settings
+from bluesky.tools import geo
+from bluesky.tools.aero import nm
+from bluesky.traffic.asas import SSD
+
+
+def scenario(seed, ntraf=80):
+    """
+    Random traffic around one point, with a few aircraft in LoS and one
+    far away, of which about a third is in conflict.
+    """
+    rng = np.random.RandomState(seed)
+    hdg = rng.uniform(0.0, 360.0, ntraf)
+    gs = rng.uniform(110.0, 250.0, ntraf)
+    traf = SimpleNamespace(
+        ntraf=ntraf, id=['AC%d' % i for i in range(ntraf)],
+        lat=rng.normal(52.0, 0.8, ntraf), lon=rng.normal(4.0, 1.2, ntraf),
+        hdg=hdg, trk=hdg, gs=gs, vs=np.zeros(ntraf),
+        gsnorth=gs * np.cos(np.radians(hdg)), gseast=gs * np.sin(np.radians(hdg)),
+        ap=SimpleNamespace(tas=gs * 1.02, trk=hdg + 5.0))
+    traf.lat[:4] = [52.0, 52.01, 52.0, 60.0]
+    traf.lon[:4] = [4.0, 4.0, 4.02, 4.0]
+    asas = SimpleNamespace(vmin=200.0 * nm / 3600.0, vmax=500.0 * nm / 3600.0,
+                           R=5.0 * nm, mar=1.05, swasas=True, priocode='RS1',
+                           asaseval=False)
+    SSD.initializeSSD(asas, ntraf)
+    asas.inconf = rng.uniform(size=ntraf) < 0.3
+    asas.inconf[:4] = True
+    return asas, traf
+
+
+def construct(asas, traf):
+    SSD.constructSSD(asas, traf, asas.priocode)
+    SSD.calculate_resolution(asas, traf)
+    return dict(FRV=asas.FRV, ARV=asas.ARV, ARV_calc=asas.ARV_calc,
+                inrange=[None if r is None else list(r) for r in asas.inrange],
+                FRV_area=asas.FRV_area.tolist(), ARV_area=asas.ARV_area.tolist(),
+                asase=asas.asase.tolist(), asasn=asas.asasn.tolist())
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    SSD.ssdcache.clear()
+    yield
+    SSD.ssdcache.clear()
+
+
+def test_inrange_pairs():
+    """
+    The prefilter should keep all pairs with aircraft in conflict that are
+    within range, and no others that are far out of range.
+    """
+    asas, traf = scenario(1, 300)
+    iconf = np.flatnonzero(asas.inconf)
+    ind1, ind2 = SSD.inrange_pairs(traf.lat, traf.lon, iconf, 65.0 * nm)
+    assert np.all(ind1 < ind2)
+    assert np.all(asas.inconf[ind1] | asas.inconf[ind2])
+
+    i, j = np.triu_indices(traf.ntraf, 1)
+    _, dist = geo.qdrdist_matrix(traf.lat[i], traf.lon[i], traf.lat[j], traf.lon[j])
+    dist = np.asarray(dist).ravel() * nm
+    found = set(zip(ind1.tolist(), ind2.tolist()))
+    inconf = asas.inconf[i] | asas.inconf[j]
+    assert {(a, b) for a, b, d, c in zip(i, j, dist, inconf) if c and d < 65.0 * nm} <= found
+    assert not {(a, b) for a, b, d in zip(i, j, dist) if d > 70.0 * nm} & found
+
+
+def test_pool(monkeypatch):
+    """
+    The SSDs constructed in a process pool should be equal to the ones
+    constructed serially.
+    """
+    serial = construct(*scenario(2))
+    SSD.ssdcache.clear()
+    monkeypatch.setattr(settings, 'asas_ssd_nworkers', 2, raising=False)
+    try:
+        assert construct(*scenario(2)) == serial
+        assert SSD.pool is not None and SSD.poolsize == 2
+
+        # The pool is terminated when the number of workers changes
+        SSD.ssdcache.clear()
+        monkeypatch.setattr(settings, 'asas_ssd_nworkers', 1)
+        assert construct(*scenario(2)) == serial
+        assert SSD.pool is None
+    finally:
+        SSD.stop()
+
+
+def test_reuse(monkeypatch):
+    """
+    SSDs should be reused when their inputs didn't change (within the
+    tolerance), and be constructed again when they did.
+    """
+    calls = []
+    mapSSD = SSD.mapSSD
+    monkeypatch.setattr(SSD, 'mapSSD', lambda tasks: calls.append(len(tasks)) or mapSSD(tasks))
+
+    asas, traf = scenario(3)
+    first = construct(asas, traf)
+    nconf = np.count_nonzero(asas.inconf)
+    assert calls == [nconf]
+    assert construct(asas, traf) == first
+    assert calls == [nconf, 0]
+
+    # A small change of one speed is only ignored with a tolerance
+    traf.gseast[0] += 0.01
+    construct(asas, traf)
+    assert calls[-1] > 0
+    monkeypatch.setattr(settings, 'asas_ssd_reusetol', 0.1, raising=False)
+    traf.gseast[0] += 0.01
+    construct(asas, traf)
+    assert calls[-1] == 0
+
+    # Another priocode doesn't reuse the SSDs
+    asas.priocode = 'RS5'
+    construct(asas, traf)
+    assert calls[-1] == nconf
@@ -0,0 +1,102 @@
+"""
+Tests that the sparse Swarm resolution equals the dense matrix method.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+from bluesky.tools import geo
+from bluesky.tools.aero import nm
+from bluesky.traffic.asas import Swarm
+
+
+def resolve_dense(asas, traf):
+    """
+    The Swarm velocities as they were averaged over ntraf x ntraf matrices.
+    """
+    n = traf.ntraf
+    qdr, dist = geo.qdrdist_matrix(np.mat(traf.lat), np.mat(traf.lon),
+                                   np.mat(traf.lat), np.mat(traf.lon))
+    qdrrad = np.radians(np.array(qdr))
+    dist = np.array(dist) * nm + 1e9 * np.eye(n)
+    dx = dist * np.sin(qdrrad)
+    dy = dist * np.cos(qdrrad) - np.eye(n) * 1e9
+
+    dalt = traf.alt.reshape((1, n)) - traf.alt.reshape((1, n)).T
+    close = np.logical_and(dx**2 + dy**2 < asas.Rswarm**2, np.abs(dalt) < asas.dhswarm)
+    dtrk = (traf.trk.reshape(1, n) - traf.trk.reshape(n, 1) + 180) % 360 - 180
+    Swarming = np.logical_or(np.logical_and(close, np.abs(dtrk) < 90), np.eye(n, dtype=bool))
+
+    va_cas = np.average(np.ones((n, n)) * traf.cas, axis=1, weights=Swarming)
+    va_vs = np.average(np.ones((n, n)) * traf.vs, axis=1, weights=Swarming)
+    va_trk = traf.trk + np.average(dtrk, axis=1, weights=Swarming)
+    fc_dx = np.average(dx + np.eye(n) * traf.gseast / 100., axis=1, weights=Swarming)
+    fc_dy = np.average(dy + np.eye(n) * traf.gsnorth / 100., axis=1, weights=Swarming)
+    fc_dz = np.average(np.ones((n, n)) * traf.alt, axis=1, weights=Swarming) - traf.alt
+    return Swarming, va_cas, va_vs, va_trk, fc_dx, fc_dy, fc_dz
+
+
+def scenario(seed, ntraf=200):
+    """
+    Random traffic in a small area, with aircraft on the dateline and at
+    the same position.
+    """
+    rng = np.random.RandomState(seed)
+    trk = rng.uniform(0.0, 360.0, ntraf)
+    gs = rng.uniform(100.0, 250.0, ntraf)
+    traf = SimpleNamespace(
+        ntraf=ntraf, lat=rng.uniform(51.8, 52.2, ntraf), lon=rng.uniform(3.7, 4.3, ntraf),
+        alt=rng.choice([3000.0, 3100.0, 3400.0, 4000.0], ntraf), trk=trk,
+        cas=gs, vs=rng.choice([0.0, 5.0, -5.0], ntraf),
+        gseast=gs * np.sin(np.radians(trk)), gsnorth=gs * np.cos(np.radians(trk)),
+        selspd=gs, selvs=np.zeros(ntraf), ap=SimpleNamespace(trk=trk))
+    traf.lat[:3] = [10.0, 10.02, 10.0]
+    traf.lon[:3] = [179.99, -179.99, 179.99]
+    traf.trk[:3] = [90.0, 80.0, 100.0]
+    traf.lat[3:5], traf.lon[3:5] = 52.0, 4.0
+    asas = SimpleNamespace(vmin=50.0, vmax=300.0, active=np.zeros(ntraf, dtype=bool),
+                           trk=trk.copy(), tas=gs.copy(), vs=np.zeros(ntraf))
+    Swarm.start(asas)
+    return asas, traf
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_swarm_sparse(seed, monkeypatch):
+    """
+    The sparse neighbour list and averages should equal the dense ones.
+    """
+    asas, traf = scenario(seed)
+    Swarming, va_cas, va_vs, va_trk, fc_dx, fc_dy, fc_dz = resolve_dense(asas, traf)
+
+    i, j, dx, dy, dtrk = Swarm.neighbours(asas, traf)
+    assert np.all(np.diff(i) >= 0)
+    sparse = np.eye(traf.ntraf, dtype=bool)
+    sparse[i, j] = True
+    assert np.array_equal(sparse, Swarming)
+
+    count = 1.0 + np.bincount(i, minlength=traf.ntraf)
+    assert np.allclose(Swarm.average(i, traf.cas, traf.cas[j], count), va_cas)
+    assert np.allclose(Swarm.average(i, traf.vs, traf.vs[j], count), va_vs)
+    assert np.allclose(traf.trk + Swarm.average(i, np.zeros(traf.ntraf), dtrk, count), va_trk)
+    assert np.allclose(Swarm.average(i, traf.gseast / 100., dx, count), fc_dx)
+    assert np.allclose(Swarm.average(i, traf.gsnorth / 100., dy, count), fc_dy)
+    assert np.allclose(Swarm.average(i, traf.alt, traf.alt[j], count), fc_dz + traf.alt)
+
+    # Resolve with MVP switched off
+    monkeypatch.setattr(Swarm.MVP, 'resolve', lambda asas, traf: None)
+    Swarm.resolve(asas, traf)
+    assert asas.active.all()
+    assert np.all((asas.tas >= asas.vmin) & (asas.tas <= asas.vmax))
+    assert np.all(np.isfinite(asas.trk)) and np.all(np.isfinite(asas.vs))
+
+
+def test_swarm_no_neighbours():
+    """
+    Aircraft without neighbours should only swarm with themselves.
+    """
+    asas, traf = scenario(0, 10)
+    asas.Rswarm = 1.0
+    i, j, dx, dy, dtrk = Swarm.neighbours(asas, traf)
+    # Only the aircraft at the same position are left
+    assert list(zip(i, j)) == [(0, 2), (2, 0), (3, 4), (4, 3)]
+    assert np.all(dx == 0.0) and np.all(dy == 0.0)
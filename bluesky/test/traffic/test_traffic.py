@@ -7,8 +7,13 @@ GNU General Public License v3.
 Author <ahfarrell@sparkl.com> Andrew Farrell
 Tests traffic module
 """
+from types import SimpleNamespace
+import pytest
 
-from bluesky.tools.aero import casormach
+import bluesky as bs
+from bluesky import stack
+from bluesky.tools.aero import casormach, ft, kts
+from bluesky.tools.trafficarrays import TrafficArrays
 
 
 def test_traffic_create_missingarg_fail(traffic_):
@@ -146,4 +151,122 @@ def test_traffic_reset(traffic_):
     validate_lengths(traffic_, 0)
 
 
+@pytest.fixture
+def bare_traffic(monkeypatch):
+    """
+    A new Traffic object that doesn't need the navigation database, with a
+    screen stub, for those test functions naming `bare_traffic` in their
+    parameter lists.
+    """
+    from bluesky.traffic import Traffic
+    # Keep the root of the TrafficArrays tree of the session traffic object
+    monkeypatch.setattr(TrafficArrays, 'root', TrafficArrays.root)
+    monkeypatch.setattr(bs, 'scr', SimpleNamespace(
+        getviewbounds=lambda: (51.0, 53.0, 3.0, 6.0), getviewctr=lambda: (52.0, 4.5),
+        echo=lambda text, flags=0: None), raising=False)
+    traf = Traffic()
+    monkeypatch.setattr(bs, 'traf', traf, raising=False)
+    yield traf
+
+
+def test_traffic_create_batch(bare_traffic):
+    """
+    Test bulk creation without navdata: all arrays get the values of the
+    batch, and a batch with an existing or duplicate callsign is refused.
+    """
+    bare_traffic.create(3, ['B744', 'A320', 'B744'], [1000.0, 2000.0, 3000.0],
+                        [100.0, 150.0, 200.0], None, [0.0, 1.0, 2.0],
+                        [50.0, 51.0, 52.0], [90.0, 180.0, 270.0],
+                        ['BT1', 'BT2', 'BT3'])
+    assert bare_traffic.ntraf == 3
+    assert len(bare_traffic.lat) == len(bare_traffic.perf.mass) == len(bare_traffic.ap.trk) == 3
+    assert bare_traffic.id == ['BT1', 'BT2', 'BT3']
+    assert bare_traffic.type == ['B744', 'A320', 'B744']
+    assert list(bare_traffic.lat) == [0.0, 1.0, 2.0]
+    assert list(bare_traffic.lon) == [50.0, 51.0, 52.0]
+    assert list(bare_traffic.alt) == [1000.0, 2000.0, 3000.0]
+    assert list(bare_traffic.hdg) == [90.0, 180.0, 270.0]
+    assert bare_traffic.perf.mass[0] == bare_traffic.perf.mass[2] != bare_traffic.perf.mass[1]
+
+    ok, _msg = bare_traffic.create(2, 'B744', acid=['BT4', 'BT1'])
+    assert not ok
+    ok, _msg = bare_traffic.create(2, 'B744', acid=['BT4', 'BT4'])
+    assert not ok
+    assert bare_traffic.ntraf == len(bare_traffic.lat) == 3
+
+
+def test_traffic_cre_coalesced(bare_traffic, monkeypatch):
+    """
+    Test that consecutive CRE commands on the stack are created with one
+    bulk create, which is flushed before other commands and before a CRE
+    that refers to an aircraft in the batch.
+    """
+    calls = []
+    create = bare_traffic.create
+    monkeypatch.setattr(bare_traffic, 'create',
+                        lambda n=1, *args, **kwargs: calls.append(n) or create(n, *args, **kwargs))
+    # Only the CRE command, removed from the command dictionary after the test
+    monkeypatch.setitem(stack.cmddict, 'CRE', None)
+    stack.append_commands({'CRE': [
+        'CRE acid,type,lat,lon,hdg,alt,spd', 'txt,txt,latlon,hdg,alt,spd',
+        lambda acid, actype, lat, lon, hdg, alt, spd: bs.traf.create(
+            1, actype, alt, spd, None, lat, lon, hdg, acid),
+        'Create an aircraft']})
+
+    for i in range(3):
+        stack.stack('CRE KL%d B744 52.0 4.%d 90 FL100 250' % (i, i))
+    stack.stack('CRE KL3 A320 KL1 180 FL200 300')
+    stack.stack('CRE KL0 B744 52.0 4.0 90 FL100 250')
+    stack.process()
+
+    assert calls == [3, 1, 1]
+    assert bare_traffic.id == ['KL0', 'KL1', 'KL2', 'KL3']
+    assert list(bare_traffic.lon[:3]) == [4.0, 4.1, 4.2]
+    assert (bare_traffic.lat[3], bare_traffic.lon[3]) == (52.0, 4.1)
+    assert list(bare_traffic.alt) == [10000 * ft] * 3 + [20000 * ft]
+    assert abs(bare_traffic.cas[3] - 300 * kts) < 1e-6
+
+
+def test_traffic_id2idx(bare_traffic):
+    """
+    Test the aircraft id index without navdata, after creating and
+    deleting single aircraft and batches, and after a reset.
+    """
+    acids = ['ID%d' % i for i in range(6)]
+    bare_traffic.create(6, 'B744', acid=acids)
+    bare_traffic.create(1, 'A320', acid='ID6')
+    assert bare_traffic.id2idx('*') == 6
+    assert bare_traffic.create(1, 'A320', acid='id6')[0] is False
+
+    bare_traffic.delete(1)
+    bare_traffic.delete([2, 0])
+    assert bare_traffic.id == ['ID2', 'ID4', 'ID5', 'ID6']
+    assert bare_traffic.id2idx('id4') == 1
+    assert bare_traffic.id2idx(['ID5', 'ID0', 'ID2']) == [2, -1, 0]
+    assert all(bare_traffic.id2idx(acid) == i for i, acid in enumerate(bare_traffic.id))
+
+    # A deleted callsign can be used again
+    bare_traffic.create(1, 'B744', acid='ID3')
+    assert bare_traffic.id2idx('ID3') == 4
+
+    bare_traffic.reset()
+    assert bare_traffic.id2idx(['ID2', 'ID3']) == [-1, -1]
+
+
+def test_traffic_delete_index(bare_traffic):
+    """
+    Test the aircraft id index after deleting a batch with negative and
+    duplicate indices.
+    """
+    bare_traffic.create(5, 'B744', acid=['A%d' % i for i in range(5)])
+    bare_traffic.delete([1, -1])
+    assert bare_traffic.id == ['A0', 'A2', 'A3']
+    assert bare_traffic.idindex == {'A0': 0, 'A2': 1, 'A3': 2}
+
+    bare_traffic.delete([0, 0])
+    assert bare_traffic.id == ['A2', 'A3']
+    assert len(bare_traffic.lat) == bare_traffic.ntraf == 2
+    assert bare_traffic.idindex == {'A2': 0, 'A3': 1}
+
+
 # test remaining traffic functions
@@ -142,3 +142,45 @@ def test_trafficarrays_reset(t_a):
 
     assert not root.fl_list
     assert not root.children[0].np_array_bool
+
+
+def test_trafficarrays_capacity(monkeypatch):
+    """
+    Tests the preallocated storage of registered arrays: creating
+    elements shouldn't reallocate until the capacity is reached, and
+    deleting elements should keep the order of the remaining elements.
+    """
+    monkeypatch.setattr(ta.TrafficArrays, 'root', None)
+
+    class Storage(ta.TrafficArrays):
+        def __init__(self):
+            super(Storage, self).__init__()
+            with ta.RegisterElementParameters(self):
+                self.lat = np.array([])
+                self.flag = np.array([], dtype=bool)
+
+    obj = Storage()
+    obj.create(3)
+    buf = obj.lat.base
+    obj.create(4)
+    assert obj.lat.base is buf
+    assert len(obj.lat) == 7 and len(obj.flag) == 7
+
+    # Assigning a new array copies it into the buffer
+    obj.lat = obj.lat + np.arange(7.0)
+    obj.lat += 1.0
+    assert obj.lat.base is buf
+    assert list(obj.lat) == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0]
+
+    obj.delete(1)
+    obj.delete(np.array([0, 3, 5]))
+    assert list(obj.lat) == [3.0, 4.0, 6.0]
+    assert obj.lat.base is buf and len(obj.flag) == 3
+
+    # Growing beyond the capacity keeps the data
+    obj.create(len(buf))
+    assert list(obj.lat[:3]) == [3.0, 4.0, 6.0]
+    assert not obj.lat[3:].any()
+
+    obj.reset()
+    assert len(obj.lat) == 0 and len(obj.flag) == 0
@@ -0,0 +1,302 @@
+"""
+Tests the interpolation of the wind field in WindIris.
+"""
+import os
+from datetime import datetime
+from types import SimpleNamespace
+import numpy as np
+import pytest
+
+pytest.importorskip('iris')
+pytest.importorskip('scipy')
+from scipy import ndimage
+
+import bluesky as bs
+from bluesky import settings
+from bluesky.tools.aero import vatmos
+from bluesky.traffic.windiris import WindIris
+
+# Hours since 1900-01-01 of 2018-01-01 00:00
+T0 = 1034376.0
+
+
+@pytest.fixture
+def field():
+    """
+    North and east component of a random global wind field on a 2 degree
+    grid, with three forecast times and four pressure levels.
+    """
+    rng = np.random.RandomState(0)
+    shape = (3, 4, 91, 180)
+    return rng.normal(0.0, 20.0, shape), rng.normal(0.0, 20.0, shape)
+
+
+@pytest.fixture
+def wind(field, monkeypatch):
+    """
+    WindIris object with the random wind field.
+    """
+    monkeypatch.setattr(bs, 'sim', SimpleNamespace(utc=datetime(2018, 1, 1, 4, 30)),
+                        raising=False)
+    wind = WindIris()
+    wind.filename = 'random'
+    wind.ensemble_loaded = True
+    wind.grid_lat = np.arange(90.0, -90.1, -2.0)
+    wind.grid_lon = np.arange(0.0, 360.0, 2.0)
+    wind.grid_lat_spacing = wind.grid_lon_spacing = 2.0
+    wind.pressure = np.array([20000.0, 30000.0, 50000.0, 85000.0])
+    wind.forecasts_time = T0 + np.array([0.0, 3.0, 6.0])
+    wind.set_wind(*field)
+    yield wind
+    wind.close()
+
+
+def test_windiris_interpolation(wind, field):
+    """
+    Interpolating both components in one pass should give the same result
+    as first order spline interpolation of each component.
+    """
+    rng = np.random.RandomState(1)
+    lat = rng.uniform(-89.0, 89.0, 500)
+    # Longitudes within the grid (0-358 degrees), in BlueSky convention
+    lon = rng.uniform(0.0, 358.0, 500)
+    lon = np.where(lon > 180.0, lon - 360.0, lon)
+    alt = rng.uniform(0.0, 13000.0, 500)
+    north, east = wind.getdata(lat, lon, alt)
+
+    pressure = np.clip(vatmos(alt)[0], 20000.0, 85000.0)
+    coord = np.vstack((np.full(500, 1.5),
+                       np.interp(pressure, wind.pressure, np.arange(4)),
+                       (90.0 - lat) / 2.0, ((lon + 360.0) % 360.0) / 2.0))
+    np.testing.assert_allclose(north, ndimage.map_coordinates(field[0], coord, order=1))
+    np.testing.assert_allclose(east, ndimage.map_coordinates(field[1], coord, order=1))
+
+
+def test_windiris_periodic(wind):
+    """
+    Wind between the last longitude of the grid and 360 degrees should be
+    interpolated between the last and the first longitude.
+    """
+    north, east = wind.getdata(np.array([10.0]), np.array([-1.0]), np.array([11000.0]))
+    north0, east0 = wind.getdata(np.array([10.0]), np.array([0.0]), np.array([11000.0]))
+    north1, east1 = wind.getdata(np.array([10.0]), np.array([-2.0]), np.array([11000.0]))
+    np.testing.assert_allclose(north, 0.5 * (north0 + north1))
+    np.testing.assert_allclose(east, 0.5 * (east0 + east1))
+
+
+def test_windiris_time_cache(wind, monkeypatch):
+    """
+    The time index should follow the simulation time.
+    """
+    lat, lon, alt = np.array([52.0]), np.array([4.0]), np.array([5000.0])
+    north = wind.getdata(lat, lon, alt)[0]
+    monkeypatch.setattr(bs.sim, 'utc', datetime(2018, 1, 1, 3, 0))
+    assert wind.getdata(lat, lon, alt)[0] != north
+    assert wind.time_i == 1.0
+
+
+def test_windiris_slabs(wind, field, monkeypatch):
+    """
+    Only the forecast times around the simulation time, and the prefetched
+    next forecast time should be read and kept.
+    """
+    reads = []
+    def readslab(t):
+        reads.append(t)
+        return field[0][t], field[1][t]
+    wind.set_source(readslab)
+
+    lat, lon, alt = np.array([52.0]), np.array([4.0]), np.array([5000.0])
+    monkeypatch.setattr(bs.sim, 'utc', datetime(2018, 1, 1, 1, 0))
+    wind.getdata(lat, lon, alt)
+    wind.prefetching[1].join()
+    assert sorted(wind.slabs) == [0, 1]
+    assert wind.prefetching[0] == 2 and sorted(wind.prefetching[2]) == [2]
+    assert wind.wind.shape[0] == 2
+
+    monkeypatch.setattr(bs.sim, 'utc', datetime(2018, 1, 1, 4, 30))
+    wind.getdata(lat, lon, alt)
+    assert sorted(wind.slabs) == [1, 2]
+    assert sorted(reads) == [0, 1, 2]
+
+
+def test_windiris_prefetch_jumps(monkeypatch):
+    """
+    After a jump of more than one forecast time, back or forward, the
+    prefetch of the old window should be discarded, and the next forecast
+    time after the new window should be prefetched.
+    """
+    rng = np.random.RandomState(4)
+    north, east = rng.normal(0.0, 20.0, (2, 6, 2, 10, 20))
+    monkeypatch.setattr(bs, 'sim', SimpleNamespace(utc=datetime(2018, 1, 1, 1, 0)),
+                        raising=False)
+    wind = WindIris()
+    wind.filename = 'random'
+    wind.ensemble_loaded = True
+    wind.grid_lat_spacing = wind.grid_lon_spacing = 18.0
+    wind.pressure = np.array([20000.0, 85000.0])
+    wind.forecasts_time = T0 + 3.0 * np.arange(6)
+    wind.set_wind(north, east)
+
+    lat, lon, alt = np.array([52.0]), np.array([4.0]), np.array([5000.0])
+    wind.getdata(lat, lon, alt)
+    old = wind.prefetching
+    assert old[0] == 2
+
+    for hour, it in ((10, 3), (1, 0), (7, 2)):
+        monkeypatch.setattr(bs.sim, 'utc', datetime(2018, 1, 1, hour, 30))
+        wind.getdata(lat, lon, alt)
+        assert wind.window == it
+        assert wind.prefetching is not None and wind.prefetching[0] == it + 2 or it + 2 > 5
+        # A discarded prefetch never adds its slab to the kept slabs
+        old[1].join()
+        assert all(it <= t <= it + 2 for t in wind.slabs)
+        old = wind.prefetching or old
+
+    # Moving on by one forecast time uses the prefetched slab
+    monkeypatch.setattr(bs.sim, 'utc', datetime(2018, 1, 1, 10, 30))
+    wind.getdata(lat, lon, alt)
+    assert sorted(wind.slabs) == [3, 4]
+    np.testing.assert_array_equal(wind.wind[..., 0], north[3:5, :, :, list(range(20)) + [0]])
+    wind.close()
+
+
+def test_windiris_prefetch_close(monkeypatch):
+    """
+    A discarded prefetch should be kept until it is joined by close, so
+    that it can't read from a new wind source.
+    """
+    rng = np.random.RandomState(5)
+    north, east = rng.normal(0.0, 20.0, (2, 6, 2, 10, 20))
+    monkeypatch.setattr(bs, 'sim', SimpleNamespace(utc=datetime(2018, 1, 1, 1, 0)),
+                        raising=False)
+    wind = WindIris()
+    wind.filename = 'random'
+    wind.ensemble_loaded = True
+    wind.grid_lat_spacing = wind.grid_lon_spacing = 18.0
+    wind.pressure = np.array([20000.0, 85000.0])
+    wind.forecasts_time = T0 + 3.0 * np.arange(6)
+    wind.set_wind(north, east)
+
+    lat, lon, alt = np.array([52.0]), np.array([4.0]), np.array([5000.0])
+    wind.getdata(lat, lon, alt)
+    thread = wind.prefetching[1]
+
+    # Jump past the prefetched forecast time: the prefetch is discarded
+    monkeypatch.setattr(bs.sim, 'utc', datetime(2018, 1, 1, 10, 30))
+    wind.getdata(lat, lon, alt)
+    assert wind.discarded == [thread]
+
+    wind.close()
+    assert not thread.is_alive()
+    assert wind.prefetching is None and wind.discarded == []
+
+
+@pytest.fixture
+def ncfile(tmp_path, monkeypatch):
+    """
+    netCDF file with a random wind ensemble of three members, with four
+    forecast times and four pressure levels on a 2 degree grid. Returns the
+    file name and the wind data.
+    """
+    import iris
+    from iris.coords import DimCoord
+    from iris.cube import Cube, CubeList
+
+    coords = [DimCoord(T0 + np.array([0.0, 3.0, 6.0, 9.0]), standard_name='time',
+                       units='hours since 1900-01-01 00:00:0.0'),
+              DimCoord(np.arange(3), long_name='ensemble_member', var_name='number'),
+              DimCoord(np.array([200.0, 300.0, 500.0, 850.0]), long_name='pressure_level',
+                       var_name='level', units='millibars'),
+              DimCoord(np.arange(90.0, -90.1, -2.0), standard_name='latitude', units='degrees'),
+              DimCoord(np.arange(0.0, 360.0, 2.0), standard_name='longitude', units='degrees')]
+    rng = np.random.RandomState(2)
+    data = rng.normal(0.0, 20.0, (2, 4, 3, 4, 91, 180)).astype(np.float32)
+    cubes = CubeList([Cube(data[i], standard_name=name, units='m s-1',
+                           dim_coords_and_dims=[(coord, dim) for dim, coord in enumerate(coords)])
+                      for i, name in enumerate(['northward_wind', 'eastward_wind'])])
+    fname = str(tmp_path / 'wind.nc')
+    iris.save(cubes, fname)
+
+    monkeypatch.setattr(bs, 'sim', SimpleNamespace(utc=datetime(2018, 1, 1, 3, 0)),
+                        raising=False)
+    monkeypatch.setattr(settings, 'cache_path', str(tmp_path / 'cache'))
+    return fname, data
+
+
+def test_windiris_ensemble(ncfile, monkeypatch):
+    """
+    The wind of an ensemble member should be read from file relative to the
+    ensemble mean.
+    """
+    monkeypatch.setattr(settings, 'wind_sharedcache', False)
+    fname, data = ncfile
+    wind = WindIris()
+    wind.load_file(fname)
+    assert wind.load_ensemble(1)[0]
+
+    # Grid point at the third forecast time, lowest pressure level, 10N 4E
+    north, east = wind.getdata(np.array([10.0]), np.array([4.0]), np.array([0.0]))
+    expected = data[:, 1, 1, 3, 40, 2] - data[:, 1, :, 3, 40, 2].mean(axis=1)
+    np.testing.assert_allclose([north[0], east[0]], expected, rtol=1e-5)
+    assert sorted(wind.means) == [1, 2]
+    wind.close()
+
+
+def test_windiris_sharedcache(ncfile, monkeypatch):
+    """
+    The wind from the shared cache should be the same as the wind read
+    from file, and the cache should only be written once.
+    """
+    fname, data = ncfile
+    rng = np.random.RandomState(3)
+    lat = rng.uniform(-89.0, 89.0, 100)
+    lon = rng.uniform(-180.0, 180.0, 100)
+    alt = rng.uniform(0.0, 13000.0, 100)
+
+    monkeypatch.setattr(settings, 'wind_sharedcache', False)
+    wind = WindIris()
+    wind.load_file(fname)
+    wind.load_ensemble(2)
+    reference = wind.getdata(lat, lon, alt)
+    wind.close()
+
+    monkeypatch.setattr(settings, 'wind_sharedcache', True)
+    for _ in range(2):
+        wind = WindIris()
+        wind.load_file(fname)
+        wind.load_ensemble(2)
+        assert isinstance(wind.store, np.memmap)
+        np.testing.assert_allclose(wind.getdata(lat, lon, alt), reference, rtol=1e-6)
+        assert np.shares_memory(wind.wind, wind.store)
+    assert len(os.listdir(settings.cache_path)) == 1
+
+
+def test_windiris_sharedcache_lock(ncfile, monkeypatch):
+    """
+    Only the most recently used cache files should be kept, and while
+    another node writes the shared cache, the wind should be read from file.
+    """
+    fname, data = ncfile
+    monkeypatch.setattr(settings, 'wind_sharedcache', True)
+    monkeypatch.setattr(settings, 'wind_cachefiles', 1, raising=False)
+    for ensemble in (2, 1, 0):
+        wind = WindIris()
+        wind.load_file(fname)
+        wind.load_ensemble(ensemble)
+        cachename = wind.store.filename
+        assert os.listdir(settings.cache_path) == [os.path.basename(cachename)]
+
+    # Another node is writing the cache file of member 0
+    del wind
+    os.remove(cachename)
+    open(cachename + '.lock', 'w').close()
+    wind = WindIris()
+    wind.load_file(fname)
+    wind.load_ensemble(0)
+    assert wind.store is None
+    assert os.listdir(settings.cache_path) == [os.path.basename(cachename) + '.lock']
+    north, east = wind.getdata(np.array([10.0]), np.array([4.0]), np.array([0.0]))
+    expected = data[:, 1, 0, 3, 40, 2] - data[:, 1, :, 3, 40, 2].mean(axis=1)
+    np.testing.assert_allclose([north[0], east[0]], expected, rtol=1e-5)
+    wind.close()
@@ -0,0 +1,76 @@
+"""
+Tests the vectorised construction of the aircraft labels.
+"""
+import numpy as np
+
+from bluesky.tools.aero import ft, kts
+from bluesky.ui.aclabels import ACLabels, LBLSIZE, intfield, dirtyranges
+
+TRANSLVL = 5000.0 * ft
+
+
+def reference_labels(ids, alt, cas, vs):
+    """
+    The labels as they were made per aircraft with string formatting.
+    """
+    rawlabel = ''
+    for acid, acalt, accas, acvs in zip(ids, alt, cas, vs):
+        rawlabel += '%-8s' % acid[:8]
+        if acalt <= TRANSLVL:
+            rawlabel += '%-5d' % int(acalt / ft + 0.5)
+        else:
+            rawlabel += 'FL%03d' % int(acalt / ft / 100. + 0.5)
+        vsarrow = 30 if acvs > 0.25 else 31 if acvs < -0.25 else 32
+        rawlabel += '%1s  %-8d' % (chr(vsarrow), int(accas / kts + 0.5))
+    return rawlabel.encode('utf8')
+
+
+def test_labels_equal_reference():
+    """
+    Labels should be identical to the formatted labels, and only changed
+    rows should be reported after the first update.
+    """
+    rng = np.random.RandomState(0)
+    ntraf = 1000
+    ids = ['KL%d' % i if i % 3 else 'LONGCALLSIGN%d' % i for i in range(ntraf)]
+    alt = rng.uniform(-100.0, 45000.0, ntraf) * ft
+    alt[:4] = [0.0, -3.2 * ft, TRANSLVL, TRANSLVL + 0.5 * ft]
+    cas = rng.uniform(0.0, 400.0, ntraf) * kts
+    vs = rng.choice([-1.0, 0.0, 0.2, 1.0], ntraf)
+
+    labels = ACLabels(maxranges=2)
+    assert labels.update(ids, alt, cas, vs, TRANSLVL) == [(0, ntraf)]
+    assert labels.labels.shape == (ntraf, LBLSIZE)
+    assert labels.labels.tobytes() == reference_labels(ids, alt, cas, vs)
+
+    alt[[10, 11, 500, 700]] += 1000.0 * ft
+    assert labels.update(ids, alt, cas, vs, TRANSLVL) == [(10, 12), (500, 701)]
+    assert labels.labels.tobytes() == reference_labels(ids, alt, cas, vs)
+    assert labels.update(ids, alt, cas, vs, TRANSLVL) == []
+    # After a reset (e.g. of the active node), all rows are sent again
+    labels.reset()
+    assert labels.update(ids, alt, cas, vs, TRANSLVL) == [(0, ntraf)]
+
+    # Only the ids are shown in the first line
+    labels.update(ids, alt, cas, vs, TRANSLVL, show_lbl=1)
+    assert labels.labels[1].tobytes() == b'KL1' + 21 * b' '
+
+
+def test_intfield():
+    """
+    Integers should be left-aligned, and clipped when they don't fit.
+    """
+    field = intfield(np.array([0.0, -0.5, -7.0, 123.9, -99999.0, 123456.0]), 5)
+    assert [row.tobytes() for row in field] == \
+        [b'0    ', b'0    ', b'-7   ', b'123  ', b'-9999', b'99999']
+
+
+def test_dirtyranges():
+    """
+    Runs of dirty rows should be merged across the smallest gaps.
+    """
+    dirty = np.array([1, 1, 0, 1, 0, 0, 0, 1, 0, 1], dtype=bool)
+    assert dirtyranges(dirty, 4) == [(0, 2), (3, 4), (7, 8), (9, 10)]
+    assert dirtyranges(dirty, 2) == [(0, 4), (7, 10)]
+    assert dirtyranges(dirty, 1) == [(0, 10)]
+    assert dirtyranges(np.zeros(5, dtype=bool), 1) == []
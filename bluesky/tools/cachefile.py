@@ -1,4 +1,14 @@
+import os
+import json
+import mmap
+import shutil
+from numbers import Integral, Number
 from os import path
+try:
+    from collections.abc import MutableSequence
+except ImportError:
+    from collections import MutableSequence
+import numpy as np
 try:
     import cPickle as pickle
 except ImportError:
@@ -14,6 +24,10 @@ def openfile(*args):
     return CacheFile(*args)
 
 
+def opendir(*args):
+    return CacheDir(*args)
+
+
 class CacheError(Exception):
     ''' Exception class for CacheFile errors. '''
     pass
@@ -62,3 +76,229 @@ class CacheFile():
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.file:
             self.file.close()
+
+
+class CacheDir():
+    ''' Versioned binary cache of tables (dicts of columns), stored in a
+        directory. Numeric arrays are stored as .npy files, and loaded
+        memory-mapped, so that processes on the same host share the pages.
+        Lists of strings are stored as a string table, and lists of numbers
+        of one type as an array. These are loaded as list-like objects that
+        only read the data that is used. Other data is pickled. A manifest
+        with the version and the column types is written last. '''
+    # Version of the directory layout
+    layout = 1
+
+    def __init__(self, dirname, version_ref='1'):
+        self.dirname = path.join(settings.cache_path, dirname)
+        self.version_ref = version_ref
+
+    def load(self):
+        ''' Load all tables from the cache directory. '''
+        fmanifest = path.join(self.dirname, 'manifest.json')
+        if not path.isfile(fmanifest):
+            raise CacheError('Cache not found: ' + self.dirname)
+        with open(fmanifest, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('layout') != self.layout or \
+                manifest.get('version') != self.version_ref:
+            raise CacheError('Cache out of date: ' + self.dirname)
+        print('Reading cache: ' + self.dirname)
+
+        tables = dict()
+        for tablename, columns in manifest['tables'].items():
+            table = tables[tablename] = dict()
+            for name, (kind, count) in columns.items():
+                fname = path.join(self.dirname, '{}.{}'.format(tablename, name))
+                if kind == 'object':
+                    with open(fname + '.p', 'rb') as f:
+                        table[name] = pickle.load(f)
+                    continue
+                if kind == 'array':
+                    table[name] = np.load(fname + '.npy', mmap_mode='r')
+                elif kind == 'list':
+                    table[name] = NumberList(np.load(fname + '.npy', mmap_mode='r'))
+                else:
+                    table[name] = StringTable(fname + '.str',
+                                              np.load(fname + '.off.npy', mmap_mode='r'))
+        return tables
+
+    def dump(self, tables):
+        ''' Write all tables to the cache directory. The directory is
+            replaced as a whole, so processes that load the cache at the
+            same time never see a partial cache. '''
+        tmpdir = '{}.tmp{}'.format(self.dirname, os.getpid())
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        os.makedirs(tmpdir)
+        print('Writing cache: ' + self.dirname)
+        manifest = dict(layout=self.layout, version=self.version_ref, tables=dict())
+        for tablename, table in tables.items():
+            columns = manifest['tables'][tablename] = dict()
+            for name, value in table.items():
+                fname = path.join(tmpdir, '{}.{}'.format(tablename, name))
+                kind, data = CacheDir._column(value)
+                columns[name] = (kind, len(value))
+                if kind == 'object':
+                    with open(fname + '.p', 'wb') as f:
+                        pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+                elif kind == 'strings':
+                    StringTable.write(fname + '.str', fname + '.off.npy', value)
+                else:
+                    np.save(fname + '.npy', data)
+        with open(path.join(tmpdir, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+        # Replace the old cache directory
+        olddir = tmpdir + '.old'
+        try:
+            if path.isdir(self.dirname):
+                os.rename(self.dirname, olddir)
+            os.rename(tmpdir, self.dirname)
+        except OSError:
+            # Another process has written the cache at the same time
+            pass
+        shutil.rmtree(olddir, ignore_errors=True)
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    @staticmethod
+    def _column(value):
+        ''' Column type of value, and the array in which it is stored. '''
+        if isinstance(value, np.ndarray) and value.dtype.kind in 'biuf':
+            return 'array', value
+        if isinstance(value, list):
+            types = set(type(v) for v in value)
+            if types == {str}:
+                if not any('\0' in v for v in value):
+                    return 'strings', None
+            elif len(types) == 1 and types <= {int, float}:
+                return 'list', np.array(value)
+        return 'object', None
+
+
+class CachedList(MutableSequence):
+    ''' List-like column of a CacheDir, that reads items from the cache
+        files when they are accessed. The column is converted to a normal
+        list when it is iterated over or changed. '''
+    def __init__(self, count):
+        self._count = count
+        self._list = None
+
+    def tolist(self):
+        ''' Convert to (and return) a normal list. '''
+        if self._list is None:
+            self._list = self._read()
+        return self._list
+
+    def __len__(self):
+        return self._count if self._list is None else len(self._list)
+
+    def __getitem__(self, i):
+        if self._list is None and isinstance(i, Integral):
+            if i < 0:
+                i += self._count
+            if not 0 <= i < self._count:
+                raise IndexError('list index out of range')
+            return self._item(i)
+        return self.tolist()[i]
+
+    def __setitem__(self, i, value):
+        self.tolist()[i] = value
+
+    def __delitem__(self, i):
+        del self.tolist()[i]
+
+    def insert(self, i, value):
+        self.tolist().insert(i, value)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __contains__(self, value):
+        return self.count(value) > 0
+
+    def index(self, value, start=0, stop=None):
+        stop = len(self) if stop is None else stop
+        if self._list is not None:
+            return self._list.index(value, start, stop)
+        for i in self._find(value, max(0, start), min(stop, self._count)):
+            return i
+        raise ValueError('{!r} is not in list'.format(value))
+
+    def count(self, value):
+        if self._list is not None:
+            return self._list.count(value)
+        return sum(1 for _ in self._find(value, 0, self._count))
+
+    def __eq__(self, other):
+        if isinstance(other, (list, CachedList)):
+            return self.tolist() == list(other)
+        return NotImplemented
+
+    def __add__(self, other):
+        return self.tolist() + list(other)
+
+    def __radd__(self, other):
+        return list(other) + self.tolist()
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+    def __reduce__(self):
+        return list, (self.tolist(),)
+
+
+class NumberList(CachedList):
+    ''' List of numbers, stored in a (memory-mapped) array. '''
+    def __init__(self, data):
+        super(NumberList, self).__init__(len(data))
+        self.data = data
+
+    def _read(self):
+        return self.data.tolist()
+
+    def _item(self, i):
+        return self.data[i].item()
+
+    def _find(self, value, start, stop):
+        if isinstance(value, Number) and not isinstance(value, bool):
+            for i in np.flatnonzero(self.data[start:stop] == value):
+                yield int(i) + start
+
+
+class StringTable(CachedList):
+    ''' List of strings, stored as a string table: the utf-8 encoded strings,
+        each followed by a NUL character, in a memory-mapped file, and
+        an array with the offsets of the strings in this file. '''
+    def __init__(self, fname, offsets):
+        super(StringTable, self).__init__(len(offsets) - 1)
+        self.offsets = offsets
+        with open(fname, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @staticmethod
+    def write(fname, foffsets, strings):
+        ''' Write a list of strings to a string table. '''
+        encoded = [s.encode('utf-8') for s in strings]
+        # The table starts with a NUL character, so that each string can be
+        # found by searching for it with a NUL on both sides
+        offsets = np.cumsum([1] + [len(s) + 1 for s in encoded], dtype=np.int64)
+        with open(fname, 'wb') as f:
+            f.write(b'\0' + b''.join(s + b'\0' for s in encoded))
+        np.save(foffsets, offsets)
+
+    def _read(self):
+        if self._count == 0:
+            return []
+        return self.data[1:-1].decode('utf-8').split('\0')
+
+    def _item(self, i):
+        return self.data[self.offsets[i]:self.offsets[i + 1] - 1].decode('utf-8')
+
+    def _find(self, value, start, stop):
+        if not isinstance(value, str) or start >= stop:
+            return
+        pattern = b'\0' + value.encode('utf-8') + b'\0'
+        pos = self.data.find(pattern, self.offsets[start] - 1, self.offsets[stop])
+        while pos >= 0:
+            yield int(np.searchsorted(self.offsets, pos + 1))
+            pos = self.data.find(pattern, pos + len(pattern) - 1, self.offsets[stop])
@@ -1,18 +1,41 @@
-""" BlueSky Datalogger """
-
-# ToDo: Add description in comments
-
+""" BlueSky Datalogger
+
+    Loggers collect the logged variables as typed columns in chunk buffers.
+    Full chunks are written to file by a background writer thread, in one of
+    the log formats (CSV logs are handed over at each log step, so that
+    they are as complete as the old row-by-row logs when a node dies):
+    - CSV: text file with a header (default)
+    - NPZ: zip file with one .npy array per column per chunk
+    - PARQUET: parquet file with one row group per chunk (requires pyarrow)
+
+    The queue of the writer thread is bounded (see WriteQueue), and can also
+    be used by plugins that write their own files.
+"""
 import os
+import atexit
 import numbers
 import itertools
+import time
+import zipfile
+import tempfile
+from io import BytesIO
+from collections import deque
 from datetime import datetime
+from threading import Thread, Condition
 import numpy as np
 from bluesky import settings, stack
 from bluesky.tools import varexplorer as ve
 import bluesky as bs
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
 # Register settings defaults
-settings.set_variable_defaults(log_path='output')
+settings.set_variable_defaults(log_path='output', log_format='csv', log_chunksize=10000,
+                               log_queuesize=64, log_backpressure='block', log_spillpath='')
 
 logprecision = '%.8f'
 
@@ -53,13 +76,200 @@ def reset():
     for log in allloggers.values():
         log.reset()
 
+    # Wait until all logs are written
+    writequeue.join()
+
+
+def closeall():
+    """ Write all logged data and close the logs. Registered to run at
+    exit, for nodes that quit without a reset. """
+    for log in allloggers.values():
+        if log.file:
+            log.close()
+    writequeue.join()
+
 
-def makeLogfileName(logname):
+atexit.register(closeall)
+
+
+def makeLogfileName(logname, ext='log'):
     timestamp = datetime.now().strftime('%Y%m%d_%H-%M-%S')
-    fname = "%s_%s_%s.log" % (logname, stack.get_scenname(), timestamp)
+    fname = "%s_%s_%s.%s" % (logname, stack.get_scenname(), timestamp, ext)
     return settings.log_path + '/' + fname
 
 
+def logstat(cmd=''):
+    """ Stack function to show (or RESET) the statistics of the log writer queue. """
+    if cmd.upper() == 'RESET':
+        writequeue.resetstats()
+        return True
+    return True, writequeue.stats()
+
+
+class WriteQueue:
+    """ Bounded queue of write jobs, which are executed in order by a
+        background writer thread. All jobs that wait in memory count in
+        the queue size (settings.log_queuesize): the chunks of logged data,
+        and the jobs of loggers and plugins that write their own files.
+        When a new job arrives in a full queue, settings.log_backpressure
+        decides what happens:
+        - BLOCK: wait until the writer thread has finished a job
+        - DROP: discard the oldest chunk in the queue (and wait when
+          there is no chunk in the queue)
+        - SPILL: store a new chunk in a file in settings.log_spillpath
+          (the system temporary folder by default), and read it back when
+          it is written to the log (other jobs wait) """
+    def __init__(self):
+        self.jobs = deque()
+        self.cond = Condition()
+        self.thread = None
+        self.nchunks = 0
+        self.inmemory = 0
+        self.unfinished = 0
+        self.resetstats()
+
+    def afterfork(self):
+        """ Start with an empty queue in a forked child process: the writer
+            thread of the parent doesn't exist in the child, and the jobs
+            in the queue are done by the parent. """
+        self.jobs = deque()
+        self.cond = Condition()
+        self.thread = None
+        self.nchunks = self.inmemory = self.unfinished = 0
+
+    def resetstats(self):
+        self.nwritten = self.ndropped = self.nspilled = self.maxdepth = 0
+        self.njobs = 0
+        self.twait = self.twrite = self.twritemax = 0.0
+
+    def put(self, fun, *args, chunk=None):
+        """ Execute fun(*args) in the writer thread. Jobs that write a chunk
+            of logged data pass it separately: fun(*args, chunk). """
+        spill = False
+        with self.cond:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = Thread(target=self.run, daemon=True)
+                self.thread.start()
+            policy = settings.log_backpressure.upper()
+            while self.inmemory >= max(1, settings.log_queuesize):
+                if policy == 'DROP' and self.dropoldest():
+                    continue
+                if policy == 'SPILL' and chunk is not None:
+                    spill = True
+                    break
+                self.cond.wait()
+
+        if spill:
+            with tempfile.NamedTemporaryFile(suffix='.npz', delete=False,
+                                             dir=settings.log_spillpath or None) as f:
+                np.savez(f, *chunk)
+            chunk = f.name
+
+        with self.cond:
+            self.jobs.append((fun, args, chunk, time.perf_counter()))
+            self.unfinished += 1
+            if isinstance(chunk, str):
+                self.nspilled += 1
+            else:
+                self.inmemory += 1
+                if chunk is not None:
+                    self.nchunks += 1
+            self.maxdepth = max(self.maxdepth, len(self.jobs))
+            self.cond.notify_all()
+
+    def dropoldest(self):
+        """ Remove the oldest chunk in memory from the queue. """
+        for job in self.jobs:
+            if job[2] is not None and not isinstance(job[2], str):
+                self.jobs.remove(job)
+                self.nchunks -= 1
+                self.inmemory -= 1
+                self.unfinished -= 1
+                self.ndropped += 1
+                self.cond.notify_all()
+                return True
+        return False
+
+    def join(self):
+        """ Wait until all jobs are done. """
+        with self.cond:
+            while self.unfinished:
+                self.cond.wait()
+
+    def run(self):
+        """ Main loop of the background writer thread. """
+        while True:
+            with self.cond:
+                while not self.jobs:
+                    self.cond.wait()
+                fun, args, chunk, tput = self.jobs.popleft()
+                if not isinstance(chunk, str):
+                    self.inmemory -= 1
+                    self.cond.notify_all()
+
+            tstart = time.perf_counter()
+            try:
+                if chunk is None:
+                    fun(*args)
+                elif isinstance(chunk, str):
+                    # Read back a spilled chunk
+                    with np.load(chunk, allow_pickle=True) as data:
+                        columns = [data['arr_%d' % i] for i in range(len(data.files))]
+                    os.remove(chunk)
+                    fun(*args, columns)
+                else:
+                    fun(*args, chunk)
+            except Exception as e:
+                print('Error writing log: {}'.format(e))
+            tend = time.perf_counter()
+
+            with self.cond:
+                if chunk is not None:
+                    self.nwritten += 1
+                    if not isinstance(chunk, str):
+                        self.nchunks -= 1
+                self.njobs += 1
+                self.twait += tstart - tput
+                self.twrite += tend - tstart
+                self.twritemax = max(self.twritemax, tend - tstart)
+                self.unfinished -= 1
+                self.cond.notify_all()
+
+    def stats(self):
+        """ Text with the queue depth and write latency statistics. """
+        with self.cond:
+            njobs = max(1, self.njobs)
+            return 'Log queue: {}/{} jobs in memory, of which {} chunks (max depth {}), ' \
+                'policy {}\n'.format(self.inmemory, settings.log_queuesize, self.nchunks,
+                                     self.maxdepth, settings.log_backpressure.upper()) + \
+                'Chunks written: {}, dropped: {}, spilled: {}\n'.format(
+                    self.nwritten, self.ndropped, self.nspilled) + \
+                'Write time: mean {:.2f} ms, max {:.2f} ms, queue wait: mean {:.2f} ms'.format(
+                    1e3 * self.twrite / njobs, 1e3 * self.twritemax, 1e3 * self.twait / njobs)
+
+
+# Queue with the write jobs of the background writer thread
+writequeue = WriteQueue()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=writequeue.afterfork)
+
+
+def readlog(fname):
+    """ Read a log in NPZ or PARQUET format. Returns the header text and a
+        dict with an array for each column. """
+    if fname.endswith('.parquet'):
+        table = pq.read_table(fname)
+        header = (table.schema.metadata or {}).get(b'header', b'').decode()
+        return header, {name: table.column(name).to_numpy() for name in table.column_names}
+
+    with np.load(fname, allow_pickle=False) as data:
+        header = str(data['header'])
+        columns = dict()
+        for key in data.files[1:]:
+            columns.setdefault(key.split('/', 1)[1], []).append(data[key])
+    return header, {name: np.concatenate(col) for name, col in columns.items()}
+
+
 def col2txt(col, nrows):
     if isinstance(col, (list, np.ndarray)):
         if isinstance(col[0], numbers.Integral):
@@ -82,10 +292,139 @@ def col2txt(col, nrows):
         yield nrows * [col]
 
 
+def makecols(col, nrows):
+    """ Convert a logged variable to one or more 1-D typed columns of nrows rows. """
+    if isinstance(col, (list, np.ndarray)):
+        col = np.asarray(col)
+        if col.dtype.kind not in 'biuf':
+            col = col.astype(object)
+        if len(col.shape) > 1:
+            for el in col.T:
+                yield el
+        else:
+            yield col
+    else:
+        col = np.asarray(col)
+        yield np.full(nrows, col, dtype=col.dtype if col.dtype.kind in 'biuf' else object)
+
+
+class LogBuffer:
+    """ Preallocated column buffers for one chunk of log rows. """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.nrows = 0
+        self.columns = []
+
+    def append(self, columns):
+        """ Append rows to the buffer, given as a list of equal-length columns.
+            The number of columns can only change when the buffer is empty. """
+        n = len(columns[0])
+        if len(columns) != len(self.columns):
+            if self.nrows:
+                raise ValueError('Number of log columns changed from {} to {}'.format(
+                    len(self.columns), len(columns)))
+            self.columns = [np.empty(max(self.capacity, n), dtype=col.dtype) for col in columns]
+        elif self.nrows + n > len(self.columns[0]):
+            size = max(self.nrows + n, 2 * len(self.columns[0]))
+            for i, buf in enumerate(self.columns):
+                self.columns[i] = np.empty(size, dtype=buf.dtype)
+                self.columns[i][:self.nrows] = buf[:self.nrows]
+        for i, col in enumerate(columns):
+            buf = self.columns[i]
+            if not np.can_cast(col.dtype, buf.dtype):
+                self.columns[i] = buf = buf.astype(np.result_type(buf, col))
+            buf[self.nrows:self.nrows + n] = col
+        self.nrows += n
+
+    def take(self):
+        """ Return the filled part of the columns. """
+        return [buf[:self.nrows] for buf in self.columns]
+
+
+class CSVWriter:
+    """ Log writer for text files with comma-separated values. """
+    ext = 'log'
+
+    def __init__(self, fname, header, columns):
+        self.file = open(fname, 'wb')
+        # Write the header
+        for line in header:
+            self.file.write(bytearray('# ' + line + '\n', 'ascii'))
+        # Write the column contents
+        self.file.write(
+            bytearray('# ' + str.join(', ', columns) + '\n', 'ascii'))
+
+    def write(self, names, columns):
+        # Convert (numeric) arrays to text, leave text arrays untouched
+        txtdata = [txtcol for col in columns for txtcol in col2txt(col, len(col))]
+        np.savetxt(self.file, np.vstack(txtdata).T,
+                   delimiter=',', newline='\n', fmt='%s')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class NPZWriter:
+    """ Log writer for zip files with one .npy array per column per chunk. """
+    ext = 'npz'
+
+    def __init__(self, fname, header, columns):
+        self.file = zipfile.ZipFile(fname, 'w')
+        self.file.writestr('header.npy', npybytes(np.array(str.join('\n', header))))
+        self.nchunks = 0
+
+    def write(self, names, columns):
+        for name, col in zip(names, columns):
+            if col.dtype == object:
+                col = col.astype(str)
+            self.file.writestr('%05d/%s.npy' % (self.nchunks, name), npybytes(col))
+        self.nchunks += 1
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    """ Log writer for parquet files with one row group per chunk. """
+    ext = 'parquet'
+
+    def __init__(self, fname, header, columns):
+        self.fname = fname
+        self.header = str.join('\n', header)
+        self.writer = None
+
+    def write(self, names, columns):
+        table = pa.table([pa.array(list(col) if col.dtype == object else col)
+                          for col in columns], names=names)
+        if self.writer is None:
+            schema = table.schema.with_metadata({'header': self.header})
+            self.writer = pq.ParquetWriter(self.fname, schema)
+        self.writer.write_table(table.cast(self.writer.schema))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def npybytes(arr):
+    """ Contents of a .npy file with array arr. """
+    buf = BytesIO()
+    np.lib.format.write_array(buf, arr, allow_pickle=False)
+    return buf.getvalue()
+
+
+# The available log formats
+logwriters = {'CSV': CSVWriter, 'NPZ': NPZWriter, 'PARQUET': ParquetWriter}
+
+
 class CSVLogger:
     def __init__(self, name, dt, header):
         self.name = name
         self.file = None
+        self.writer = CSVWriter
+        self.setformat(settings.log_format)
+        self.buffer = None
         self.dataparents = []
         self.header = header.split('\n')
         self.tlog = 0.0
@@ -97,7 +436,7 @@ class CSVLogger:
 
         # Register a command for this logger in the stack
         stackcmd = {name: [
-            name + ' ON/OFF,[dt] or ADD [FROM parent] var1,...,varn',
+            name + ' ON/OFF,[dt] or ADD [FROM parent] var1,...,varn or FORMAT CSV/NPZ/PARQUET',
             '[txt,float/word,...]', self.stackio, name+" data logging on"]
         }
         stack.append_commands(stackcmd)
@@ -109,7 +448,21 @@ class CSVLogger:
         self.dt = dt
         self.default_dt = dt
 
+    def setformat(self, fmt):
+        ''' Set the file format of this logger (CSV, NPZ or PARQUET). '''
+        fmt = fmt.upper()
+        if fmt not in logwriters:
+            return False, 'Unknown log format {}, use one of {}'.format(
+                fmt, str.join(', ', logwriters))
+        if fmt == 'PARQUET' and pa is None:
+            return False, 'Log format PARQUET requires pyarrow'
+        self.writer = logwriters[fmt]
+        return True
+
     def addvars(self, selection):
+        if self.isopen():
+            # The columns of an open log file can't be changed
+            return False, 'Turn {} OFF before adding variables'.format(self.name)
         selvars = []
         while selection:
             parent = ''
@@ -131,17 +484,39 @@ class CSVLogger:
 
     def open(self, fname):
         if self.file:
-            self.file.close()
-        self.file = open(fname, 'wb')
-        # Write the header
-        for line in self.header:
-            self.file.write(bytearray('# ' + line + '\n', 'ascii'))
-        # Write the column contents
+            self.close()
+        # The file is opened and written by the writer thread
         columns = ['simt']
         for v in self.selvars:
             columns.append(v.varname)
-        self.file.write(
-            bytearray('# ' + str.join(', ', columns) + '\n', 'ascii'))
+        self.file = fname
+        self.buffer = LogBuffer(settings.log_chunksize)
+        writequeue.put(self._open, self.writer, fname, self.header, columns)
+
+    def _open(self, writer, fname, header, columns):
+        self._writer = writer(fname, header, columns)
+
+    def _write(self, names, columns):
+        self._writer.write(names, columns)
+
+    def _close(self):
+        self._writer.close()
+
+    def flush(self):
+        ''' Hand the logged rows over to the writer thread. '''
+        if self.buffer and self.buffer.nrows:
+            columns = self.buffer.take()
+            names = ['simt'] + [v.varname for v in self.selvars]
+            names += ['var%d' % i for i in range(len(names), len(columns))]
+            writequeue.put(self._write, names, chunk=columns)
+            self.buffer = LogBuffer(settings.log_chunksize)
+
+    def close(self):
+        ''' Write the remaining rows and close the log file. '''
+        self.flush()
+        writequeue.put(self._close)
+        self.file = None
+        self.buffer = None
 
     def isopen(self):
         return self.file is not None
@@ -164,25 +539,25 @@ class CSVLogger:
                     break
             if nrows == 0:
                 return
-            # Convert (numeric) arrays to text, leave text arrays untouched
-            txtdata = [
-                txtcol for col in varlist for txtcol in col2txt(col, nrows)]
-
-            # log the data to file
-            np.savetxt(self.file, np.vstack(txtdata).T,
-                       delimiter=',', newline='\n', fmt='%s')
+            # Copy the data as typed columns into the chunk buffer. When the
+            # number of columns changes, the current chunk is written first
+            columns = [typedcol for col in varlist for typedcol in makecols(col, nrows)]
+            if self.buffer.nrows and len(columns) != len(self.buffer.columns):
+                self.flush()
+            self.buffer.append(columns)
+            if self.buffer.nrows >= settings.log_chunksize or self.writer is CSVWriter:
+                self.flush()
 
     def start(self):
         ''' Start this logger. '''
         self.tlog = bs.sim.simt
-        self.open(makeLogfileName(self.name))
+        self.open(makeLogfileName(self.name, self.writer.ext))
 
     def reset(self):
         self.dt = self.default_dt
         self.tlog = 0.0
         if self.file:
-            self.file.close()
-            self.file = None
+            self.close()
 
     def listallvarnames(self):
         return str.join(', ', (v.varname for v in self.selvars))
@@ -198,7 +573,7 @@ class CSVLogger:
             text += 'with variables: ' + self.listallvarnames() + '\n'
             text += self.name + ' is ' + ('ON' if self.isopen() else 'OFF') + \
                 '\nUsage: ' + self.name + \
-                ' ON/OFF,[dt] or ADD [FROM parent] var1,...,varn'
+                ' ON/OFF,[dt] or ADD [FROM parent] var1,...,varn or FORMAT CSV/NPZ/PARQUET'
             return True, text
             # TODO: add list of logging vars
         elif args[0] == 'ON':
@@ -215,4 +590,9 @@ class CSVLogger:
         elif args[0] == 'ADD':
             return self.addvars(list(args[1:]))
 
+        elif args[0] == 'FORMAT':
+            if len(args) < 2 or not isinstance(args[1], str):
+                return False, 'Usage: ' + self.name + ' FORMAT CSV/NPZ/PARQUET'
+            return self.setformat(args[1])
+
         return True
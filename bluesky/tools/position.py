@@ -60,22 +60,22 @@ class Position():
             self.type = "rwy"
 
         # airport?
-        elif bs.navdb.aptid.count(name)>0:
-            idx = bs.navdb.aptid.index(name.upper())
+        elif name in bs.navdb.aptindex:
+            idx = bs.navdb.getaptidx(name)
 
             self.lat = bs.navdb.aptlat[idx]
             self.lon = bs.navdb.aptlon[idx]
             self.type ="apt"
 
         # fix or navaid?
-        elif bs.navdb.wpid.count(name)>0:
+        elif name in bs.navdb.wpindex:
             idx = bs.navdb.getwpidx(name,reflat,reflon)
             self.lat = bs.navdb.wplat[idx]
             self.lon = bs.navdb.wplon[idx]
             self.type ="nav"
 
         # aircraft id?
-        elif name in bs.traf.id:
+        elif name in bs.traf.idindex:
             idx = bs.traf.id2idx(name)
             self.name = ""
             self.type = "latlon"
@@ -1,5 +1,12 @@
 """ Classes that derive from TrafficArrays (like Traffic) get automated create,
-    delete, and reset functionality for all registered child arrays."""
+    delete, and reset functionality for all registered child arrays.
+
+    Registered numpy arrays are stored in preallocated buffers with a
+    capacity that grows geometrically, so creating an aircraft doesn't copy
+    all traffic data. The attributes themselves are views of length ntraf
+    on these buffers. Assigning a new array to a registered attribute copies
+    its contents into the buffer, so attributes can still be used as normal
+    arrays (traf.lat = traf.lat + dlat, etc.)."""
 # -*- coding: utf-8 -*-
 try:
     from collections.abc import Collection
@@ -10,6 +17,9 @@ import numpy as np
 
 defaults = {"float": 0.0, "int": 0, "uint":0, "bool": False, "S": "", "str": ""}
 
+# Smallest capacity of an array buffer
+mincapacity = 32
+
 
 class RegisterElementParameters():
     """ Class to use in 'with'-syntax. This class automatically
@@ -49,6 +59,32 @@ class TrafficArrays(object):
         self._ArrVars  = []
         self._LstVars  = []
         self._Vars     = self.__dict__
+        self._buffers  = dict()
+
+    def __setattr__(self, name, value):
+        buffers = self.__dict__.get('_buffers')
+        if buffers and name in buffers:
+            self.setarray(name, value)
+        else:
+            super(TrafficArrays, self).__setattr__(name, value)
+
+    def setarray(self, name, value):
+        ''' Store value in the buffer of registered array name. '''
+        if value is self._Vars[name]:
+            # In-place operation (+=, etc.) on the current view
+            return
+        buf = self._buffers[name]
+        if not isinstance(value, np.ndarray) or value.ndim != 1:
+            # Not an array of elements: store as is
+            self._buffers[name] = self._Vars[name] = value
+            return
+        n = len(value)
+        if np.ndim(buf) != 1 or value.dtype != buf.dtype or n > len(buf):
+            # Different type or larger than capacity: use a new buffer
+            buf = np.empty(max(n, np.size(buf), mincapacity), dtype=value.dtype)
+            self._buffers[name] = buf
+        buf[:n] = value
+        self._Vars[name] = buf[:n]
 
     def reparent(self, newparent):
         # Remove myself from the parent list of children, and add to new parent
@@ -62,6 +98,7 @@ class TrafficArrays(object):
                 self._LstVars.append(key)
             elif isinstance(self._Vars[key], np.ndarray):
                 self._ArrVars.append(key)
+                self._buffers[key] = self._Vars[key]
             elif isinstance(self._Vars[key], TrafficArrays):
                 self._Vars[key].reparent(self)
 
@@ -84,16 +121,30 @@ class TrafficArrays(object):
             self._Vars[v].extend(defaultvalue)
 
         for v in self._ArrVars:  # Numpy array
+            arr = np.asarray(self._Vars[v])
+            buf = self._buffers[v]
+            nold = arr.size
+            nnew = nold + n
+
             # Get type without byte length
-            vartype = ''.join(c for c in str(self._Vars[v].dtype) if c.isalpha())
+            vartype = ''.join(c for c in str(arr.dtype) if c.isalpha())
 
             # Get default value
             if vartype in defaults:
-                defaultvalue = [defaults[vartype]] * n
+                defaultvalue = np.array([defaults[vartype]])
             else:
-                defaultvalue = [0.0] * n
+                defaultvalue = np.array([0.0])
+
+            # Grow the buffer when it is full, or when the type of the
+            # default value doesn't fit (same type promotion as np.append)
+            dtype = np.result_type(arr, defaultvalue)
+            if np.ndim(buf) != 1 or nnew > len(buf) or buf.dtype != dtype:
+                buf = np.empty(max(nnew, 2 * nold, mincapacity), dtype=dtype)
+                buf[:nold] = np.ravel(arr)
+                self._buffers[v] = buf
 
-            self._Vars[v] = np.append(self._Vars[v], defaultvalue)
+            buf[nold:nnew] = defaultvalue
+            self._Vars[v] = buf[:nnew]
 
     def istrafarray(self, key):
         return key in self._LstVars or key in self._ArrVars
@@ -108,8 +159,29 @@ class TrafficArrays(object):
         for child in self._children:
             child.delete(idx)
 
-        for v in self._ArrVars:
-            self._Vars[v] = np.delete(self._Vars[v], idx)
+        if self._ArrVars:
+            # Compact the buffers in-place, keeping the order of the elements
+            n = np.size(self._Vars[self._ArrVars[0]])
+            if isinstance(idx, Collection):
+                keep = np.ones(n, dtype=bool)
+                keep[idx] = False
+                nnew = np.count_nonzero(keep)
+            else:
+                idx = idx % n if n else idx
+                nnew = n - 1
+
+            for v in self._ArrVars:
+                arr = self._Vars[v]
+                buf = self._buffers[v]
+                if np.ndim(buf) != 1 or len(arr) != n or \
+                        not (arr is buf or arr.base is buf):
+                    self._Vars[v] = self._buffers[v] = np.delete(arr, idx)
+                elif isinstance(idx, Collection):
+                    buf[:nnew] = arr[keep]
+                    self._Vars[v] = buf[:nnew]
+                else:
+                    buf[idx:nnew] = arr[idx + 1:]
+                    self._Vars[v] = buf[:nnew]
 
         if self._LstVars:
             if isinstance(idx, Collection):
@@ -126,7 +198,13 @@ class TrafficArrays(object):
             child.reset()
 
         for v in self._ArrVars:
-            self._Vars[v] = np.array([], dtype=self._Vars[v].dtype)
+            # Keep the buffers, so their capacity can be reused
+            buf = self._buffers[v]
+            dtype = np.asarray(self._Vars[v]).dtype
+            if np.ndim(buf) == 1 and buf.dtype == dtype:
+                self._Vars[v] = buf[:0]
+            else:
+                self._Vars[v] = self._buffers[v] = np.array([], dtype=dtype)
 
         for v in self._LstVars:
             self._Vars[v] = []
@@ -33,8 +33,8 @@ def resolve(asas, traf):
             confpair = asas.confpairs[i]
             ac1      = confpair[0]
             ac2      = confpair[1]
-            id1      = traf.id.index(ac1)
-            id2      = traf.id.index(ac2)
+            id1      = traf.id2idx(ac1)
+            id2      = traf.id2idx(ac2)
             dv_eby   = Eby_straight(asas, id1, id2)
             dv[id1] -= dv_eby
 
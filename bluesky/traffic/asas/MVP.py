@@ -20,46 +20,14 @@ def resolve(asas, traf):
     if not asas.swasas:
         return
 
-    # Initialize an array to store the resolution velocity vector for all A/C
-    dv = np.zeros((traf.ntraf, 3))
     # Stores resolution vector, also used in visualization
     asas.asasn        = np.zeros(traf.ntraf, dtype=np.float32)
     asas.asase        = np.zeros(traf.ntraf, dtype=np.float32)
 
-    # Initialize an array to store time needed to resolve vertically
-    timesolveV = np.ones(traf.ntraf)*1e9
-
-    # Call MVP function to resolve conflicts-----------------------------------
-    for ((ac1, ac2), qdr, dist, tcpa, tLOS) in zip(asas.confpairs, asas.qdr, asas.dist, asas.tcpa, asas.tLOS):
-        id1 = traf.id.index(ac1)
-        id2 = traf.id.index(ac2)
-
-        # If A/C indexes are found, then apply MVP on this conflict pair
-        # Because ADSB is ON, this is done for each aircraft separately
-        if id1 >-1 and id2 > -1:
-            dv_mvp, tsolV = MVP(traf, asas, qdr, dist, tcpa, tLOS, id1, id2)
-            if tsolV < timesolveV[id1]:
-                timesolveV[id1] = tsolV
-
-            # Use priority rules if activated
-            if asas.swprio:
-                dv[id1], _ = prioRules(traf, asas.priocode, dv_mvp, dv[id1], dv[id2], id1, id2)
-            else:
-                # since cooperative, the vertical resolution component can be halved, and then dv_mvp can be added
-                dv_mvp[2] = 0.5 * dv_mvp[2]
-                dv[id1] = dv[id1] - dv_mvp
-
-            # Check the noreso aircraft. Nobody avoids noreso aircraft.
-            # But noreso aircraft will avoid other aircraft
-            if asas.swnoreso:
-                if ac2 in asas.noresolst: # -> Then id1 does not avoid id2.
-                    dv[id1] = dv[id1] + dv_mvp
-
-            # Check the resooff aircraft. These aircraft will not do resolutions.
-            if asas.swresooff:
-                if ac1 in asas.resoofflst: # -> Then id1 does not do any resolutions
-                    dv[id1] = 0.0
-
+    # Call MVP function to resolve all conflicts at once-----------------------
+    # dv: resolution velocity vector for all A/C
+    # timesolveV: time needed to resolve vertically
+    dv, timesolveV = resolution(asas, traf)
 
     # Determine new speed and limit resolution direction for all aicraft-------
 
@@ -143,6 +111,67 @@ def resolve(asas, traf):
     asas.alt = asas.alt*(1-asas.swresohoriz) + traf.selalt*asas.swresohoriz
 
 
+def resolution(asas, traf):
+    """ Sum the MVP resolutions of all conflict pairs per aircraft, with the
+        same result as applying MVP and prioRules pair by pair.
+        Returns the resolution velocity vectors [m/s] (ntraf x 3), and the
+        time needed to resolve vertically [s] of all aircraft. """
+    dv = np.zeros((traf.ntraf, 3))
+    timesolveV = np.ones(traf.ntraf)*1e9
+
+    npairs = len(asas.confpairs)
+    if npairs == 0:
+        return dv, timesolveV
+
+    # Only pairs of which both A/C indexes are found are resolved
+    ac1, ac2 = (np.array(acids, dtype=object) for acids in zip(*asas.confpairs))
+    id1 = np.array(traf.id2idx(list(ac1)), dtype=int)
+    id2 = np.array(traf.id2idx(list(ac2)), dtype=int)
+    valid = np.logical_and(id1 > -1, id2 > -1)
+    ac1, ac2, id1, id2 = ac1[valid], ac2[valid], id1[valid], id2[valid]
+    qdr, dist, tcpa, tLOS = (np.asarray(arr)[:npairs][valid] for arr in
+                             (asas.qdr, asas.dist, asas.tcpa, asas.tLOS))
+
+    dv_mvp, tsolV = MVPpairs(traf, asas, qdr, dist, tcpa, tLOS, id1, id2)
+    # Shortest time to solve vertically per aircraft (NaN is ignored)
+    np.fmin.at(timesolveV, id1, tsolV)
+
+    # Use priority rules if activated
+    if asas.swprio:
+        solve = prioPairs(traf, asas.priocode, dv_mvp, id1, id2)
+    else:
+        # since cooperative, the vertical resolution component can be halved, and then dv_mvp can be added
+        dv_mvp[:, 2] = 0.5 * dv_mvp[:, 2]
+        solve = np.ones(len(id1), dtype=bool)
+
+    # Check the noreso aircraft. Nobody avoids noreso aircraft.
+    # But noreso aircraft will avoid other aircraft
+    if asas.swnoreso:
+        noresolst = set(asas.noresolst)
+        noreso = np.array([acid in noresolst for acid in ac2], dtype=bool)
+    else:
+        noreso = np.zeros(len(id1), dtype=bool)
+
+    # Sum the resolutions per aircraft in the order of the conflict pairs:
+    # per pair first the resolution (-dv_mvp), then, when the intruder is a
+    # noreso aircraft, its cancellation (+dv_mvp). bincount adds the
+    # weights one by one, in order, so the sums are exactly the same.
+    idx = np.repeat(id1, 2)
+    steps = np.empty((2 * len(id1), 3))
+    steps[0::2] = -dv_mvp
+    steps[1::2] = dv_mvp
+    keep = np.column_stack((solve, noreso)).ravel()
+    for i in range(3):
+        dv[:, i] = np.bincount(idx[keep], steps[keep, i], minlength=traf.ntraf)
+
+    # Check the resooff aircraft. These aircraft will not do resolutions.
+    if asas.swresooff:
+        resoofflst = set(asas.resoofflst)
+        dv[id1[[acid in resoofflst for acid in ac1]]] = 0.0
+
+    return dv, timesolveV
+
+
 #======================= Modified Voltage Potential ===========================
 
 
@@ -230,6 +259,80 @@ def MVP(traf, asas, qdr, dist, tcpa, tLOS, id1, id2):
 
     return dv, tsolV
 
+def MVPpairs(traf, asas, qdr, dist, tcpa, tLOS, id1, id2):
+    """Modified Voltage Potential (MVP) resolution method, for arrays of
+       conflict pairs. Gives the same results as MVP for each pair."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Convert qdr from degrees to radians
+        qdr = np.radians(qdr)
+
+        # Relative position vector between id1 and id2
+        drel = np.array([np.sin(qdr)*dist, \
+                         np.cos(qdr)*dist, \
+                         traf.alt[id2]-traf.alt[id1]])
+
+        # Write velocities as vectors and find relative velocity vector
+        v1 = np.array([traf.gseast[id1], traf.gsnorth[id1], traf.vs[id1]])
+        v2 = np.array([traf.gseast[id2], traf.gsnorth[id2], traf.vs[id2]])
+        vrel = v2-v1
+
+        # Horizontal resolution------------------------------------------------
+
+        # Find horizontal distance at the tcpa (min horizontal distance)
+        dcpa  = drel + vrel*tcpa
+        dabsH = np.sqrt(dcpa[0]*dcpa[0]+dcpa[1]*dcpa[1])
+
+        # Compute horizontal intrusion
+        iH = asas.Rm - dabsH
+
+        # Exception handlers for head-on conflicts
+        # This is done to prevent division by zero in the next step
+        headon = dabsH <= 10.
+        dabsH = np.where(headon, 10., dabsH)
+        dcpa[0] = np.where(headon, drel[1] / dist * dabsH, dcpa[0])
+        dcpa[1] = np.where(headon, -drel[0] / dist * dabsH, dcpa[1])
+
+        # Compute the resolution velocity vector in horizontal direction
+        # abs(tcpa) because it bcomes negative during intrusion
+        dv1 = (iH*dcpa[0])/(np.abs(tcpa)*dabsH)
+        dv2 = (iH*dcpa[1])/(np.abs(tcpa)*dabsH)
+
+        # If intruder is outside the ownship PZ, then apply extra factor
+        # to make sure that resolution does not graze IPZ
+        graze = np.logical_and(asas.Rm<dist, dabsH<dist)
+        erratum = np.cos(np.arcsin(asas.Rm/dist[graze])-np.arcsin(dabsH[graze]/dist[graze]))
+        dv1[graze] = dv1[graze]/erratum
+        dv2[graze] = dv2[graze]/erratum
+
+        # Vertical resolution--------------------------------------------------
+
+        # Compute the  vertical intrusion
+        # Amount of vertical intrusion dependent on vertical relative velocity
+        vertical = np.abs(vrel[2])>0.0
+        iV = np.where(vertical, asas.dhm, asas.dhm-np.abs(drel[2]))
+
+        # Get the time to solve the conflict vertically - tsolveV
+        tsolV = np.where(vertical, np.abs(drel[2]/vrel[2]), tLOS)
+
+        # If the time to solve the conflict vertically is longer than the look-ahead time,
+        # because the the relative vertical speed is very small, then solve the intrusion
+        # within tinconf
+        slow = tsolV>asas.dtlookahead
+        tsolV = np.where(slow, tLOS, tsolV)
+        iV    = np.where(slow, asas.dhm, iV)
+
+        # Compute the resolution velocity vector in the vertical direction
+        # The direction of the vertical resolution is such that the aircraft with
+        # higher climb/decent rate reduces their climb/decent rate
+        dv3 = np.where(vertical, (iV/tsolV)*(-vrel[2]/np.abs(vrel[2])), (iV/tsolV))
+
+    # Combine resolutions------------------------------------------------------
+
+    # combine the dv components
+    dv = np.column_stack((dv1, dv2, dv3))
+
+    return dv, tsolV
+
 #============================= Priority Rules =================================
 
 def prioRules(traf, priocode, dv_mvp, dv1, dv2, id1, id2):
@@ -298,3 +401,40 @@ def prioRules(traf, priocode, dv_mvp, dv1, dv2, id1, id2):
             dv2 = dv2 + dv_mvp
 
     return dv1, dv2
+
+
+def prioPairs(traf, priocode, dv_mvp, id1, id2):
+    ''' Apply the desired priority setting to the resolutions of arrays of
+        conflict pairs, like prioRules: the vertical components of dv_mvp
+        are adapted in place. Returns for each pair whether id1 resolves. '''
+    # Aircraft 1 is cruising, and aircraft 2 is climbing/descending
+    cruise1 = np.logical_and(np.abs(traf.vs[id1])<0.1, np.abs(traf.vs[id2]) > 0.1)
+    # Aircraft 2 is cruising, and aircraft 1 is climbing/descending
+    cruise2 = np.logical_and(np.abs(traf.vs[id2])<0.1, np.abs(traf.vs[id1]) > 0.1)
+
+    # Primary Free Flight prio rules (no priority)
+    if priocode == "FF1":
+        dv_mvp[:, 2] = dv_mvp[:, 2]/2.0
+        return np.ones(len(id1), dtype=bool)
+
+    # Secondary Free Flight (Cruising aircraft has priority, combined resolutions)
+    if priocode == "FF2":
+        dv_mvp[:, 2] = dv_mvp[:, 2]/2.0
+        return ~cruise1
+
+    # Tertiary Free Flight (Climbing/descending aircraft have priority and crusing solves with horizontal resolutions)
+    if priocode == "FF3":
+        dv_mvp[:, 2] = np.where(np.logical_or(cruise1, cruise2), 0.0, dv_mvp[:, 2]/2.0)
+        return ~cruise2
+
+    # Primary Layers (Cruising aircraft has priority and clmibing/descending solves. All conflicts solved horizontally)
+    if priocode == "LAY1":
+        dv_mvp[:, 2] = 0.0
+        return ~cruise1
+
+    # Secondary Layers (Climbing/descending aircraft has priority and cruising solves. All conflicts solved horizontally)
+    if priocode == "LAY2":
+        dv_mvp[:, 2] = 0.0
+        return ~cruise2
+
+    return np.zeros(len(id1), dtype=bool)
@@ -5,6 +5,8 @@ Created on Wed Mar 29 12:02:02 2017
 @author: Suthes Balasooriyan
 """
 
+import multiprocessing as mp
+from bluesky import settings
 from bluesky.tools import geo
 from bluesky.tools.aero import nm
 import numpy as np
@@ -14,6 +16,17 @@ try:
 except ImportError:
     print("Could not import pyclipper, RESO SSD will not function")
 
+# Register settings defaults
+settings.set_variable_defaults(asas_ssd_nworkers=1, asas_ssd_reusetol=0.0)
+
+# Discretised SSD rings per (vmin, vmax, N_angle)
+ringcache = dict()
+# Inputs and results of the previous SSD per priocode and aircraft id
+ssdcache = dict()
+# Process pool to construct SSDs in parallel, and its number of workers
+pool = None
+poolsize = 0
+
 def loaded_pyclipper():
     """ Return true if pyclipper is successfully loaded """
     import sys
@@ -24,6 +37,17 @@ def start(asas):
     pass
 
 
+def stop():
+    """ Terminate the process pool, at an ASAS reset and when another CR
+        method is selected. """
+    global pool, poolsize
+    if pool is not None:
+        pool.terminate()
+        pool.join()
+    pool = None
+    poolsize = 0
+
+
 def detect(asas, traf):
     """ Detect all current conflicts """
 
@@ -98,9 +122,7 @@ def initializeSSD(asas, ntraf):
 # asas is an object of the ASAS class defined in asas.py
 def constructSSD(asas, traf, priocode = "RS1"):
     """ Calculates the FRV and ARV of the SSD """
-    N = 0
     # Parameters
-    N_angle = 180                   # [-] Number of points on circle (discretization)
     vmin    = asas.vmin             # [m/s] Defined in asas.py
     vmax    = asas.vmax             # [m/s] Defined in asas.py
     hsep    = asas.R                # [m] Horizontal separation (5 NM)
@@ -133,14 +155,8 @@ def constructSSD(asas, traf, priocode = "RS1"):
     FRV_area_loc     = np.zeros(traf.ntraf, dtype=np.float32)
     ARV_area_loc     = np.zeros(traf.ntraf, dtype=np.float32)
 
-    # # Use velocity limits for the ring-shaped part of the SSD
-    # Discretize the circles using points on circle
-    angles = np.arange(0, 2 * np.pi, 2 * np.pi / N_angle)
-    # Put points of unit-circle in a (180x2)-array (CW)
-    xyc = np.transpose(np.reshape(np.concatenate((np.sin(angles), np.cos(angles))), (2, N_angle)))
-    # Map them into the format pyclipper wants. Outercircle CCW, innercircle CW
-    circle_tup = (tuple(map(tuple, np.flipud(xyc * vmax))), tuple(map(tuple , xyc * vmin)))
-    circle_lst = [list(map(list, np.flipud(xyc * vmax))), list(map(list , xyc * vmin))]
+    # The ring-shaped part of the SSD is the same for all aircraft
+    circle_lst = ringgeometry(vmin, vmax)[2]
 
     # If no traffic
     if ntraf == 0:
@@ -157,13 +173,13 @@ def constructSSD(asas, traf, priocode = "RS1"):
         ARV_area_loc[0] = np.pi * (vmax **2 - vmin ** 2)
         return
 
-    # Function qdrdist_matrix needs 4 vectors as input (lat1,lon1,lat2,lon2)
-    # To be efficient, calculate all qdr and dist in one function call
-    # Example with ntraf = 5:   ind1 = [0,0,0,0,1,1,1,2,2,3]
-    #                           ind2 = [1,2,3,4,2,3,4,3,4,4]
-    # This way the qdrdist is only calculated once between every aircraft
-    # To get all combinations, use this function to get the indices
-    ind1, ind2 = qdrdist_matrix_indices(ntraf)
+    # Calculate SSD only for aircraft in conflict (See formulas appendix)
+    iconf = np.flatnonzero(asas.inconf)
+
+    # Only the pairs of aircraft in conflict with the aircraft that may be
+    # within ADS-B range are needed. For these pairs qdr and dist are
+    # calculated in one function call, with ind1 < ind2
+    ind1, ind2 = inrange_pairs(lat, lon, iconf, adsbmax)
     # Get absolute bearing [deg] and distance [nm]
     # Not sure abs/rel, but qdr is defined from [-180,180] deg, w.r.t. North
     [qdr, dist] = geo.qdrdist_matrix(lat[ind1], lon[ind1], lat[ind2], lon[ind2])
@@ -198,221 +214,80 @@ def constructSSD(asas, traf, priocode = "RS1"):
     y1 = (cosqdr - sinqdrtanalpha) * 2 * vmax
     y2 = (cosqdr + sinqdrtanalpha) * 2 * vmax
 
-    # Consider every aircraft
-    for i in range(ntraf):
-        # Calculate SSD only for aircraft in conflict (See formulas appendix)
-        if asas.inconf[i]:
-            # SSD for aircraft i
-            # Get indices that belong to aircraft i
-            ind = np.where(np.logical_or(ind1 == i,ind2 == i))[0]
-            # Check whether there are any aircraft in the vicinity
-            if len(ind) == 0:
-                # No aircraft in the vicinity
-                # Map them into the format ARV wants. Outercircle CCW, innercircle CW
-                ARV_loc[i] = circle_lst
-                FRV_loc[i] = []
-                ARV_calc_loc[i] = ARV_loc[i]
-                # Calculate areas and store in asas
-                FRV_area_loc[i] = 0
-                ARV_area_loc[i] = np.pi * (vmax **2 - vmin ** 2)
-            else:
-                # The i's of the other aircraft
-                i_other = np.delete(np.arange(0, ntraf), i)
-                # Aircraft that are within ADS-B range
-                ac_adsb = np.where(dist[ind] < adsbmax)[0]
-                # Now account for ADS-B range in indices of other aircraft (i_other)
-                ind = ind[ac_adsb]
-                i_other = i_other[ac_adsb]
-                if not priocode == "RS7" and not priocode == "RS8":
-                    # Put it in class-object (not for RS7 and RS8)
-                    asas.inrange[i]  = i_other
-                else:
-                    asas.inrange2[i] = i_other
-                # VO from 2 to 1 is mirror of 1 to 2. Only 1 to 2 can be constructed in
-                # this manner, so need a correction vector that will mirror the VO
-                fix = np.ones(np.shape(i_other))
-                fix[i_other < i] = -1
-                # Relative bearing [deg] from [-180,180]
-                # (less required conversions than rad in RotA)
-                fix_ang = np.zeros(np.shape(i_other))
-                fix_ang[i_other < i] = 180.
-
-
-                # Get vertices in an x- and y-array of size (ntraf-1)*3x1
-                x = np.concatenate((gseast[i_other],
-                                    x1[ind] * fix + gseast[i_other],
-                                    x2[ind] * fix + gseast[i_other]))
-                y = np.concatenate((gsnorth[i_other],
-                                    y1[ind] * fix + gsnorth[i_other],
-                                    y2[ind] * fix + gsnorth[i_other]))
-                # Reshape [(ntraf-1)x3] and put arrays in one array [(ntraf-1)x3x2]
-                x = np.transpose(x.reshape(3, np.shape(i_other)[0]))
-                y = np.transpose(y.reshape(3, np.shape(i_other)[0]))
-                xy = np.dstack((x,y))
-
-                # Make a clipper object
-                pc = pyclipper.Pyclipper()
-                # Add circles (ring-shape) to clipper as subject
-                pc.AddPaths(pyclipper.scale_to_clipper(circle_tup), pyclipper.PT_SUBJECT, True)
-
-                # Extra stuff needed for RotA
-                if priocode == "RS6":
-                    # Make another clipper object for RotA
-                    pc_rota = pyclipper.Pyclipper()
-                    pc_rota.AddPaths(pyclipper.scale_to_clipper(circle_tup), pyclipper.PT_SUBJECT, True)
-                    # Bearing calculations from own view and other view
-                    brg_own = np.mod((np.rad2deg(qdr[ind]) + fix_ang - hdg[i]) + 540., 360.) - 180.
-                    brg_other = np.mod((np.rad2deg(qdr[ind]) + 180. - fix_ang - hdg[i_other]) + 540., 360.) - 180.
-
-                # Add each other other aircraft to clipper as clip
-                for j in range(np.shape(i_other)[0]):
-                    ## Debug prints
-                    ## print(traf.id[i] + " - " + traf.id[i_other[j]])
-                    ## print(dist[ind[j]])
-                    # Scale VO when not in LOS
-                    if dist[ind[j]] > hsepm:
-                        # Normally VO shall be added of this other a/c
-                        VO = pyclipper.scale_to_clipper(tuple(map(tuple,xy[j,:,:])))
-                    else:
-                        # Pair is in LOS, instead of triangular VO, use darttip
-                        # Check if bearing should be mirrored
-                        if i_other[j] < i:
-                            qdr_los = qdr[ind[j]] + np.pi
-                        else:
-                            qdr_los = qdr[ind[j]]
-                        # Length of inner-leg of darttip
-                        leg = 1.1 * vmax / np.cos(beta) * np.array([1,1,1,0])
-                        # Angles of darttip
-                        angles_los = np.array([qdr_los + 2 * beta, qdr_los, qdr_los - 2 * beta, 0.])
-                        # Calculate coordinates (CCW)
-                        x_los = leg * np.sin(angles_los)
-                        y_los = leg * np.cos(angles_los)
-                        # Put in array of correct format
-                        xy_los = np.vstack((x_los,y_los)).T
-                        # Scale darttip
-                        VO = pyclipper.scale_to_clipper(tuple(map(tuple,xy_los)))
-                    # Add scaled VO to clipper
-                    pc.AddPath(VO, pyclipper.PT_CLIP, True)
-                    # For RotA it is possible to ignore
-                    if priocode == "RS6":
-                        if brg_own[j] >= -20. and brg_own[j] <= 110.:
-                            # Head-on or converging from right
-                            pc_rota.AddPath(VO, pyclipper.PT_CLIP, True)
-                        elif brg_other[j] <= -110. or brg_other[j] >= 110.:
-                            # In overtaking position
-                            pc_rota.AddPath(VO, pyclipper.PT_CLIP, True)
-                    # Detect conflicts for smaller layer in RS7 and RS8
-                    if priocode == "RS7" or priocode == "RS8":
-                        if pyclipper.PointInPolygon(pyclipper.scale_to_clipper((gseast[i],gsnorth[i])),VO):
-                            asas.inconf2[i] = True
-                    if priocode == "RS5":
-                        if pyclipper.PointInPolygon(pyclipper.scale_to_clipper((apeast[i],apnorth[i])),VO):
-                            asas.ap_free[i] = False
-
-                # Execute clipper command
-                FRV = pyclipper.scale_from_clipper(pc.Execute(pyclipper.CT_INTERSECTION, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO))
-
-                ARV = pc.Execute(pyclipper.CT_DIFFERENCE, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO)
-
-                if not priocode == "RS1" and not priocode == "RS5" and not priocode == "RS7" and not priocode == "RS8":
-                    # Make another clipper object for extra intersections
-                    pc2 = pyclipper.Pyclipper()
-                    # When using RotA clip with pc_rota
-                    if priocode == "RS6":
-                        # Calculate ARV for RotA
-                        ARV_rota = pc_rota.Execute(pyclipper.CT_DIFFERENCE, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO)
-                        if len(ARV_rota) > 0:
-                            pc2.AddPaths(ARV_rota, pyclipper.PT_CLIP, True)
-                    else:
-                        # Put the ARV in there, make sure it's not empty
-                        if len(ARV) > 0:
-                            pc2.AddPaths(ARV, pyclipper.PT_CLIP, True)
-
-                # Scale back
-                ARV = pyclipper.scale_from_clipper(ARV)
-
-                # Check if ARV or FRV is empty
-                if len(ARV) == 0:
-                    # No aircraft in the vicinity
-                    # Map them into the format ARV wants. Outercircle CCW, innercircle CW
-                    ARV_loc[i] = []
-                    FRV_loc[i] = circle_lst
-                    ARV_calc_loc[i] = []
-                    # Calculate areas and store in asas
-                    FRV_area_loc[i] = np.pi * (vmax **2 - vmin ** 2)
-                    ARV_area_loc[i] = 0
-                elif len(FRV) == 0:
-                    # Should not happen with one a/c or no other a/c in the vicinity.
-                    # These are handled earlier. Happens when RotA has removed all
-                    # Map them into the format ARV wants. Outercircle CCW, innercircle CW
-                    ARV_loc[i] = circle_lst
-                    FRV_loc[i] = []
-                    ARV_calc_loc[i] = circle_lst
-                    # Calculate areas and store in asas
-                    FRV_area_loc[i] = 0
-                    ARV_area_loc[i] = np.pi * (vmax **2 - vmin ** 2)
-                else:
-                    # Check multi exteriors, if this layer is not a list, it means it has no exteriors
-                    # In that case, make it a list, such that its format is consistent with further code
-                    if not type(FRV[0][0]) == list:
-                        FRV = [FRV]
-                    if not type(ARV[0][0]) == list:
-                        ARV = [ARV]
-                    # Store in asas
-                    FRV_loc[i] = FRV
-                    ARV_loc[i] = ARV
-                    # Calculate areas and store in asas
-                    FRV_area_loc[i] = area(FRV)
-                    ARV_area_loc[i] = area(ARV)
-
-                    # For resolution purposes sometimes extra intersections are wanted
-                    if priocode == "RS2" or priocode == "RS9" or priocode == "RS6" or priocode == "RS3" or priocode == "RS4":
-                        # Make a box that covers right or left of SSD
-                        own_hdg = hdg[i] * np.pi / 180
-                        # Efficient calculation of box, see notes
-                        if priocode == "RS2" or priocode == "RS6":
-                            # CW or right-turning
-                            sin_table = np.array([[1,0],[-1,0],[-1,-1],[1,-1]], dtype=np.float64)
-                            cos_table = np.array([[0,1],[0,-1],[1,-1],[1,1]], dtype=np.float64)
-                        elif priocode == "RS9":
-                            # CCW or left-turning
-                            sin_table = np.array([[1,0],[1,1],[-1,1],[-1,0]], dtype=np.float64)
-                            cos_table = np.array([[0,1],[-1,1],[-1,-1],[0,-1]], dtype=np.float64)
-                        # Overlay a part of the full SSD
-                        if priocode == "RS2" or priocode == "RS9" or priocode == "RS6":
-                            # Normalized coordinates of box
-                            xyp = np.sin(own_hdg) * sin_table + np.cos(own_hdg) * cos_table
-                            # Scale with vmax (and some factor) and put in tuple
-                            part = pyclipper.scale_to_clipper(tuple(map(tuple, 1.1 * vmax * xyp)))
-                            pc2.AddPath(part, pyclipper.PT_SUBJECT, True)
-                        elif priocode == "RS3":
-                            # Small ring
-                            xyp = (tuple(map(tuple, np.flipud(xyc * min(vmax,gs_ap[i] + 0.1)))), tuple(map(tuple , xyc * max(vmin,gs_ap[i] - 0.1))))
-                            part = pyclipper.scale_to_clipper(xyp)
-                            pc2.AddPaths(part, pyclipper.PT_SUBJECT, True)
-                        elif priocode == "RS4":
-                            hdg_sel = hdg[i] * np.pi / 180
-                            xyp = np.array([[np.sin(hdg_sel-0.0087),np.cos(hdg_sel-0.0087)],
-                                            [0,0],
-                                            [np.sin(hdg_sel+0.0087),np.cos(hdg_sel+0.0087)]],
-                                            dtype=np.float64)
-                            part = pyclipper.scale_to_clipper(tuple(map(tuple, 1.1 * vmax * xyp)))
-                            pc2.AddPath(part, pyclipper.PT_SUBJECT, True)
-                        # Execute clipper command
-                        ARV_calc = pyclipper.scale_from_clipper(pc2.Execute(pyclipper.CT_INTERSECTION, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO))
-                        N += 1
-                        # If no smaller ARV is found, take the full ARV
-                        if len(ARV_calc) == 0:
-                            ARV_calc = ARV
-                        # Check multi exteriors, if this layer is not a list, it means it has no exteriors
-                        # In that case, make it a list, such that its format is consistent with further code
-                        if not type(ARV_calc[0][0]) == list:
-                            ARV_calc = [ARV_calc]
-                    # Shortest way out prio, so use full SSD (ARV_calc = ARV)
-                    else:
-                        ARV_calc = ARV
-                    # Update calculatable ARV for resolutions
-                    ARV_calc_loc[i] = ARV_calc
+    # Make the inputs of the SSD of every aircraft in conflict
+    tasks = []
+    others = []
+    for i in iconf:
+        # Get indices that belong to aircraft i
+        ind = np.where(np.logical_or(ind1 == i,ind2 == i))[0]
+        # The i's of the other aircraft
+        i_other = np.where(ind1[ind] == i, ind2[ind], ind1[ind])
+        # Aircraft that are within ADS-B range
+        ac_adsb = np.where(dist[ind] < adsbmax)[0]
+        # Now account for ADS-B range in indices of other aircraft (i_other)
+        ind = ind[ac_adsb]
+        i_other = i_other[ac_adsb]
+        if not priocode == "RS7" and not priocode == "RS8":
+            # Put it in class-object (not for RS7 and RS8)
+            asas.inrange[i]  = i_other
+        else:
+            asas.inrange2[i] = i_other
+        # VO from 2 to 1 is mirror of 1 to 2. Only 1 to 2 can be constructed in
+        # this manner, so need a correction vector that will mirror the VO
+        fix = np.ones(np.shape(i_other))
+        fix[i_other < i] = -1
+
+        # Get vertices in an x- and y-array of size (ntraf-1)*3x1
+        x = np.concatenate((gseast[i_other],
+                            x1[ind] * fix + gseast[i_other],
+                            x2[ind] * fix + gseast[i_other]))
+        y = np.concatenate((gsnorth[i_other],
+                            y1[ind] * fix + gsnorth[i_other],
+                            y2[ind] * fix + gsnorth[i_other]))
+        # Reshape [(ntraf-1)x3] and put arrays in one array [(ntraf-1)x3x2]
+        x = np.transpose(x.reshape(3, np.shape(i_other)[0]))
+        y = np.transpose(y.reshape(3, np.shape(i_other)[0]))
+        xy = np.dstack((x,y))
+
+        own = np.array([gseast[i], gsnorth[i], apeast[i], apnorth[i], hdg[i], gs_ap[i]])
+        tasks.append((own, i_other < i, qdr[ind], dist[ind], xy, hdg[i_other]))
+        others.append([traf.id[j] for j in i_other])
+
+    # Reuse the SSDs of aircraft for which the inputs didn't change (within
+    # the tolerance) since the previous call, and construct the others
+    params = (priocode, vmin, vmax, hsepm, beta)
+    cache = ssdcache.get(priocode, dict())
+    newcache = dict()
+    results = [None] * len(tasks)
+    todo = []
+    for n, (i, task) in enumerate(zip(iconf, tasks)):
+        key, state = ssdstate(params, others[n], task)
+        prev = cache.get(traf.id[i])
+        if prev is not None and prev[0] == key and \
+                np.all(np.abs(prev[1] - state) <= settings.asas_ssd_reusetol):
+            results[n] = prev[2]
+            newcache[traf.id[i]] = prev
+        else:
+            todo.append(n)
+            newcache[traf.id[i]] = (key, state, None)
+
+    for n, result in zip(todo, mapSSD([tasks[n] + params for n in todo])):
+        results[n] = result
+        acid = traf.id[iconf[n]]
+        newcache[acid] = newcache[acid][:2] + (result,)
+    ssdcache[priocode] = newcache
+
+    for i, (FRV, ARV, ARV_calc, FRV_area, ARV_area, conf2, apconf) in zip(iconf, results):
+        FRV_loc[i] = FRV
+        ARV_loc[i] = ARV
+        ARV_calc_loc[i] = ARV_calc
+        FRV_area_loc[i] = FRV_area
+        ARV_area_loc[i] = ARV_area
+        # Detect conflicts for smaller layer in RS7 and RS8
+        if conf2:
+            asas.inconf2[i] = True
+        if apconf:
+            asas.ap_free[i] = False
 
     # If sequential approach, the local should go elsewhere
     if not priocode == "RS7" and not priocode == "RS8":
@@ -426,6 +301,242 @@ def constructSSD(asas, traf, priocode = "RS1"):
     return
 
 
+def ringgeometry(vmin, vmax, N_angle=180):
+    """ The discretised ring-shaped part of the SSD between vmin and vmax.
+        Returns the points of the unit circle (N_angle x 2, CW), and the ring
+        in the (scaled) format pyclipper wants, and as lists for the ARV
+        and FRV. The ring is made once for each vmin and vmax. """
+    key = (vmin, vmax, N_angle)
+    if key not in ringcache:
+        # Discretize the circles using points on circle
+        angles = np.arange(0, 2 * np.pi, 2 * np.pi / N_angle)
+        # Put points of unit-circle in a (180x2)-array (CW)
+        xyc = np.transpose(np.reshape(np.concatenate((np.sin(angles), np.cos(angles))), (2, N_angle)))
+        # Map them into the format pyclipper wants. Outercircle CCW, innercircle CW
+        circle_tup = (tuple(map(tuple, np.flipud(xyc * vmax))), tuple(map(tuple , xyc * vmin)))
+        circle_lst = [list(map(list, np.flipud(xyc * vmax))), list(map(list , xyc * vmin))]
+        ringcache[key] = (xyc, pyclipper.scale_to_clipper(circle_tup), circle_lst)
+    return ringcache[key]
+
+
+def inrange_pairs(lat, lon, idx, maxdist):
+    """ Pairs of aircraft (ind1 < ind2, sorted), of which at least one is in
+        idx, that may be within maxdist [m] of each other. This is a
+        conservative prefilter on the great circle angle between the
+        aircraft: distances in geo are never smaller than this angle times
+        the polar radius of the earth. """
+    ntraf = len(lat)
+    if len(idx) == 0:
+        empty = np.array([], dtype=np.int32)
+        return empty, empty
+    latr, lonr = np.radians(lat), np.radians(lon)
+    # Unit vectors of the aircraft positions
+    pos = np.column_stack((np.cos(latr) * np.cos(lonr), np.cos(latr) * np.sin(lonr), np.sin(latr)))
+    # Maximum chord length between aircraft on the unit sphere
+    maxangle = min(np.pi, maxdist / 6.3e6)
+    maxchord2 = (2.0 * np.sin(0.5 * maxangle)) ** 2 * (1.0 + 1e-6)
+    pairs = []
+    # In blocks of aircraft to limit memory use
+    for start in range(0, len(idx), 256):
+        block = idx[start:start + 256]
+        chord2 = np.sum((pos[block, np.newaxis, :] - pos[np.newaxis, :, :]) ** 2, axis=2)
+        i, j = np.nonzero(chord2 <= maxchord2)
+        i = block[i]
+        other = i != j
+        i, j = i[other], j[other]
+        pairs.append(np.minimum(i, j) * ntraf + np.maximum(i, j))
+    pairs = np.unique(np.concatenate(pairs))
+    return (pairs // ntraf).astype(np.int32), (pairs % ntraf).astype(np.int32)
+
+
+def ssdstate(params, others, task):
+    """ The inputs of the SSD of an aircraft, to check whether a previous SSD
+        can be reused. Returns the part that needs to be equal (parameters,
+        other aircraft, and whether they are in LoS), and the part that can
+        change within the tolerance: velocities [m/s] and angles [deg]. """
+    own, mirror, qdr, dist, xy, hdg_other = task
+    priocode, vmin, vmax, hsepm, beta = params
+    key = (params, tuple(others), (dist > hsepm).tobytes())
+    return key, np.concatenate((own, xy.ravel(), np.rad2deg(qdr), hdg_other))
+
+
+def mapSSD(tasks):
+    """ Calculate the SSDs of all tasks (see aircraftSSD), in a process pool
+        when the asas_ssd_nworkers setting is larger than one. The workers
+        are spawned rather than forked, so they don't inherit the sockets
+        and threads of the simulation process. """
+    global pool, poolsize
+    nworkers = settings.asas_ssd_nworkers
+    if nworkers != poolsize:
+        stop()
+    if nworkers <= 1 or len(tasks) < 2 * nworkers:
+        return [aircraftSSD(*task) for task in tasks]
+    if pool is None:
+        pool = mp.get_context('spawn').Pool(nworkers)
+        poolsize = nworkers
+    return pool.starmap(aircraftSSD, tasks, chunksize=max(1, len(tasks) // (4 * nworkers)))
+
+
+def aircraftSSD(own, mirror, qdr, dist, xy, hdg_other, priocode, vmin, vmax, hsepm, beta):
+    """ Calculates the FRV and ARV of the SSD of one aircraft, from the
+        velocity obstacles (xy) of the other aircraft within ADS-B range.
+        Returns FRV, ARV, ARV_calc, their areas, whether the own velocity
+        is in one of the VOs (for RS7 and RS8), and whether the autopilot
+        velocity is in one of the VOs (for RS5). """
+    gseast, gsnorth, apeast, apnorth, hdg, gs_ap = own
+    xyc, circle_tup, circle_lst = ringgeometry(vmin, vmax)
+    conf2 = apconf = False
+
+    # Relative bearing [deg] from [-180,180]
+    # (less required conversions than rad in RotA)
+    fix_ang = np.zeros(np.shape(mirror))
+    fix_ang[mirror] = 180.
+
+    # Make a clipper object
+    pc = pyclipper.Pyclipper()
+    # Add circles (ring-shape) to clipper as subject
+    pc.AddPaths(circle_tup, pyclipper.PT_SUBJECT, True)
+
+    # Extra stuff needed for RotA
+    if priocode == "RS6":
+        # Make another clipper object for RotA
+        pc_rota = pyclipper.Pyclipper()
+        pc_rota.AddPaths(circle_tup, pyclipper.PT_SUBJECT, True)
+        # Bearing calculations from own view and other view
+        brg_own = np.mod((np.rad2deg(qdr) + fix_ang - hdg) + 540., 360.) - 180.
+        brg_other = np.mod((np.rad2deg(qdr) + 180. - fix_ang - hdg_other) + 540., 360.) - 180.
+
+    # Add each other other aircraft to clipper as clip
+    for j in range(np.shape(mirror)[0]):
+        # Scale VO when not in LOS
+        if dist[j] > hsepm:
+            # Normally VO shall be added of this other a/c
+            VO = pyclipper.scale_to_clipper(tuple(map(tuple,xy[j,:,:])))
+        else:
+            # Pair is in LOS, instead of triangular VO, use darttip
+            # Check if bearing should be mirrored
+            if mirror[j]:
+                qdr_los = qdr[j] + np.pi
+            else:
+                qdr_los = qdr[j]
+            # Length of inner-leg of darttip
+            leg = 1.1 * vmax / np.cos(beta) * np.array([1,1,1,0])
+            # Angles of darttip
+            angles_los = np.array([qdr_los + 2 * beta, qdr_los, qdr_los - 2 * beta, 0.])
+            # Calculate coordinates (CCW)
+            x_los = leg * np.sin(angles_los)
+            y_los = leg * np.cos(angles_los)
+            # Put in array of correct format
+            xy_los = np.vstack((x_los,y_los)).T
+            # Scale darttip
+            VO = pyclipper.scale_to_clipper(tuple(map(tuple,xy_los)))
+        # Add scaled VO to clipper
+        pc.AddPath(VO, pyclipper.PT_CLIP, True)
+        # For RotA it is possible to ignore
+        if priocode == "RS6":
+            if brg_own[j] >= -20. and brg_own[j] <= 110.:
+                # Head-on or converging from right
+                pc_rota.AddPath(VO, pyclipper.PT_CLIP, True)
+            elif brg_other[j] <= -110. or brg_other[j] >= 110.:
+                # In overtaking position
+                pc_rota.AddPath(VO, pyclipper.PT_CLIP, True)
+        # Detect conflicts for smaller layer in RS7 and RS8
+        if priocode == "RS7" or priocode == "RS8":
+            if pyclipper.PointInPolygon(pyclipper.scale_to_clipper((gseast,gsnorth)),VO):
+                conf2 = True
+        if priocode == "RS5":
+            if pyclipper.PointInPolygon(pyclipper.scale_to_clipper((apeast,apnorth)),VO):
+                apconf = True
+
+    # Execute clipper command
+    FRV = pyclipper.scale_from_clipper(pc.Execute(pyclipper.CT_INTERSECTION, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO))
+
+    ARV = pc.Execute(pyclipper.CT_DIFFERENCE, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO)
+
+    if not priocode == "RS1" and not priocode == "RS5" and not priocode == "RS7" and not priocode == "RS8":
+        # Make another clipper object for extra intersections
+        pc2 = pyclipper.Pyclipper()
+        # When using RotA clip with pc_rota
+        if priocode == "RS6":
+            # Calculate ARV for RotA
+            ARV_rota = pc_rota.Execute(pyclipper.CT_DIFFERENCE, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO)
+            if len(ARV_rota) > 0:
+                pc2.AddPaths(ARV_rota, pyclipper.PT_CLIP, True)
+        else:
+            # Put the ARV in there, make sure it's not empty
+            if len(ARV) > 0:
+                pc2.AddPaths(ARV, pyclipper.PT_CLIP, True)
+
+    # Scale back
+    ARV = pyclipper.scale_from_clipper(ARV)
+
+    # Check if ARV or FRV is empty
+    if len(ARV) == 0:
+        # No aircraft in the vicinity
+        # Map them into the format ARV wants. Outercircle CCW, innercircle CW
+        return circle_lst, [], [], np.pi * (vmax **2 - vmin ** 2), 0, conf2, apconf
+    elif len(FRV) == 0:
+        # Should not happen with one a/c or no other a/c in the vicinity.
+        # These are handled earlier. Happens when RotA has removed all
+        # Map them into the format ARV wants. Outercircle CCW, innercircle CW
+        return [], circle_lst, circle_lst, 0, np.pi * (vmax **2 - vmin ** 2), conf2, apconf
+
+    # Check multi exteriors, if this layer is not a list, it means it has no exteriors
+    # In that case, make it a list, such that its format is consistent with further code
+    if not type(FRV[0][0]) == list:
+        FRV = [FRV]
+    if not type(ARV[0][0]) == list:
+        ARV = [ARV]
+
+    # For resolution purposes sometimes extra intersections are wanted
+    if priocode == "RS2" or priocode == "RS9" or priocode == "RS6" or priocode == "RS3" or priocode == "RS4":
+        # Make a box that covers right or left of SSD
+        own_hdg = hdg * np.pi / 180
+        # Efficient calculation of box, see notes
+        if priocode == "RS2" or priocode == "RS6":
+            # CW or right-turning
+            sin_table = np.array([[1,0],[-1,0],[-1,-1],[1,-1]], dtype=np.float64)
+            cos_table = np.array([[0,1],[0,-1],[1,-1],[1,1]], dtype=np.float64)
+        elif priocode == "RS9":
+            # CCW or left-turning
+            sin_table = np.array([[1,0],[1,1],[-1,1],[-1,0]], dtype=np.float64)
+            cos_table = np.array([[0,1],[-1,1],[-1,-1],[0,-1]], dtype=np.float64)
+        # Overlay a part of the full SSD
+        if priocode == "RS2" or priocode == "RS9" or priocode == "RS6":
+            # Normalized coordinates of box
+            xyp = np.sin(own_hdg) * sin_table + np.cos(own_hdg) * cos_table
+            # Scale with vmax (and some factor) and put in tuple
+            part = pyclipper.scale_to_clipper(tuple(map(tuple, 1.1 * vmax * xyp)))
+            pc2.AddPath(part, pyclipper.PT_SUBJECT, True)
+        elif priocode == "RS3":
+            # Small ring
+            xyp = (tuple(map(tuple, np.flipud(xyc * min(vmax,gs_ap + 0.1)))), tuple(map(tuple , xyc * max(vmin,gs_ap - 0.1))))
+            part = pyclipper.scale_to_clipper(xyp)
+            pc2.AddPaths(part, pyclipper.PT_SUBJECT, True)
+        elif priocode == "RS4":
+            hdg_sel = hdg * np.pi / 180
+            xyp = np.array([[np.sin(hdg_sel-0.0087),np.cos(hdg_sel-0.0087)],
+                            [0,0],
+                            [np.sin(hdg_sel+0.0087),np.cos(hdg_sel+0.0087)]],
+                            dtype=np.float64)
+            part = pyclipper.scale_to_clipper(tuple(map(tuple, 1.1 * vmax * xyp)))
+            pc2.AddPath(part, pyclipper.PT_SUBJECT, True)
+        # Execute clipper command
+        ARV_calc = pyclipper.scale_from_clipper(pc2.Execute(pyclipper.CT_INTERSECTION, pyclipper.PFT_NONZERO, pyclipper.PFT_NONZERO))
+        # If no smaller ARV is found, take the full ARV
+        if len(ARV_calc) == 0:
+            ARV_calc = ARV
+        # Check multi exteriors, if this layer is not a list, it means it has no exteriors
+        # In that case, make it a list, such that its format is consistent with further code
+        if not type(ARV_calc[0][0]) == list:
+            ARV_calc = [ARV_calc]
+    # Shortest way out prio, so use full SSD (ARV_calc = ARV)
+    else:
+        ARV_calc = ARV
+
+    return FRV, ARV, ARV_calc, area(FRV), area(ARV), conf2, apconf
+
+
 def calculate_resolution(asas, traf):
     """ Calculates closest conflict-free point according to ruleset """
     # It's just linalg, however credits to: http://stackoverflow.com/a/1501725
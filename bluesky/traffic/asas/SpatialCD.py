@@ -0,0 +1,180 @@
+''' State-based conflict detection with a spatial grid prefilter.
+
+    Instead of evaluating all ntraf x ntraf aircraft combinations, candidate
+    pairs are first selected with a uniform grid over earth-centered
+    coordinates. The grid cell size is the maximum distance two aircraft can
+    close within the lookahead time (PZ radius plus twice the maximum ground
+    speed times the lookahead time), so every pair that can become a conflict
+    ends up in the same or in adjacent cells. The CPA calculations of
+    StateBasedCD are then only performed for this sparse list of candidates. '''
+import numpy as np
+from bluesky.tools import geo
+from bluesky.tools.aero import nm
+
+# Minor semi-axis of WGS-84 [m]. Chord lengths on a sphere with this radius
+# are never larger than the WGS-84 distances calculated by geo.qdrdist
+bwgs84 = 6356752.314245
+
+# Smallest allowed grid cell size [m], to keep the number of cells bounded
+mincellsize = 1000.0
+
+
+def detect(ownship, intruder, RPZ, HPZ, tlookahead):
+    ''' Conflict detection between ownship (traf) and intruder (traf/adsb).'''
+    ntraf = ownship.ntraf
+
+    # Select candidate pairs [i, j] (i = ownship, j = intruder) ---------------
+    gsmax = max(np.max(ownship.gs, initial=0.0), np.max(intruder.gs, initial=0.0))
+    vsmax = max(np.max(np.abs(ownship.vs), initial=0.0),
+                np.max(np.abs(intruder.vs), initial=0.0))
+    i, j = candidates(ownship.lat, ownship.lon, intruder.lat, intruder.lon,
+                      RPZ + 2.0 * gsmax * tlookahead)
+
+    # Vertical prefilter: discard pairs that can't reach each other's altitude
+    # band within the lookahead time
+    dalt = intruder.alt[j] - ownship.alt[i]
+    swvert = np.abs(dalt) <= HPZ + 2.0 * vsmax * tlookahead + 1.0
+    i, j, dalt = i[swvert], j[swvert], dalt[swvert]
+
+    # Horizontal conflict ------------------------------------------------------
+    # qdr is for [i,j] qdr from i to j, from perception of ADSB and own coordinates
+    qdr, dist = geo.qdrdist(ownship.lat[i], ownship.lon[i],
+                            intruder.lat[j], intruder.lon[j])
+    dist = dist * nm
+
+    # Calculate horizontal closest point of approach (CPA)
+    qdrrad = np.radians(qdr)
+    dx = dist * np.sin(qdrrad)  # is pos j rel to i
+    dy = dist * np.cos(qdrrad)  # is pos j rel to i
+
+    # Ownship and intruder track angle and speed
+    owntrkrad = np.radians(ownship.trk[i])
+    inttrkrad = np.radians(intruder.trk[j])
+    du = intruder.gs[j] * np.sin(inttrkrad) - ownship.gs[i] * np.sin(owntrkrad)
+    dv = intruder.gs[j] * np.cos(inttrkrad) - ownship.gs[i] * np.cos(owntrkrad)
+
+    dv2 = du * du + dv * dv
+    dv2 = np.where(np.abs(dv2) < 1e-6, 1e-6, dv2)  # limit lower absolute value
+    vrel = np.sqrt(dv2)
+
+    tcpa = -(du * dx + dv * dy) / dv2
+
+    # Calculate distance^2 at CPA (minimum distance^2)
+    dcpa2 = np.abs(dist * dist - tcpa * tcpa * dv2)
+
+    # Check for horizontal conflict
+    R2 = RPZ * RPZ
+    swhorconf = dcpa2 < R2  # conflict or not
+
+    # Calculate times of entering and leaving horizontal conflict
+    dxinhor = np.sqrt(np.maximum(0., R2 - dcpa2))  # half the distance travelled inzide zone
+    dtinhor = dxinhor / vrel
+
+    tinhor = np.where(swhorconf, tcpa - dtinhor, 1e8)  # Set very large if no conf
+    touthor = np.where(swhorconf, tcpa + dtinhor, -1e8)  # set very large if no conf
+
+    # Vertical conflict --------------------------------------------------------
+    dvs = intruder.vs[j] - ownship.vs[i]
+    dvs = np.where(np.abs(dvs) < 1e-6, 1e-6, dvs)  # prevent division by zero
+
+    # Check for passing through each others zone
+    tcrosshi = (dalt + HPZ) / -dvs
+    tcrosslo = (dalt - HPZ) / -dvs
+    tinver = np.minimum(tcrosshi, tcrosslo)
+    toutver = np.maximum(tcrosshi, tcrosslo)
+
+    # Combine vertical and horizontal conflict----------------------------------
+    tinconf = np.maximum(tinver, tinhor)
+    toutconf = np.minimum(toutver, touthor)
+
+    swconfl = swhorconf * (tinconf <= toutconf) * (toutconf > 0.0) * \
+        (tinconf < tlookahead)
+
+    # --------------------------------------------------------------------------
+    # Update conflict lists
+    # --------------------------------------------------------------------------
+    # Ownship conflict flag and max tCPA
+    inconf = np.zeros(ntraf, dtype=bool)
+    inconf[i[swconfl]] = True
+    tcpamax = np.zeros(ntraf)
+    np.maximum.at(tcpamax, i[swconfl], tcpa[swconfl])
+
+    # Select conflicting pairs: each a/c gets their own record
+    confpairs = [(ownship.id[ii], ownship.id[jj])
+                 for ii, jj in zip(i[swconfl], j[swconfl])]
+    swlos = (dist < RPZ) * (np.abs(dalt) < HPZ)
+    lospairs = [(ownship.id[ii], ownship.id[jj])
+                for ii, jj in zip(i[swlos], j[swlos])]
+
+    # bearing, dist, tcpa, tinconf, toutconf per conflict
+    return confpairs, lospairs, inconf, tcpamax, qdr[swconfl], \
+        dist[swconfl], np.sqrt(dcpa2[swconfl]), tcpa[swconfl], tinconf[swconfl]
+
+
+def candidates(lat1, lon1, lat2, lon2, radius):
+    ''' Return the index arrays (i, j) of all combinations of points 1 and 2
+        whose chord distance is within radius [m], with i != j. The
+        pairs are sorted on i, and on j within the same i, so the result
+        is ordered in the same way as np.where over a full ntraf x ntraf
+        matrix. '''
+    n = len(lat1)
+    if n < 2:
+        return np.array([], dtype=int), np.array([], dtype=int)
+
+    # Grid cell coordinates of both point sets, with a one-cell border
+    cellsize = max(radius * (1.0 + 1e-6), mincellsize)
+    xyz1 = ecef(lat1, lon1)
+    xyz2 = ecef(lat2, lon2)
+    cell1 = np.floor(xyz1 / cellsize).astype(np.int64)
+    cell2 = np.floor(xyz2 / cellsize).astype(np.int64)
+    cellmin = np.minimum(cell1.min(axis=0), cell2.min(axis=0)) - 1
+    cell1 -= cellmin
+    cell2 -= cellmin
+    dims = np.maximum(cell1.max(axis=0), cell2.max(axis=0)) + 2
+
+    # Hash the cell coordinates into one key per cell, and sort points 2 on it
+    key1 = (cell1[:, 0] * dims[1] + cell1[:, 1]) * dims[2] + cell1[:, 2]
+    key2 = (cell2[:, 0] * dims[1] + cell2[:, 1]) * dims[2] + cell2[:, 2]
+    order = np.argsort(key2, kind='stable')
+    key2 = key2[order]
+
+    # Look up the points 2 in each of the 27 neighbouring cells of points 1
+    ilst, jlst = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            for dz in (-1, 0, 1):
+                nkey = key1 + (dx * dims[1] + dy) * dims[2] + dz
+                lo = np.searchsorted(key2, nkey, 'left')
+                cnt = np.searchsorted(key2, nkey, 'right') - lo
+                ntot = cnt.sum()
+                if ntot == 0:
+                    continue
+                # Expand the [lo, lo + cnt) ranges to individual pairs
+                ilst.append(np.repeat(np.arange(n), cnt))
+                jlst.append(order[np.arange(ntot) +
+                                  np.repeat(lo - np.cumsum(cnt) + cnt, cnt)])
+
+    if not ilst:
+        return np.array([], dtype=int), np.array([], dtype=int)
+
+    i = np.concatenate(ilst)
+    j = np.concatenate(jlst)
+
+    # Only keep pairs of different points within radius of each other. The
+    # chord distance is never larger than the distance over the earth surface
+    dxyz = xyz2[j] - xyz1[i]
+    sel = np.logical_and(i != j, np.einsum('ij,ij->i', dxyz, dxyz) <= cellsize * cellsize)
+    i, j = i[sel], j[sel]
+    pairorder = np.argsort(i * len(lat2) + j)
+    return i[pairorder], j[pairorder]
+
+
+def ecef(lat, lon):
+    ''' Earth-centered cartesian coordinates [m] of lat/lon [deg] on a
+        sphere with the WGS-84 minor semi-axis as radius. '''
+    latrad = np.radians(lat)
+    lonrad = np.radians(lon)
+    coslat = np.cos(latrad)
+    return bwgs84 * np.column_stack((coslat * np.cos(lonrad),
+                                     coslat * np.sin(lonrad),
+                                     np.sin(latrad)))
@@ -8,8 +8,10 @@ Created on Wed Mar 04 14:27:44 2015
 """
 
 import numpy as np
+from bluesky.tools import geo
 from bluesky.tools.aero import nm, ft
 from . import MVP
+from .SpatialCD import candidates
 
 
 def start(asas):
@@ -20,27 +22,44 @@ def start(asas):
     pass
 
 
-def resolve(asas, traf):
-    # Find matrix of neighbouring aircraft withing swarm distance
-    qdrrad = np.radians(asas.qdr)
-    dx = asas.dist * np.sin(qdrrad)
-    dy = asas.dist * np.cos(qdrrad)
-
-    dy = dy - np.eye(traf.ntraf) * 1e9  # setting distance of A/C to itself to 0,\
-    # correcting the distance from CASAS line 109
-
-    dalt = traf.alt.reshape((1, traf.ntraf)) - traf.alt.reshape((1, traf.ntraf)).T
-    close = np.logical_and(dx**2 + dy**2 < asas.Rswarm**2,
-                           np.abs(dalt) < asas.dhswarm)
+def neighbours(asas, traf):
+    """ Sparse list of swarming aircraft: the pairs (i, j) of different
+        aircraft within Rswarm and dhswarm of each other, that fly in the
+        same direction. The pairs are sorted on i (CSR order). Also returns
+        the position of j relative to i (dx, dy) [m], and the track
+        difference dtrk [deg]. """
+    # Only pairs within Rswarm over the earth surface are candidates
+    i, j = candidates(traf.lat, traf.lon, traf.lat, traf.lon, asas.Rswarm)
+    close = np.abs(traf.alt[j] - traf.alt[i]) < asas.dhswarm
+    i, j = i[close], j[close]
 
-    trkdif = traf.trk.reshape(1, traf.ntraf) - traf.trk.reshape(traf.ntraf, 1)
+    trkdif = traf.trk[j] - traf.trk[i]
     dtrk = (trkdif + 180) % 360 - 180
     samedirection = np.abs(dtrk) < 90
+    i, j, dtrk = i[samedirection], j[samedirection], dtrk[samedirection]
+
+    qdr, dist = geo.qdrdist(traf.lat[i], traf.lon[i], traf.lat[j], traf.lon[j])
+    qdrrad = np.radians(qdr)
+    dist = dist * nm
+    dx = dist * np.sin(qdrrad)
+    dy = dist * np.cos(qdrrad)
+
+    selected = dx**2 + dy**2 < asas.Rswarm**2
+    return i[selected], j[selected], dx[selected], dy[selected], dtrk[selected]
 
-    selected = np.logical_and(close, samedirection)
-    own = np.eye(traf.ntraf, dtype='bool')
 
-    Swarming = np.logical_or(selected, own)
+def average(i, own, values, count):
+    """ Average per aircraft of its own value and the values of its
+        neighbours, with i the (sorted) aircraft index of each value. """
+    return (own + np.bincount(i, weights=values, minlength=len(own))) / count
+
+
+def resolve(asas, traf):
+    # Find the neighbouring aircraft within swarm distance. Each aircraft
+    # swarms with its neighbours and with itself.
+    i, j, dx, dy, dtrk = neighbours(asas, traf)
+    count = 1.0 + np.bincount(i, minlength=traf.ntraf)
+    zero = np.zeros(traf.ntraf)
 
     # First do conflict resolution following MVP
     MVP.resolve(asas, traf)
@@ -51,24 +70,18 @@ def resolve(asas, traf):
     ca_vs = asas.active * asas.vs + (1 - asas.active) * traf.selvs
 
     # Add factor of Velocity Alignment to speed vector
-    hspeed = np.ones((traf.ntraf, traf.ntraf)) * traf.cas
-    va_cas = np.average(hspeed, axis=1, weights=Swarming)
+    va_cas = average(i, traf.cas, traf.cas[j], count)
+    va_vs = average(i, traf.vs, traf.vs[j], count)
 
-    vspeed = np.ones((traf.ntraf, traf.ntraf)) * traf.vs
-    va_vs = np.average(vspeed, axis=1, weights=Swarming)
-
-    avgdtrk = np.average(dtrk, axis=1, weights=Swarming)
+    avgdtrk = average(i, zero, dtrk, count)
     va_trk = traf.trk + avgdtrk
 
-    # Add factor of Flock Centering to speed vector
-    dxflock = dx + np.eye(traf.ntraf) * asas.u / 100.
-    dyflock = dy + np.eye(traf.ntraf) * asas.v / 100.
-
-    fc_dx = np.average(dxflock, axis=1, weights=Swarming)
-    fc_dy = np.average(dyflock, axis=1, weights=Swarming)
+    # Add factor of Flock Centering to speed vector, where the ownship is
+    # placed at a hundredth of its own velocity vector
+    fc_dx = average(i, traf.gseast / 100., dx, count)
+    fc_dy = average(i, traf.gsnorth / 100., dy, count)
 
-    z = np.ones((traf.ntraf, traf.ntraf)) * traf.alt
-    fc_dz = np.average(z, axis=1, weights=Swarming) - traf.alt
+    fc_dz = average(i, traf.alt, traf.alt[j], count) - traf.alt
 
     fc_trk = np.degrees(np.arctan2(fc_dx, fc_dy))
     fc_cas = traf.cas
@@ -86,14 +99,14 @@ def resolve(asas, traf):
 
     Swarmvx = np.average(vxs, axis=0, weights=asas.Swarmweights)
     Swarmvy = np.average(vys, axis=0, weights=asas.Swarmweights)
-    Swarmhdg = np.degrees(np.arctan2(Swarmvx, Swarmvy))
+    Swarmtrk = np.degrees(np.arctan2(Swarmvx, Swarmvy))
     Swarmcas = np.average(cass, axis=0, weights=asas.Swarmweights)
     Swarmvs = np.average(vss, axis=0, weights=asas.Swarmweights)
 
     # Cap the velocity
     Swarmcascapped = np.maximum(asas.vmin, np.minimum(asas.vmax, Swarmcas))
     # Assign Final Swarming directions to traffic
-    asas.hdg = Swarmhdg
+    asas.trk = Swarmtrk
     asas.tas = Swarmcascapped
     asas.vs = Swarmvs
     asas.alt = np.sign(Swarmvs) * 1e5
@@ -0,0 +1,292 @@
+''' Memory-bounded state-based conflict detection.
+
+    Same conflict detection as StateBasedCD, but ownship and intruder
+    aircraft are processed in tiles of asas_cdblocksize x asas_cdblocksize
+    aircraft, so peak memory is O(blocksize^2) instead of O(ntraf x ntraf).
+    All intermediate tile results are stored in scratch buffers that are
+    kept between ASAS updates, and can optionally be calculated in single
+    precision (asas_cdfloat32). '''
+from types import SimpleNamespace
+import numpy as np
+from bluesky import settings
+
+# Register settings defaults
+settings.set_variable_defaults(asas_cdblocksize=500, asas_cdfloat32=False)
+
+# WGS-84 semi-axes [m], used for the earth radius at the average latitude
+a = 6378137.0
+b = 6356752.314245
+q = (b / a) ** 2
+
+
+class Workspace:
+    ''' Scratch buffers for a tile of ownship aircraft against intruders.
+        Buffers are only reallocated when the tile no longer fits. '''
+    floatbufs = ('r', 'tmp', 'dist', 'dx', 'dy', 'du', 'dv', 'dv2', 'tcpa',
+                 'dcpa2', 'tinhor', 'touthor', 'dalt', 'dvs', 'tinver',
+                 'toutver')
+    boolbufs = ('swhor', 'swconfl', 'swtmp')
+
+    def __init__(self):
+        self.size = 0
+        self.dtype = None
+        self.buffers = dict()
+
+    def get(self, nrows, ncols, dtype):
+        ''' Return a namespace of (nrows x ncols) views on the scratch buffers. '''
+        size = nrows * ncols
+        if size > self.size or dtype != self.dtype:
+            # Allocate with some headroom to avoid reallocation for every
+            # aircraft that is added to the simulation, but never more than
+            # a full tile
+            blocksize = max(1, int(settings.asas_cdblocksize))
+            self.size = min(int(1.25 * size), max(size, blocksize * blocksize))
+            self.dtype = dtype
+            self.buffers = {name: np.empty(self.size, dtype=dtype)
+                            for name in self.floatbufs}
+            self.buffers.update({name: np.empty(self.size, dtype=bool)
+                                 for name in self.boolbufs})
+
+        return SimpleNamespace(**{name: buf[:size].reshape(nrows, ncols)
+                                  for name, buf in self.buffers.items()})
+
+    def clear(self):
+        ''' Release all scratch buffers. '''
+        self.__init__()
+
+
+# The scratch buffers are shared between subsequent calls to detect
+workspace = Workspace()
+
+
+def detect(ownship, intruder, RPZ, HPZ, tlookahead):
+    ''' Conflict detection between ownship (traf) and intruder (traf/adsb).'''
+    ntraf = ownship.ntraf
+    dtype = np.float32 if settings.asas_cdfloat32 else np.float64
+    blocksize = max(1, min(int(settings.asas_cdblocksize), ntraf))
+
+    # Per-aircraft data, converted once to the working precision
+    own = aircraftdata(ownship, dtype)
+    intr = aircraftdata(intruder, dtype)
+
+    nintr = intruder.ntraf
+    inconf = np.zeros(ntraf, dtype=bool)
+    tcpamax = np.zeros(ntraf)
+    confidx, losidx = [], []
+    qdr, dist, dcpa, tcpa, tinconf = [], [], [], [], []
+
+    for i0 in range(0, ntraf, blocksize):
+        i1 = min(ntraf, i0 + blocksize)
+        tiles = []
+        for j0 in range(0, nintr, blocksize):
+            j1 = min(nintr, j0 + blocksize)
+            blk = workspace.get(i1 - i0, j1 - j0, dtype)
+            detect_block(blk, own, intr, i0, i1, j0, j1, RPZ, HPZ, tlookahead)
+
+            # Ownship conflict flag and max tCPA
+            inconf[i0:i1] |= np.any(blk.swconfl, axis=1)
+            np.multiply(blk.tcpa, blk.swconfl, out=blk.tmp)
+            np.maximum(tcpamax[i0:i1], np.max(blk.tmp, axis=1), out=tcpamax[i0:i1])
+
+            # Conflict and LoS pairs of this tile, in global indices, with
+            # bearing, dist, dcpa, tcpa, tinconf per conflict
+            iconf, jconf = np.nonzero(blk.swconfl)
+            ilos, jlos = np.nonzero(blk.swtmp)
+            tiles.append((iconf + i0, jconf + j0, ilos + i0, jlos + j0,
+                          np.degrees(np.arctan2(blk.dx[iconf, jconf],
+                                                blk.dy[iconf, jconf], dtype=np.float64)),
+                          blk.dist[iconf, jconf], np.sqrt(blk.dcpa2[iconf, jconf]),
+                          blk.tcpa[iconf, jconf], blk.tinhor[iconf, jconf]))
+
+        # Put the pairs of this row of tiles in the order of a full matrix
+        iconf, jconf, ilos, jlos, *values = (np.concatenate(v) for v in zip(*tiles))
+        order = np.argsort(iconf * nintr + jconf, kind='stable')
+        losorder = np.argsort(ilos * nintr + jlos, kind='stable')
+        confidx.append((iconf[order], jconf[order]))
+        losidx.append((ilos[losorder], jlos[losorder]))
+        for lst, value in zip((qdr, dist, dcpa, tcpa, tinconf), values):
+            lst.append(value[order])
+
+    # Select conflicting pairs: each a/c gets their own record
+    confpairs = [(ownship.id[i], ownship.id[j])
+                 for iblk, jblk in confidx for i, j in zip(iblk, jblk)]
+    lospairs = [(ownship.id[i], ownship.id[j])
+                for iblk, jblk in losidx for i, j in zip(iblk, jblk)]
+
+    return confpairs, lospairs, inconf, tcpamax, concat(qdr), concat(dist), \
+        concat(dcpa), concat(tcpa), concat(tinconf)
+
+
+def detect_block(blk, own, intr, i0, i1, j0, j1, RPZ, HPZ, tlookahead):
+    ''' Perform state-based conflict detection for ownship aircraft i0 to i1
+        against intruders j0 to j1. The resulting conflict matrix is stored
+        in blk.swconfl, and the LoS matrix in blk.swtmp. '''
+    # Row vectors of the ownship block, column vectors of the intruder block
+    olatr, olonr = own.latr[i0:i1, None], own.lonr[i0:i1, None]
+    osinlat, ocoslat = own.sinlat[i0:i1, None], own.coslat[i0:i1, None]
+    ilatr, ilonr = intr.latr[None, j0:j1], intr.lonr[None, j0:j1]
+    isinlat, icoslat = intr.sinlat[None, j0:j1], intr.coslat[None, j0:j1]
+
+    # Horizontal conflict ------------------------------------------------------
+    # Earth radius at the average latitude: r = a * sqrt((c2 + q2 s2) / (c2 + q s2))
+    np.add(olatr, ilatr, out=blk.r)
+    blk.r *= 0.5
+    np.cos(blk.r, out=blk.dx)
+    np.sin(blk.r, out=blk.dy)
+    blk.dx *= blk.dx
+    blk.dy *= blk.dy
+    np.multiply(blk.dy, q * q, out=blk.r)
+    blk.r += blk.dx
+    blk.dy *= q
+    blk.dy += blk.dx
+    blk.r /= blk.dy
+    np.sqrt(blk.r, out=blk.r)
+    blk.r *= a
+
+    # Different hemispheres: weighted average of the radii of both positions
+    np.multiply(olatr, ilatr, out=blk.tmp)
+    np.less(blk.tmp, 0.0, out=blk.swtmp)
+    if blk.swtmp.any():
+        irow, icol = np.nonzero(blk.swtmp)
+        alat1 = np.abs(own.latr[irow + i0])
+        alat2 = np.abs(intr.latr[icol + j0])
+        blk.r[irow, icol] = 0.5 * (alat1 * (own.r[irow + i0] + a) +
+                                   alat2 * (intr.r[icol + j0] + a)) / (alat1 + alat2)
+
+    # Great-circle distance (Haversine)
+    np.subtract(ilatr, olatr, out=blk.tmp)
+    blk.tmp *= 0.5
+    np.sin(blk.tmp, out=blk.tmp)
+    np.multiply(blk.tmp, blk.tmp, out=blk.dist)
+    np.subtract(ilonr, olonr, out=blk.tmp)
+    blk.tmp *= 0.5
+    np.sin(blk.tmp, out=blk.tmp)
+    blk.tmp *= blk.tmp
+    blk.tmp *= ocoslat
+    blk.tmp *= icoslat
+    blk.dist += blk.tmp
+    np.minimum(blk.dist, 1.0, out=blk.dist)
+    np.subtract(1.0, blk.dist, out=blk.tmp)
+    np.sqrt(blk.tmp, out=blk.tmp)
+    np.sqrt(blk.dist, out=blk.dist)
+    np.arctan2(blk.dist, blk.tmp, out=blk.dist)
+    blk.dist *= blk.r
+    blk.dist *= 2.0
+
+    # Bearing from ownship to intruder, as unit vector components
+    np.subtract(ilonr, olonr, out=blk.tmp)
+    np.sin(blk.tmp, out=blk.dx)
+    blk.dx *= icoslat
+    np.cos(blk.tmp, out=blk.dy)
+    blk.dy *= osinlat
+    blk.dy *= icoslat
+    np.multiply(ocoslat, isinlat, out=blk.tmp)
+    np.subtract(blk.tmp, blk.dy, out=blk.dy)
+    np.hypot(blk.dx, blk.dy, out=blk.tmp)
+    np.maximum(blk.tmp, 1e-30, out=blk.tmp)
+    blk.dx /= blk.tmp
+    blk.dy /= blk.tmp
+
+    # Relative position of intruder, and relative velocity
+    blk.dx *= blk.dist  # is pos j rel to i
+    blk.dy *= blk.dist  # is pos j rel to i
+    np.subtract(intr.u[None, j0:j1], own.u[i0:i1, None], out=blk.du)
+    np.subtract(intr.v[None, j0:j1], own.v[i0:i1, None], out=blk.dv)
+
+    np.multiply(blk.du, blk.du, out=blk.dv2)
+    np.multiply(blk.dv, blk.dv, out=blk.tmp)
+    blk.dv2 += blk.tmp
+    np.maximum(blk.dv2, 1e-6, out=blk.dv2)  # limit lower absolute value
+
+    # Calculate horizontal closest point of approach (CPA)
+    np.multiply(blk.du, blk.dx, out=blk.tcpa)
+    np.multiply(blk.dv, blk.dy, out=blk.tmp)
+    blk.tcpa += blk.tmp
+    blk.tcpa /= blk.dv2
+    np.negative(blk.tcpa, out=blk.tcpa)
+
+    # Calculate distance^2 at CPA (minimum distance^2)
+    np.multiply(blk.tcpa, blk.tcpa, out=blk.tmp)
+    blk.tmp *= blk.dv2
+    np.multiply(blk.dist, blk.dist, out=blk.dcpa2)
+    blk.dcpa2 -= blk.tmp
+    np.abs(blk.dcpa2, out=blk.dcpa2)
+
+    # Check for horizontal conflict
+    R2 = RPZ * RPZ
+    np.less(blk.dcpa2, R2, out=blk.swhor)
+
+    # Calculate times of entering and leaving horizontal conflict
+    np.subtract(R2, blk.dcpa2, out=blk.tmp)
+    np.maximum(blk.tmp, 0.0, out=blk.tmp)
+    blk.tmp /= blk.dv2
+    np.sqrt(blk.tmp, out=blk.tmp)  # half the time spent inside zone
+    np.subtract(blk.tcpa, blk.tmp, out=blk.tinhor)
+    np.add(blk.tcpa, blk.tmp, out=blk.touthor)
+    np.logical_not(blk.swhor, out=blk.swtmp)
+    np.copyto(blk.tinhor, 1e8, where=blk.swtmp)  # Set very large if no conf
+    np.copyto(blk.touthor, -1e8, where=blk.swtmp)
+
+    # Vertical conflict --------------------------------------------------------
+    np.subtract(intr.alt[None, j0:j1], own.alt[i0:i1, None], out=blk.dalt)
+    np.subtract(intr.vs[None, j0:j1], own.vs[i0:i1, None], out=blk.dvs)
+    np.abs(blk.dvs, out=blk.tmp)
+    np.less(blk.tmp, 1e-6, out=blk.swtmp)
+    np.copyto(blk.dvs, 1e-6, where=blk.swtmp)  # prevent division by zero
+    np.negative(blk.dvs, out=blk.dvs)
+
+    # Check for passing through each others zone
+    np.add(blk.dalt, HPZ, out=blk.tinver)
+    blk.tinver /= blk.dvs
+    np.subtract(blk.dalt, HPZ, out=blk.toutver)
+    blk.toutver /= blk.dvs
+    np.minimum(blk.tinver, blk.toutver, out=blk.tmp)
+    np.maximum(blk.tinver, blk.toutver, out=blk.toutver)
+
+    # Combine vertical and horizontal conflict----------------------------------
+    # Store tinconf in tinhor and toutconf in touthor
+    np.maximum(blk.tmp, blk.tinhor, out=blk.tinhor)
+    np.minimum(blk.toutver, blk.touthor, out=blk.touthor)
+
+    np.less_equal(blk.tinhor, blk.touthor, out=blk.swconfl)
+    blk.swconfl &= blk.swhor
+    np.greater(blk.touthor, 0.0, out=blk.swtmp)
+    blk.swconfl &= blk.swtmp
+    np.less(blk.tinhor, tlookahead, out=blk.swtmp)
+    blk.swconfl &= blk.swtmp
+
+    # Loss of separation
+    np.abs(blk.dalt, out=blk.tmp)
+    np.less(blk.tmp, HPZ, out=blk.swtmp)
+    np.less(blk.dist, RPZ, out=blk.swhor)
+    blk.swtmp &= blk.swhor
+
+    # Avoid ownship-ownship detected conflicts
+    diag = np.arange(max(i0, j0), min(i1, j1))
+    blk.swconfl[diag - i0, diag - j0] = False
+    blk.swtmp[diag - i0, diag - j0] = False
+
+
+def aircraftdata(traf, dtype):
+    ''' Per-aircraft quantities used in conflict detection. '''
+    latr = np.radians(traf.lat)
+    trkrad = np.radians(traf.trk)
+    coslat = np.cos(latr)
+    sinlat = np.sin(latr)
+    # Earth radius at each aircraft position
+    r = a * np.sqrt((coslat * coslat + q * q * sinlat * sinlat) /
+                    (coslat * coslat + q * sinlat * sinlat))
+    return SimpleNamespace(latr=latr.astype(dtype), lonr=np.radians(traf.lon).astype(dtype),
+                           sinlat=sinlat.astype(dtype), coslat=coslat.astype(dtype),
+                           r=r.astype(dtype),
+                           u=(traf.gs * np.sin(trkrad)).astype(dtype),
+                           v=(traf.gs * np.cos(trkrad)).astype(dtype),
+                           alt=np.asarray(traf.alt, dtype=dtype),
+                           vs=np.asarray(traf.vs, dtype=dtype))
+
+
+def concat(arrays):
+    ''' Concatenate block results into one double precision array. '''
+    if not arrays:
+        return np.array([])
+    return np.concatenate(arrays).astype(np.float64)
@@ -25,6 +25,8 @@ if settings.prefer_compiled:
 if not StateBasedCD:
     print('StateBasedCD: using Python version.')
     from . import StateBasedCD
+from . import SpatialCD
+from . import TiledCD
 
 # Import default CR methods
 from . import DoNothing
@@ -39,7 +41,8 @@ class ASAS(TrafficArrays):
         Maintains a confict database, and links to external CD and CR methods."""
 
     # Dictionary of CD methods
-    CDmethods = {"STATEBASED": StateBasedCD}
+    CDmethods = {"STATEBASED": StateBasedCD, "SPATIAL": SpatialCD,
+                 "TILED": TiledCD}
 
     # Dictionary of CR methods
     CRmethods = {"OFF": DoNothing, "MVP": MVP, "EBY": Eby, "SWARM": Swarm}
@@ -73,6 +76,10 @@ class ASAS(TrafficArrays):
     def reset(self):
         super(ASAS, self).reset()
 
+        # Stop the CR method that was selected (e.g. the SSD process pool)
+        if hasattr(self, 'cr'):
+            self.stopcr()
+
         """ ASAS constructor """
         self.cd_name      = "STATEBASED"
         self.cr_name      = "OFF"
@@ -118,7 +125,8 @@ class ASAS(TrafficArrays):
         # Sets of pairs: conflict pairs, LoS pairs
         self.confpairs = list()  # Conflict pairs detected in the current timestep (used for resolving)
         self.confpairs_unique = set()  # Unique conflict pairs (a, b) = (b, a) are merged
-        self.resopairs = set()  # Resolved (when RESO is on) conflicts that are still before CPA
+        self.resoidx1 = np.array([], dtype=int)  # Resolved (when RESO is on) conflicts that are still before CPA:
+        self.resoidx2 = np.array([], dtype=int)  # ownship and intruder (-1 when deleted) indices
         self.lospairs = list()  # Current loss of separation pairs
         self.lospairs_unique = set()  # Unique LOS pairs (a, b) = (b, a) are merged
         self.confpairs_all = list()  # All conflicts since simt=0
@@ -132,6 +140,12 @@ class ASAS(TrafficArrays):
         self.qdr = np.array([])  # Bearing from ownship to intruder
         self.dist = np.array([])  # Horizontal distance between ""
 
+    @property
+    def resopairs(self):
+        ''' Resolved conflict pairs that are still before CPA, as id tuples. '''
+        return {(bs.traf.id[i], bs.traf.id[j] if j >= 0 else '')
+                for i, j in zip(self.resoidx1, self.resoidx2)}
+
     def toggle(self, flag=None):
         if flag is None:
             return True, "ASAS is currently " + ("ON" if self.swasas else "OFF")
@@ -150,7 +164,8 @@ class ASAS(TrafficArrays):
         """
         self.confpairs = list()  # Conflict pairs detected in the current timestep (used for resolving)
         self.confpairs_unique = set()  # Unique conflict pairs (a, b) = (b, a) are merged
-        self.resopairs = set()  # Resolved (when RESO is on) conflicts that are still before CPA
+        self.resoidx1 = np.array([], dtype=int)  # Resolved (when RESO is on) conflicts that are still before CPA:
+        self.resoidx2 = np.array([], dtype=int)  # ownship and intruder (-1 when deleted) indices
         self.lospairs = list()  # Current loss of separation pairs
         self.lospairs_unique = set()  # Unique LOS pairs (a, b) = (b, a) are merged
         self.confpairs_all = list()  # All conflicts since simt=0
@@ -186,10 +201,16 @@ class ASAS(TrafficArrays):
         if method not in ASAS.CRmethods:
             return False, (method + " doesn't exist.\nAvailable CR methods: " + str.join(", ", list(ASAS.CRmethods.keys())))
 
+        self.stopcr()
         self.cr_name = method
         self.cr = ASAS.CRmethods[method]
         self.cr.start(self)
 
+    def stopcr(self):
+        """ Stop the current CR method, for CR methods that need it. """
+        if hasattr(self.cr, 'stop'):
+            self.cr.stop()
+
     def SetPZR(self, value=None):
         if value is None:
             return True, ("ZONER [radius (nm)]\nCurrent PZ radius: %.2f NM" % (self.R / nm))
@@ -409,77 +430,103 @@ class ASAS(TrafficArrays):
         self.tas[-n:] = bs.traf.tas[-n:]
         self.alt[-n:] = bs.traf.alt[-n:]
 
+    def delete(self, idx):
+        super(ASAS, self).delete(idx)
+
+        # Shift the resolution pair indices to the remaining aircraft.
+        # Pairs of deleted ownships are removed, deleted intruders get index -1
+        if len(self.resoidx1):
+            delidx = np.sort(np.atleast_1d(idx))
+
+            def remap(oldidx):
+                pos = np.searchsorted(delidx, oldidx)
+                isdel = delidx[np.minimum(pos, len(delidx) - 1)] == oldidx
+                return np.where(isdel | (oldidx < 0), -1, oldidx - pos)
+
+            self.resoidx1 = remap(self.resoidx1)
+            self.resoidx2 = remap(self.resoidx2)
+            keep = self.resoidx1 >= 0
+            self.resoidx1 = self.resoidx1[keep]
+            self.resoidx2 = self.resoidx2[keep]
+
+    def addresopairs(self, confpairs):
+        """ Add new conflict pairs to the resolution pairs (resoidx1/2),
+            merging pairs that are already in there. """
+        idx = np.array(bs.traf.id2idx([acid for pair in confpairs for acid in pair]),
+                       dtype=int).reshape(-1, 2)
+        idx1 = np.append(self.resoidx1, idx[:, 0])
+        idx2 = np.append(self.resoidx2, idx[:, 1])
+
+        # Unique pairs: intruder index is offset by one to also allow -1
+        _, iunique = np.unique(idx1 * (bs.traf.ntraf + 1) + idx2 + 1, return_index=True)
+        self.resoidx1 = idx1[iunique]
+        self.resoidx2 = idx2[iunique]
+
     def ResumeNav(self):
         """ Decide for each aircraft in the conflict list whether the ASAS
             should be followed or not, based on if the aircraft pairs passed
             their CPA. """
-        # Conflict pairs to be deleted
-        delpairs = set()
-        changeactive = dict()
-
-        # Look at all conflicts, also the ones that are solved but CPA is yet to come
-        for conflict in self.resopairs:
-            idx1, idx2 = bs.traf.id2idx(conflict)
-            # If the ownship aircraft is deleted remove its conflict from the list
-            if idx1 < 0:
-                delpairs.add(conflict)
-                continue
-
-            if idx2 >= 0:
-                # Distance vector using flat earth approximation
-                re = 6371000.
-                dist = re * np.array([np.radians(bs.traf.lon[idx2] - bs.traf.lon[idx1]) *
-                                      np.cos(0.5 * np.radians(bs.traf.lat[idx2] +
-                                                              bs.traf.lat[idx1])),
-                                      np.radians(bs.traf.lat[idx2] - bs.traf.lat[idx1])])
-
-                # Relative velocity vector
-                vrel = np.array([bs.traf.gseast[idx2] - bs.traf.gseast[idx1],
-                                 bs.traf.gsnorth[idx2] - bs.traf.gsnorth[idx1]])
-
-                # Check if conflict is past CPA
-                past_cpa = np.dot(dist, vrel) > 0.0
-
-                # hor_los:
-                # Aircraft should continue to resolve until there is no horizontal
-                # LOS. This is particularly relevant when vertical resolutions
-                # are used.
-                hdist = np.linalg.norm(dist)
-                hor_los = hdist < self.R
-
-                # Bouncing conflicts:
-                # If two aircraft are getting in and out of conflict continously,
-                # then they it is a bouncing conflict. ASAS should stay active until
-                # the bouncing stops.
-                is_bouncing = abs(bs.traf.trk[idx1] - bs.traf.trk[idx2]) < 30.0 and hdist < self.Rm
-
-            # Start recovery for ownship if intruder is deleted, or if past CPA
-            # and not in horizontal LOS or a bouncing conflict
-            if idx2 >= 0 and (not past_cpa or hor_los or is_bouncing):
-                # Enable ASAS for this aircraft
-                changeactive[idx1] = True
-            else:
-                # Switch ASAS off for ownship if there are no other conflicts
-                # that this aircraft is involved in.
-                changeactive[idx1] = changeactive.get(idx1, False)
-                # If conflict is solved, remove it from the resopairs list
-                delpairs.add(conflict)
-
-        for idx, active in changeactive.items():
-            # Loop a second time: this is to avoid that ASAS resolution is
-            # turned off for an aircraft that is involved simultaneously in
-            # multiple conflicts, where the first, but not all conflicts are
-            # resolved.
-            self.active[idx] = active
-            if not active:
-                # Waypoint recovery after conflict: Find the next active waypoint
-                # and send the aircraft to that waypoint.
-                iwpid = bs.traf.ap.route[idx].findact(idx)
-                if iwpid != -1:  # To avoid problems if there are no waypoints
-                    bs.traf.ap.route[idx].direct(idx, bs.traf.ap.route[idx].wpname[iwpid])
+        if len(self.resoidx1) == 0:
+            return
+
+        idx1 = self.resoidx1
+        # Pairs with a deleted intruder are evaluated with a dummy intruder
+        hasintruder = self.resoidx2 >= 0
+        idx2 = np.where(hasintruder, self.resoidx2, idx1)
+
+        # Distance vector using flat earth approximation
+        re = 6371000.
+        lat1, lat2 = bs.traf.lat[idx1], bs.traf.lat[idx2]
+        distx = re * np.radians(bs.traf.lon[idx2] - bs.traf.lon[idx1]) * \
+            np.cos(0.5 * np.radians(lat2 + lat1))
+        disty = re * np.radians(lat2 - lat1)
+
+        # Relative velocity vector
+        vrelx = bs.traf.gseast[idx2] - bs.traf.gseast[idx1]
+        vrely = bs.traf.gsnorth[idx2] - bs.traf.gsnorth[idx1]
+
+        # Check if conflict is past CPA
+        past_cpa = distx * vrelx + disty * vrely > 0.0
+
+        # hor_los:
+        # Aircraft should continue to resolve until there is no horizontal
+        # LOS. This is particularly relevant when vertical resolutions
+        # are used.
+        hdist = np.sqrt(distx * distx + disty * disty)
+        hor_los = hdist < self.R
+
+        # Bouncing conflicts:
+        # If two aircraft are getting in and out of conflict continously,
+        # then they it is a bouncing conflict. ASAS should stay active until
+        # the bouncing stops.
+        is_bouncing = (np.abs(bs.traf.trk[idx1] - bs.traf.trk[idx2]) < 30.0) * \
+            (hdist < self.Rm)
+
+        # Keep ASAS active for ownship if intruder still exists, and not past CPA,
+        # or in horizontal LOS or a bouncing conflict. Otherwise remove the
+        # conflict from the resolution pairs.
+        keep = hasintruder * (~past_cpa + hor_los + is_bouncing)
+
+        # Switch ASAS off for ownships that are not involved in any other
+        # conflict. This avoids that ASAS resolution is turned off for an
+        # aircraft that is involved simultaneously in multiple conflicts,
+        # where the first, but not all conflicts are resolved.
+        newactive = np.zeros(bs.traf.ntraf, dtype=bool)
+        newactive[idx1[keep]] = True
+        wasactive = self.active[idx1]
+        self.active[idx1] = newactive[idx1]
+
+        # Waypoint recovery after conflict, only for aircraft that switched
+        # off ASAS: Find the next active waypoint and send the aircraft to
+        # that waypoint.
+        for idx in np.unique(idx1[wasactive * ~newactive[idx1]]):
+            iwpid = bs.traf.ap.route[idx].findact(idx)
+            if iwpid != -1:  # To avoid problems if there are no waypoints
+                bs.traf.ap.route[idx].direct(idx, bs.traf.ap.route[idx].wpname[iwpid])
 
         # Remove pairs from the list that are past CPA or have deleted aircraft
-        self.resopairs -= delpairs
+        self.resoidx1 = self.resoidx1[keep]
+        self.resoidx2 = self.resoidx2[keep]
 
     @timed_function('asas', dt=settings.asas_dt)
     def update(self, dt):
@@ -496,7 +543,8 @@ class ASAS(TrafficArrays):
             self.cr.resolve(self, bs.traf)
 
         # Add new conflicts to resopairs and confpairs_all and new losses to lospairs_all
-        self.resopairs.update(self.confpairs)
+        if self.confpairs:
+            self.addresopairs(self.confpairs)
 
         # confpairs has conflicts observed from both sides (a, b) and (b, a)
         # confpairs_unique keeps only one of these
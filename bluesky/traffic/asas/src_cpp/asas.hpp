@@ -5,67 +5,91 @@
 #include <cmath>
 #include <algorithm>
 
+// Radius of the sphere used for the coarse range check. Chord lengths on a
+// sphere with the WGS-84 minor semi-axis as radius are never larger than
+// the WGS-84 great-circle distances calculated by dist()
+static const double bwgs84 = 6356752.314245;
+
+// Per-aircraft state used in conflict detection
+struct acstate {
+    qdr_d_in ll;
+    double x, y, z, u, v, alt, vs;
+    void init(const double& lat, const double& lon, const double& trk,
+              const double& gs, const double& alt, const double& vs) {
+        ll.init(lat, lon);
+        x = bwgs84 * ll.coslat * cos(lon);
+        y = bwgs84 * ll.coslat * sin(lon);
+        z = bwgs84 * ll.sinlat;
+        u = gs * sin(trk);
+        v = gs * cos(trk);
+        this->alt = alt;
+        this->vs = vs;
+    }
+};
+
 struct conflict {
     double tin, tout, dcpa, tcpa, q, d; bool LOS;
     conflict() : tin(0.0), tout(0.0), dcpa(0.0), tcpa(0.0), q(0.0), d(0.0), LOS(false) {}
 };
-inline bool detect_hor(conflict& conf, const double& RPZ, const double& tlookahead,
-                       const qdr_d_in& ll1, const double& gs1, const double& trk1,
-                       const qdr_d_in& ll2, const double& gs2, const double& trk2)
-{
-    double u1        = gs1 * sin(trk1),
-           v1        = gs1 * cos(trk1),
-           u2        = gs2 * sin(trk2),
-           v2        = gs2 * cos(trk2);
-    double du        = u1 - u2,
-           dv        = v1 - v2;
-
-   // First a coarse flat-earth check to skip the most unlikely candidates for a conflict
-   if (std::max((fabs(ll2.lon - ll1.lon) * std::min(ll1.coslat, ll2.coslat) * re - RPZ) / fabs(du),
-                 (fabs(ll2.lat - ll1.lat) * re - RPZ) / fabs(dv))
-        > 1.05 * tlookahead)
-     return false;
 
-    conf.d = dist(ll1, ll2),
-    conf.q = qdr(ll1, ll2);
-    double dx        = conf.d * sin(conf.q),
-           dy        = conf.d * cos(conf.q);
+// State-based conflict detection for one pair of aircraft. The calculation
+// is the same as the python implementation in StateBasedCD.py, but pairs that
+// can't reach each other's protected zone within the lookahead time are
+// rejected early, on altitude band first and on horizontal range second.
+// Returns true if the pair needs to be reported (as conflict and/or LoS).
+inline bool detect_pair(conflict& conf, bool& inconf,
+                        const double& RPZ, const double& HPZ, const double& tlookahead,
+                        const acstate& own, const acstate& intr)
+{
+    // Vertical: early rejection when the altitude band can't be reached
+    double dalt = intr.alt - own.alt,
+           dvs  = intr.vs - own.vs;
+    if (fabs(dvs) < 1e-6) dvs = 1e-6;  // prevent division by zero
+    if (fabs(dalt) - HPZ > fabs(dvs) * tlookahead + 1.0)
+        return false;
 
+    // Horizontal: early rejection when out of range, using the chord distance
+    double du  = intr.u - own.u,
+           dv  = intr.v - own.v;
+    double dv2 = du * du + dv * dv;
+    if (fabs(dv2) < 1e-6) dv2 = 1e-6;  // limit lower absolute value
+    double vrel = sqrt(dv2);
+    double cx = intr.x - own.x,
+           cy = intr.y - own.y,
+           cz = intr.z - own.z;
+    double rmax = RPZ + vrel * tlookahead + 1.0;
+    if (cx * cx + cy * cy + cz * cz > rmax * rmax)
+        return false;
 
-    double vreldotdx = du * dx + dv * dy;
-    conf.LOS         = conf.d < RPZ;
+    // Horizontal closest point of approach (CPA)
+    conf.d = dist(own.ll, intr.ll);
+    conf.q = qdr(own.ll, intr.ll);
+    double dx = conf.d * sin(conf.q),  // is pos j rel to i
+           dy = conf.d * cos(conf.q);  // is pos j rel to i
 
-    // If diverging and separated, no horizontal conflict
-    if (vreldotdx < 0.0 && !conf.LOS) return false;
+    conf.tcpa = -(du * dx + dv * dy) / dv2;
+    double dcpa2 = fabs(conf.d * conf.d - conf.tcpa * conf.tcpa * dv2);
+    conf.dcpa = sqrt(dcpa2);
 
-    double vrel2     = (du * du + dv * dv);
-    conf.tcpa = vreldotdx / vrel2;
+    // Times of entering and leaving horizontal conflict
+    double R2 = RPZ * RPZ;
+    bool swhorconf = dcpa2 < R2;
+    double dtinhor = sqrt(std::max(0.0, R2 - dcpa2)) / vrel;
+    double tinhor  = swhorconf ? conf.tcpa - dtinhor : 1e8,
+           touthor = swhorconf ? conf.tcpa + dtinhor : -1e8;
 
-    double CPA2  = conf.d * conf.d - vreldotdx * conf.tcpa;
-    conf.dcpa = sqrt(CPA2);
-    double dt    = sqrt(std::max(RPZ * RPZ - CPA2, 0.0) / vrel2);
-    conf.tin     = conf.tcpa - dt;
-    conf.tout    = conf.tcpa + dt;
-    // Conflict is in detection range?
-    return (conf.LOS || conf.tin <= tlookahead);
-}
+    // Vertical crossing of disk (-dh,+dh)
+    double tcrosshi = (dalt + HPZ) / -dvs,
+           tcrosslo = (dalt - HPZ) / -dvs;
+    double tinver   = std::min(tcrosshi, tcrosslo),
+           toutver  = std::max(tcrosshi, tcrosslo);
 
-inline bool detect_ver(conflict& conf, const double& HPZ, const double& tlookahead,
-                       const double& dalt, const double& dvs)
-{
-    conf.LOS = fabs(dalt) < HPZ;
-    if (fabs(dvs) > 1e-6) {
-        double tcrosshi = (dalt + HPZ) / -dvs,
-               tcrosslo = (dalt - HPZ) / -dvs;
+    // Combine vertical and horizontal conflict
+    conf.tin  = std::max(tinver, tinhor);
+    conf.tout = std::min(toutver, touthor);
+    inconf    = swhorconf && conf.tin <= conf.tout && conf.tout > 0.0 &&
+                conf.tin < tlookahead;
+    conf.LOS  = conf.d < RPZ && fabs(dalt) < HPZ;
 
-        conf.tin  = std::max(0.0, std::min(tcrosslo, tcrosshi));
-        conf.tout = std::max(tcrosslo, tcrosshi);
-
-        // Vertical conflict if t_in is within lookahead horizon, and t_out > 0
-        return (conf.tin <= tlookahead && conf.tout > 0.0);
-    } else {
-        conf.tin  = 0.0;
-        conf.tout = 1e4;
-        return conf.LOS;
-    }
+    return inconf || conf.LOS;
 }
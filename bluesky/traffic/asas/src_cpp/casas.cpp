@@ -9,6 +9,16 @@
 #define FT2M 0.3048
 #define FPM2MS 0.00508
 
+// Convert a vector of doubles to a new one-dimensional numpy array
+static PyObject* vec2array(const std::vector<double>& vec)
+{
+    npy_intp size = vec.size();
+    PyObject* arr = PyArray_SimpleNew(1, &size, NPY_DOUBLE);
+    if (arr != NULL && size > 0)
+        std::copy(vec.begin(), vec.end(), (double*)PyArray_DATA((PyArrayObject*)arr));
+    return arr;
+}
+
 static PyObject* casas_detect(PyObject* self, PyObject* args)
 {
     PyObject *ownship = NULL,
@@ -28,81 +38,65 @@ static PyObject* casas_detect(PyObject* self, PyObject* args)
     // Only continue if all arrays exist
     if (lat1 && lon1 && trk1 && gs1  && alt1 && vs1  && lat2 && lon2 && trk2 && gs2  && alt2 && vs2)
     {
-        // Assume all arrays are the same size; only get the size of lat1
-        npy_intp  size  = lat1.size();
+        npy_intp size1 = lat1.size(),
+                 size2 = lat2.size();
 
-        // Loop over all combinations of aircraft to detect conflicts
-        conflict confhor, confver;
-        double tin, tout;
-        double dalt, dvs;
-        qdr_d_in ll1;
-        std::vector<qdr_d_in> ll2(size);
-        std::vector<qdr_d_in>::iterator pll2 = ll2.begin();
-        npy_bool acinconf = NPY_FALSE;
-        double tcpamax_ac = 0.0;
+        // Pre-calculate ownship and intruder data
+        std::vector<acstate> own(size1), intr(size2);
+        for (npy_intp i = 0; i < size1; ++i) {
+            own[i].init(lat1.ptr[i] * DEG2RAD, lon1.ptr[i] * DEG2RAD, trk1.ptr[i] * DEG2RAD,
+                        gs1.ptr[i], alt1.ptr[i], vs1.ptr[i]);
+        }
+        for (npy_intp j = 0; j < size2; ++j) {
+            intr[j].init(lat2.ptr[j] * DEG2RAD, lon2.ptr[j] * DEG2RAD, trk2.ptr[j] * DEG2RAD,
+                         gs2.ptr[j], alt2.ptr[j], vs2.ptr[j]);
+        }
 
         // Return values
-        PyDoubleArrayAttr tcpamax(size);
-        PyBoolArrayAttr inconf(size);
-        PyListAttr confpairs, lospairs, qdr, dist, dcpa, tcpa, tinconf;
+        PyDoubleArrayAttr tcpamax(size1);
+        PyBoolArrayAttr inconf(size1);
+        PyListAttr confpairs, lospairs;
+        std::vector<double> qdr, dist, dcpa, tcpa, tinconf;
 
-        // Pre-calculate intruder data
-        for (unsigned int i = 0; i < size; ++i) {
-            pll2->init(*lat2.ptr * DEG2RAD, *lon2.ptr * DEG2RAD);
-            lat2.ptr++; lon2.ptr++; pll2++;
-        }
+        // Loop over all combinations of aircraft to detect conflicts
+        conflict conf;
+        bool swconf;
+        for (npy_intp i = 0; i < size1; ++i) {
+            npy_bool acinconf = NPY_FALSE;
+            double tcpamax_ac = 0.0;
+            for (npy_intp j = 0; j < size2; ++j) {
+                if (i == j || !detect_pair(conf, swconf, RPZ, HPZ, tlookahead, own[i], intr[j]))
+                    continue;
 
-        for (unsigned int i = 0; i < size; ++i) {
-            ll1.init(*lat1.ptr * DEG2RAD, *lon1.ptr * DEG2RAD);
-            pll2 = ll2.begin();
-            acinconf = NPY_FALSE;
-            for (unsigned int j = 0; j < size; ++j) {
-                if (i != j) {
-                    // Vectical detection first
-                    dalt = *alt1.ptr - *alt2.ptr;
-                    dvs  = *vs1.ptr  - *vs2.ptr;
-                    if (detect_ver(confver, HPZ, tlookahead, dalt, dvs)) {
-                        // Horizontal detection
-                        if (detect_hor(confhor, RPZ, tlookahead,
-                                       ll1,   *gs1.ptr, *trk1.ptr * DEG2RAD,
-                                       *pll2, *gs2.ptr, *trk2.ptr * DEG2RAD)) {
-                            tin  = std::max(confhor.tin, confver.tin);
-                            tout = std::min(confhor.tout, confver.tout);
-                            // Combined conflict?
-                            if (tin <= tlookahead && tin < tout && tout > 0.0) {
-                                // Add AC id to conflict list
-                                PyObject* pair = PyTuple_Pack(2, acid[i], acid[j]);
-                                confpairs.append(pair);
-                                tcpamax_ac = std::max(confhor.tcpa, tcpamax_ac);
-                                acinconf = NPY_TRUE; // This aircraft is in conflict
-                                if (confver.LOS && confhor.LOS) {
-                                    // Add to lospairs if this is also a LoS
-                                    lospairs.append(pair);
-                                }
-                                Py_DECREF(pair);
-                                qdr.append(confhor.q * RAD2DEG);
-                                dist.append(confhor.d);
-                                dcpa.append(confhor.dcpa);
-                                tcpa.append(confhor.tcpa);
-                                tinconf.append(tin);
-                            }
-                        }
-                    }
+                PyObject* pair = PyTuple_Pack(2, acid[i], acid[j]);
+                if (swconf) {
+                    // Add AC id to conflict list
+                    confpairs.append(pair);
+                    tcpamax_ac = std::max(conf.tcpa, tcpamax_ac);
+                    acinconf = NPY_TRUE; // This aircraft is in conflict
+                    qdr.push_back(conf.q * RAD2DEG);
+                    dist.push_back(conf.d);
+                    dcpa.push_back(conf.dcpa);
+                    tcpa.push_back(conf.tcpa);
+                    tinconf.push_back(conf.tin);
+                }
+                if (conf.LOS) {
+                    // Add to lospairs if this is a LoS
+                    lospairs.append(pair);
                 }
-                pll2++; trk2.ptr++; gs2.ptr++; alt2.ptr++; vs2.ptr++;
+                Py_DECREF(pair);
             }
-            *inconf.ptr = acinconf;
-            *tcpamax.ptr = tcpamax_ac;
-            inconf.ptr++;
-            tcpamax.ptr++;
-            acinconf = NPY_FALSE;
-            tcpamax_ac = 0.0;
-            trk2.ptr = trk2.ptr_start; gs2.ptr  = gs2.ptr_start;
-            alt2.ptr = alt2.ptr_start; vs2.ptr  = vs2.ptr_start;
-            lat1.ptr++; lon1.ptr++; trk1.ptr++; gs1.ptr++; alt1.ptr++; vs1.ptr++;
+            inconf.ptr[i] = acinconf;
+            tcpamax.ptr[i] = tcpamax_ac;
         }
 
-        return PyTuple_Pack(9, confpairs.attr, lospairs.attr, inconf.arr, tcpamax.arr, qdr.attr, dist.attr, dcpa.attr, tcpa.attr, tinconf.attr);
+        PyObject *aqdr = vec2array(qdr), *adist = vec2array(dist), *adcpa = vec2array(dcpa),
+                 *atcpa = vec2array(tcpa), *atinconf = vec2array(tinconf);
+        PyObject* result = PyTuple_Pack(9, confpairs.attr, lospairs.attr, inconf.arr,
+                                        tcpamax.arr, aqdr, adist, adcpa, atcpa, atinconf);
+        Py_XDECREF(aqdr); Py_XDECREF(adist); Py_XDECREF(adcpa);
+        Py_XDECREF(atcpa); Py_XDECREF(atinconf);
+        return result;
     }
 
     Py_RETURN_NONE;
@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
+# Build the compiled conflict detection with:
+#   python setup.py build_ext --inplace
+# and copy the resulting casas module to bluesky/traffic/asas
 
 from distutils.core import setup, Extension
 import numpy as np
 
 ext_modules = [Extension('casas', sources=['casas.cpp'])]
 
-setup(name='casas', version='1.0', include_dirs=[np.get_include(), '../../../windtools/src_cpp'],
+setup(name='casas', version='1.0', include_dirs=[np.get_include(), '../../../tools/src_cpp'],
       ext_modules=ext_modules)
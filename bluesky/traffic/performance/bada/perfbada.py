@@ -168,103 +168,112 @@ class PerfBADA(TrafficArrays):
         # note: coefficients are initialized in SI units
 
         # general
-        # designate aircraft to its aircraft type
+        # designate aircraft to its aircraft type, and group the new
+        # aircraft per set of coefficients
+        groups = dict()
         for i, actype in enumerate(actypes):
             syn, coeff = coeff_bada.getCoefficients(actype)
-            if syn:
-                continue
-            syn, coeff = coeff_bada.getCoefficients('B744')
-            bs.traf.type[-n + i] = syn.accode
-
-            if not settings.verbose:
-                if not self.warned:
-                    print("Aircraft is using default B747-400 performance.")
-                    self.warned = True
-            else:
-                print("Flight " + bs.traf.id[-n:] + " has an unknown aircraft type, " + actype + ", BlueSky then uses default B747-400 performance.")
+            if not syn:
+                syn, coeff = coeff_bada.getCoefficients('B744')
+                bs.traf.type[-n + i] = syn.accode
 
+                if not settings.verbose:
+                    if not self.warned:
+                        print("Aircraft is using default B747-400 performance.")
+                        self.warned = True
+                else:
+                    print("Flight " + bs.traf.id[-n + i] + " has an unknown aircraft type, " + actype + ", BlueSky then uses default B747-400 performance.")
+
+            groups.setdefault(id(coeff), (coeff, []))[1].append(len(self.mass) - n + i)
+
+        for coeff, sel in groups.values():
+            self.createtype(sel, coeff)
+
+    def createtype(self, sel, coeff):
+        ''' Initialize the performance coefficients of new aircraft sel, which
+            all use BADA coefficients coeff. '''
         # designate aicraft to its aircraft type
-        self.jet[-n:]       = 1 if coeff.engtype == 'Jet' else 0
-        self.turbo[-n:]     = 1 if coeff.engtype == 'Turboprop' else 0
-        self.piston[-n:]    = 1 if coeff.engtype == 'Piston' else 0
+        self.jet[sel]       = 1 if coeff.engtype == 'Jet' else 0
+        self.turbo[sel]     = 1 if coeff.engtype == 'Turboprop' else 0
+        self.piston[sel]    = 1 if coeff.engtype == 'Piston' else 0
 
         # Initial aircraft mass is currently reference mass.
         # BADA 3.12 also supports masses between 1.2*mmin and mmax
-        self.mass[-n:]      = coeff.m_ref * 1000.0
-        self.mmin[-n:]      = coeff.m_min * 1000.0
-        self.mmax[-n:]      = coeff.m_max * 1000.0
+        self.mass[sel]      = coeff.m_ref * 1000.0
+        self.mmin[sel]      = coeff.m_min * 1000.0
+        self.mmax[sel]      = coeff.m_max * 1000.0
 
         # self.mpyld = np.append(self.mpyld, coeff.mpyld[coeffidx]*1000)
-        self.gw[-n:]        = coeff.mass_grad * ft
+        self.gw[sel]        = coeff.mass_grad * ft
 
         # Surface Area [m^2]
-        self.Sref[-n:]      = coeff.S
+        self.Sref[sel]      = coeff.S
 
         # flight envelope
         # minimum speeds per phase
-        self.vmto[-n:]      = coeff.Vstall_to * coeff.CVmin_to * kts
-        self.vmic[-n:]      = coeff.Vstall_ic * coeff.CVmin * kts
-        self.vmcr[-n:]      = coeff.Vstall_cr * coeff.CVmin * kts
-        self.vmap[-n:]      = coeff.Vstall_ap * coeff.CVmin * kts
-        self.vmld[-n:]      = coeff.Vstall_ld * coeff.CVmin * kts
-        self.vmin[-n:]      = 0.0
-        self.vmo[-n:]       = coeff.VMO * kts
-        self.mmo[-n:]       = coeff.MMO
+        self.vmto[sel]      = coeff.Vstall_to * coeff.CVmin_to * kts
+        self.vmic[sel]      = coeff.Vstall_ic * coeff.CVmin * kts
+        self.vmcr[sel]      = coeff.Vstall_cr * coeff.CVmin * kts
+        self.vmap[sel]      = coeff.Vstall_ap * coeff.CVmin * kts
+        self.vmld[sel]      = coeff.Vstall_ld * coeff.CVmin * kts
+        self.vmin[sel]      = 0.0
+        self.vmo[sel]       = coeff.VMO * kts
+        self.mmo[sel]       = coeff.MMO
 
         # max. altitude parameters
-        self.hmo[-n:]       = coeff.h_MO * ft
-        self.hmax[-n:]      = coeff.h_max * ft
-        self.hmaxact[-n:]   = coeff.h_max * ft  # initialize with hmax
-        self.gt[-n:]        = coeff.temp_grad * ft
+        self.hmo[sel]       = coeff.h_MO * ft
+        self.hmax[sel]      = coeff.h_max * ft
+        self.hmaxact[sel]   = coeff.h_max * ft  # initialize with hmax
+        self.gt[sel]        = coeff.temp_grad * ft
 
         # max thrust setting
-        self.maxthr[-n:]    = 1e6  # initialize with excessive setting to avoid unrealistic limit setting
+        self.maxthr[sel]    = 1e6  # initialize with excessive setting to avoid unrealistic limit setting
 
         # Buffet Coefficients
-        self.clbo[-n:]      = coeff.Clbo
-        self.k[-n:]         = coeff.k
-        self.cm16[-n:]      = coeff.CM16
+        self.clbo[sel]      = coeff.Clbo
+        self.k[sel]         = coeff.k
+        self.cm16[sel]      = coeff.CM16
 
         # reference speeds
         # reference CAS speeds
-        self.cascl[-n:]     = coeff.CAScl1[0] * kts
-        self.cascr[-n:]     = coeff.CAScr1[0] * kts
-        self.casdes[-n:]    = coeff.CASdes1[0] * kts
+        self.cascl[sel]     = coeff.CAScl1[0] * kts
+        self.cascr[sel]     = coeff.CAScr1[0] * kts
+        self.casdes[sel]    = coeff.CASdes1[0] * kts
 
         # reference mach numbers
-        self.macl[-n:]      = coeff.Mcl[0]
-        self.macr[-n:]      = coeff.Mcr[0]
-        self.mades[-n:]     = coeff.Mdes[0]
+        self.macl[sel]      = coeff.Mcl[0]
+        self.macr[sel]      = coeff.Mcr[0]
+        self.mades[sel]     = coeff.Mdes[0]
 
         # reference speed during descent
-        self.vdes[-n:]      = coeff.Vdes_ref * kts
-        self.mdes[-n:]      = coeff.Mdes_ref
+        self.vdes[sel]      = coeff.Vdes_ref * kts
+        self.mdes[sel]      = coeff.Mdes_ref
 
         # aerodynamics
         # parasitic drag coefficients per phase
-        self.cd0to[-n:]     = coeff.CD0_to
-        self.cd0ic[-n:]     = coeff.CD0_ic
-        self.cd0cr[-n:]     = coeff.CD0_cr
-        self.cd0ap[-n:]     = coeff.CD0_ap
-        self.cd0ld[-n:]     = coeff.CD0_ld
-        self.gear[-n:]      = coeff.CD0_gear
+        self.cd0to[sel]     = coeff.CD0_to
+        self.cd0ic[sel]     = coeff.CD0_ic
+        self.cd0cr[sel]     = coeff.CD0_cr
+        self.cd0ap[sel]     = coeff.CD0_ap
+        self.cd0ld[sel]     = coeff.CD0_ld
+        self.gear[sel]      = coeff.CD0_gear
 
         # induced drag coefficients per phase
-        self.cd2to[-n:]     = coeff.CD2_to
-        self.cd2ic[-n:]     = coeff.CD2_ic
-        self.cd2cr[-n:]     = coeff.CD2_cr
-        self.cd2ap[-n:]     = coeff.CD2_ap
-        self.cd2ld[-n:]     = coeff.CD2_ld
+        self.cd2to[sel]     = coeff.CD2_to
+        self.cd2ic[sel]     = coeff.CD2_ic
+        self.cd2cr[sel]     = coeff.CD2_cr
+        self.cd2ap[sel]     = coeff.CD2_ap
+        self.cd2ld[sel]     = coeff.CD2_ld
 
         # reduced climb coefficient
-        self.cred[-n:] = np.where(
-            self.jet[-n:], coeff.Cred_jet,
-            np.where(self.turbo[-n:], coeff.Cred_turboprop, coeff.Cred_piston)
+        self.cred[sel] = np.where(
+            self.jet[sel], coeff.Cred_jet,
+            np.where(self.turbo[sel], coeff.Cred_turboprop, coeff.Cred_piston)
         )
 
         # commented due to vectrization
         # # NOTE: model only validated for jet and turbo aircraft
-        # if self.piston[-n:] and not self.warned2:
+        # if self.piston[sel] and not self.warned2:
         #     print "Using piston aircraft performance.",
         #     print "Not valid for real performance calculations."
         #     self.warned2 = True
@@ -272,50 +281,50 @@ class PerfBADA(TrafficArrays):
         # performance
 
         # max climb thrust coefficients
-        self.ctcth1[-n:]    = coeff.CTC[0]  # jet/piston [N], turboprop [ktN]
-        self.ctcth2[-n:]    = coeff.CTC[1]  # [ft]
-        self.ctcth3[-n:]    = coeff.CTC[2]  # jet [1/ft^2], turboprop [N], piston [ktN]
+        self.ctcth1[sel]    = coeff.CTC[0]  # jet/piston [N], turboprop [ktN]
+        self.ctcth2[sel]    = coeff.CTC[1]  # [ft]
+        self.ctcth3[sel]    = coeff.CTC[2]  # jet [1/ft^2], turboprop [N], piston [ktN]
 
         # 1st and 2nd thrust temp coefficient
-        self.ctct1[-n:]     = coeff.CTC[3]  # [k]
-        self.ctct2[-n:]     = coeff.CTC[4]  # [1/k]
-        self.dtemp[-n:]     = 0.0  # [k], difference from current to ISA temperature. At the moment: 0, as ISA environment
+        self.ctct1[sel]     = coeff.CTC[3]  # [k]
+        self.ctct2[sel]     = coeff.CTC[4]  # [1/k]
+        self.dtemp[sel]     = 0.0  # [k], difference from current to ISA temperature. At the moment: 0, as ISA environment
 
         # Descent Fuel Flow Coefficients
         # Note: Ctdes,app and Ctdes,lnd assume a 3 degree descent gradient during app and lnd
-        self.ctdesl[-n:]    = coeff.CTdes_low
-        self.ctdesh[-n:]    = coeff.CTdes_high
-        self.ctdesa[-n:]    = coeff.CTdes_app
-        self.ctdesld[-n:]   = coeff.CTdes_land
+        self.ctdesl[sel]    = coeff.CTdes_low
+        self.ctdesh[sel]    = coeff.CTdes_high
+        self.ctdesa[sel]    = coeff.CTdes_app
+        self.ctdesld[sel]   = coeff.CTdes_land
 
         # transition altitude for calculation of descent thrust
-        self.hpdes[-n:]     = coeff.Hp_des * ft
-        self.ESF[-n:]       = 1.0  # neutral initialisation
+        self.hpdes[sel]     = coeff.Hp_des * ft
+        self.ESF[sel]       = 1.0  # neutral initialisation
 
         # flight phase
-        self.phase[-n:]       = PHASE["None"]
-        self.post_flight[-n:] = False  # we assume prior
-        self.pf_flag[-n:]     = True
+        self.phase[sel]       = PHASE["None"]
+        self.post_flight[sel] = False  # we assume prior
+        self.pf_flag[sel]     = True
 
         # Thrust specific fuel consumption coefficients
         # prevent from division per zero in fuelflow calculation
-        self.cf1[-n:]       = coeff.Cf1
-        self.cf2[-n:]       = 1.0 if coeff.Cf2 < 1e-9 else coeff.Cf2
-        self.cf3[-n:]       = coeff.Cf3
-        self.cf4[-n:]       = 1.0 if coeff.Cf4 < 1e-9 else coeff.Cf4
-        self.cf_cruise[-n:] = coeff.Cf_cruise
+        self.cf1[sel]       = coeff.Cf1
+        self.cf2[sel]       = 1.0 if coeff.Cf2 < 1e-9 else coeff.Cf2
+        self.cf3[sel]       = coeff.Cf3
+        self.cf4[sel]       = 1.0 if coeff.Cf4 < 1e-9 else coeff.Cf4
+        self.cf_cruise[sel] = coeff.Cf_cruise
 
-        self.Thr[-n:]       = 0.0
-        self.D[-n:]         = 0.0
-        self.fuelflow[-n:]  = 0.0
+        self.Thr[sel]       = 0.0
+        self.D[sel]         = 0.0
+        self.fuelflow[sel]  = 0.0
 
         # ground
-        self.tol[-n:]       = coeff.TOL
-        self.ldl[-n:]       = coeff.LDL
-        self.ws[-n:]        = coeff.wingspan
-        self.len[-n:]       = coeff.length
+        self.tol[sel]       = coeff.TOL
+        self.ldl[sel]       = coeff.LDL
+        self.ws[sel]        = coeff.wingspan
+        self.len[sel]       = coeff.length
         # for now, BADA aircraft have the same acceleration as deceleration
-        self.gr_acc[-n:]    = coeff.gr_acc
+        self.gr_acc[sel]    = coeff.gr_acc
 
     @timed_function('performance', dt=settings.performance_dt)
     def update(self, dt=settings.performance_dt):
@@ -58,12 +58,17 @@ class OpenAP(PerfBase):
             self.vminto = np.array([])
 
     def create(self, n=1):
-        # cautious! considering multiple created aircraft with same type
-
         super(OpenAP, self).create(n)
 
-        actype = bs.traf.type[-1].upper()
+        # Look up the coefficients once per aircraft type in this batch
+        actypes = [actype.upper() for actype in bs.traf.type[-n:]]
+        for actype in set(actypes):
+            sel = [len(self.mass) - n + i for i, t in enumerate(actypes) if t == actype]
+            self.createtype(sel, actype)
 
+    def createtype(self, sel, actype):
+        ''' Initialize the performance coefficients of new aircraft sel, which
+            all have aircraft type actype. '''
         # Check synonym file if not in open ap actypes
         if (actype not in self.coeff.actypes_rotor) and \
            (actype not in self.coeff.dragpolar_fixwing):
@@ -73,10 +78,10 @@ class OpenAP(PerfBase):
 
         # check fixwing or rotor, default fixwing if not found
         if actype in self.coeff.actypes_rotor:
-            self.lifttype[-n:] = coeff.LIFT_ROTOR
-            self.mass[-n:] = 0.5 * (self.coeff.acs_rotor[actype]['oew'] + self.coeff.acs_rotor[actype]['mtow'])
-            self.engnum[-n:] = int(self.coeff.acs_rotor[actype]['n_engines'])
-            self.engpower[-n:] = self.coeff.acs_rotor[actype]['engines'][0][1]    # engine power (kW)
+            self.lifttype[sel] = coeff.LIFT_ROTOR
+            self.mass[sel] = 0.5 * (self.coeff.acs_rotor[actype]['oew'] + self.coeff.acs_rotor[actype]['mtow'])
+            self.engnum[sel] = int(self.coeff.acs_rotor[actype]['n_engines'])
+            self.engpower[sel] = self.coeff.acs_rotor[actype]['engines'][0][1]    # engine power (kW)
 
         else:
             # convert to known aircraft type
@@ -88,43 +93,43 @@ class OpenAP(PerfBase):
             e = es[list(es.keys())[0]]
             coeff_a, coeff_b, coeff_c = thrust.compute_eng_ff_coeff(e['ff_idl'], e['ff_app'], e['ff_co'], e['ff_to'])
 
-            self.lifttype[-n:] = coeff.LIFT_FIXWING
+            self.lifttype[sel] = coeff.LIFT_FIXWING
 
-            self.Sref[-n:] = self.coeff.acs_fixwing[actype]['wa']
-            self.mass[-n:] = 0.5 * (self.coeff.acs_fixwing[actype]['oew'] + self.coeff.acs_fixwing[actype]['mtow'])
+            self.Sref[sel] = self.coeff.acs_fixwing[actype]['wa']
+            self.mass[sel] = 0.5 * (self.coeff.acs_fixwing[actype]['oew'] + self.coeff.acs_fixwing[actype]['mtow'])
 
-            self.engnum[-n:] = int(self.coeff.acs_fixwing[actype]['n_engines'])
+            self.engnum[sel] = int(self.coeff.acs_fixwing[actype]['n_engines'])
 
-            self.ff_coeff_a[-n:] = coeff_a
-            self.ff_coeff_b[-n:] = coeff_b
-            self.ff_coeff_c[-n:] = coeff_c
+            self.ff_coeff_a[sel] = coeff_a
+            self.ff_coeff_b[sel] = coeff_b
+            self.ff_coeff_c[sel] = coeff_c
 
             all_ac_engs = list(self.coeff.acs_fixwing[actype]['engines'].keys())
-            self.engthrmax[-n:] = self.coeff.acs_fixwing[actype]['engines'][all_ac_engs[0]]['thr']
-            self.engbpr[-n:] = self.coeff.acs_fixwing[actype]['engines'][all_ac_engs[0]]['bpr']
+            self.engthrmax[sel] = self.coeff.acs_fixwing[actype]['engines'][all_ac_engs[0]]['thr']
+            self.engbpr[sel] = self.coeff.acs_fixwing[actype]['engines'][all_ac_engs[0]]['bpr']
 
             # init drag polar coefficients
             if actype in self.coeff.dragpolar_fixwing.keys():
-                self.cd0_clean[-n:] = self.coeff.dragpolar_fixwing[actype]['cd0_clean']
-                self.cd0_gd[-n:] = self.coeff.dragpolar_fixwing[actype]['cd0_gd']
-                self.cd0_to[-n:] = self.coeff.dragpolar_fixwing[actype]['cd0_to']
-                self.cd0_ic[-n:] = self.coeff.dragpolar_fixwing[actype]['cd0_ic']
-                self.cd0_ap[-n:] = self.coeff.dragpolar_fixwing[actype]['cd0_ap']
-                self.cd0_ld[-n:] = self.coeff.dragpolar_fixwing[actype]['cd0_ld']
-                self.k[-n:] = self.coeff.dragpolar_fixwing[actype]['k']
+                self.cd0_clean[sel] = self.coeff.dragpolar_fixwing[actype]['cd0_clean']
+                self.cd0_gd[sel] = self.coeff.dragpolar_fixwing[actype]['cd0_gd']
+                self.cd0_to[sel] = self.coeff.dragpolar_fixwing[actype]['cd0_to']
+                self.cd0_ic[sel] = self.coeff.dragpolar_fixwing[actype]['cd0_ic']
+                self.cd0_ap[sel] = self.coeff.dragpolar_fixwing[actype]['cd0_ap']
+                self.cd0_ld[sel] = self.coeff.dragpolar_fixwing[actype]['cd0_ld']
+                self.k[sel] = self.coeff.dragpolar_fixwing[actype]['k']
             else:
                 # rotorcraft
-                self.cd0_clean[-n:] = self.coeff.dragpolar_fixwing['NA']['cd0_clean']
-                self.cd0_gd[-n:] = self.coeff.dragpolar_fixwing['NA']['cd0_gd']
-                self.cd0_to[-n:] = self.coeff.dragpolar_fixwing['NA']['cd0_to']
-                self.cd0_ic[-n:] = self.coeff.dragpolar_fixwing['NA']['cd0_ic']
-                self.cd0_ap[-n:] = self.coeff.dragpolar_fixwing['NA']['cd0_ap']
-                self.cd0_ld[-n:] = self.coeff.dragpolar_fixwing['NA']['cd0_ld']
-                self.k[-n:] = self.coeff.dragpolar_fixwing['NA']['k']
+                self.cd0_clean[sel] = self.coeff.dragpolar_fixwing['NA']['cd0_clean']
+                self.cd0_gd[sel] = self.coeff.dragpolar_fixwing['NA']['cd0_gd']
+                self.cd0_to[sel] = self.coeff.dragpolar_fixwing['NA']['cd0_to']
+                self.cd0_ic[sel] = self.coeff.dragpolar_fixwing['NA']['cd0_ic']
+                self.cd0_ap[sel] = self.coeff.dragpolar_fixwing['NA']['cd0_ap']
+                self.cd0_ld[sel] = self.coeff.dragpolar_fixwing['NA']['cd0_ld']
+                self.k[sel] = self.coeff.dragpolar_fixwing['NA']['k']
 
 
         # append update actypes, after removing unkown types
-        self.actypes[-n:] = [actype] * n
+        self.actypes[sel] = [actype] * len(sel)
 
     @timed_function('performance', dt=bs.settings.performance_dt)
     def update(self, dt=bs.settings.performance_dt):
@@ -75,6 +75,8 @@ class Traffic(TrafficArrays):
         TrafficArrays.SetRoot(self)
 
         self.ntraf = 0
+        self.idindex = dict()  # Index in the traffic arrays per aircraft id
+        self.generation = 0    # Counter of changes in the set of aircraft
 
         self.cond = Condition()  # Conditional commands list
         # Replaced windsim with windiris
@@ -166,6 +168,8 @@ class Traffic(TrafficArrays):
         # are all reset as well, so all lat,lon,sdp etc but also objects adsb
         super(Traffic, self).reset()
         self.ntraf = 0
+        self.idindex.clear()
+        self.generation += 1
 
         # reset performance model
         self.perf.reset()
@@ -184,7 +188,10 @@ class Traffic(TrafficArrays):
 
     def create(self, n=1, actype="B744", acalt=None, acspd=None, dest=None,
                 aclat=None, aclon=None, achdg=None, acid=None):
-        """ Create multiple random aircraft in a specified area """
+        """ Create multiple random aircraft in a specified area.
+
+            All aircraft data can also be passed as lists/arrays of length n,
+            to create a batch of aircraft with one allocation per array. """
         area = bs.scr.getviewbounds()
         if acid is None:
             idtmp = chr(randint(65, 90)) + chr(randint(65, 90)) + '{:>05}'
@@ -192,12 +199,17 @@ class Traffic(TrafficArrays):
 
         elif isinstance(acid, str):
             # Check if not already exist
-            if self.id.count(acid.upper()) > 0:
+            if acid.upper() in self.idindex:
                 return False, acid + " already exists."  # already exists do nothing
             acid = [acid]
         else:
-            # TODO: for a list of a/c, check each callsign
-            pass
+            # For a list of a/c, check each callsign
+            acid = list(acid)
+            existing = set(a for a in acid if a in self.idindex)
+            if existing:
+                return False, ", ".join(sorted(existing)) + " already exist(s)."
+            if len(set(acid)) < len(acid):
+                return False, "Duplicate callsigns in list of aircraft."
 
         super(Traffic, self).create(n)
 
@@ -208,11 +220,15 @@ class Traffic(TrafficArrays):
             aclat = np.random.rand(n) * (area[1] - area[0]) + area[0]
         elif isinstance(aclat, (float, int)):
             aclat = np.array(n * [aclat])
+        else:
+            aclat = np.asarray(aclat, dtype=float)
 
         if aclon is None:
             aclon = np.random.rand(n) * (area[3] - area[2]) + area[2]
         elif isinstance(aclon, (float, int)):
             aclon = np.array(n * [aclon])
+        else:
+            aclon = np.array(aclon, dtype=float)
 
         # Limit longitude to [-180.0, 180.0]
         if n == 1:
@@ -226,16 +242,22 @@ class Traffic(TrafficArrays):
             achdg = np.random.randint(1, 360, n)
         elif isinstance(achdg, (float, int)):
             achdg = np.array(n * [achdg])
+        else:
+            achdg = np.asarray(achdg, dtype=float)
 
         if acalt is None:
             acalt = np.random.randint(2000, 39000, n) * ft
         elif isinstance(acalt, (float, int)):
             acalt = np.array(n * [acalt])
+        else:
+            acalt = np.asarray(acalt, dtype=float)
 
         if acspd is None:
             acspd = np.random.randint(250, 450, n) * kts
         elif isinstance(acspd,(float, int)):
             acspd = np.array(n * [acspd])
+        else:
+            acspd = np.asarray(acspd, dtype=float)
 
         actype = n * [actype] if isinstance(actype, str) else actype
         dest = n * [dest] if isinstance(dest, str) else dest
@@ -252,6 +274,8 @@ class Traffic(TrafficArrays):
 
         # Aircraft Info
         self.id[-n:]   = acid
+        self.idindex.update(zip(acid, range(self.ntraf - n, self.ntraf)))
+        self.generation += 1
         self.type[-n:] = actype
 
         # Positions
@@ -358,14 +382,28 @@ class Traffic(TrafficArrays):
 
     def delete(self, idx):
         """Delete an aircraft"""
-        # If this is a multiple delete, sort first for list delete
+        # If this is a multiple delete, make the indices positive, unique
+        # and sorted first for list delete
         # (which will use list in reverse order to avoid index confusion)
         if isinstance(idx, Collection):
-            idx = np.sort(idx)
+            if len(idx) == 0:
+                return True
+            idx = np.unique(np.asarray(idx) % self.ntraf)
+            delids = [self.id[i] for i in idx]
+            firstidx = idx[0]
+        else:
+            delids = [self.id[idx]]
+            firstidx = idx % self.ntraf
 
         # Call the actual delete function
         super(Traffic, self).delete(idx)
 
+        # Update the index of the deleted aircraft, and the aircraft after it
+        for acid in delids:
+            del self.idindex[acid]
+        self.idindex.update(zip(self.id[firstidx:], range(firstidx, len(self.id))))
+        self.generation += 1
+
         # Update conditions list
         self.cond.delac(idx)
 
@@ -476,18 +514,13 @@ class Traffic(TrafficArrays):
         if not isinstance(acid, str):
 
             # id2idx is called for multiple id's
-            # Fast way of finding indices of all ACID's in a given list
-            tmp = dict((v, i) for i, v in enumerate(self.id))
-            return [tmp.get(acidi, -1) for acidi in acid]
+            return [self.idindex.get(acidi, -1) for acidi in acid]
         else:
              # Catch last created id (* or # symbol)
             if acid in ('#', '*'):
                 return self.ntraf - 1
 
-            try:
-                return self.id.index(acid.upper())
-            except:
-                return -1
+            return self.idindex.get(acid.upper(), -1)
 
     def setNoise(self, noise=None):
         """Noise (turbulence, ADBS-transmission noise, ADSB-truncated effect)"""
@@ -664,7 +697,7 @@ class Traffic(TrafficArrays):
 
 
                     # How many others?
-                    nother = bs.navdb.wpid.count(wp)-len(iwps)
+                    nother = bs.navdb.wpindex.count(wp)-len(iwps)
                     if nother>0:
                         verb = ["is ","are "][min(1,max(0,nother-1))]
                         lines = lines +"\nThere "+verb + str(nother) +\
@@ -705,7 +738,7 @@ class Traffic(TrafficArrays):
         if key=="":
             return False,'AIRWAY needs waypoint or airway'
 
-        if bs.navdb.awid.count(key)>0:
+        if key in bs.navdb.awindex:
             return self.poscommand(key.upper())
         else:
             # Find connecting airway legs
@@ -4,13 +4,26 @@ Author: Remon van den Brandt
 Date: 11-12-2018
 """
 
-from netCDF4 import date2num
-from scipy import ndimage, interpolate
+import os
+import glob
+import time
+import hashlib
+from datetime import datetime
+from threading import Thread, Lock
 import numpy as np
 import iris
 from bluesky.tools.aero import vatmos, kts
+from bluesky import settings
 import bluesky as bs
 
+# Register settings defaults
+settings.set_variable_defaults(cache_path='data/cache', wind_sharedcache=False,
+                               wind_cachefiles=4)
+
+# Age [s] after which the lock file of a node writing the shared cache is
+# considered to be left behind by a node that died
+LOCK_TIMEOUT = 3600.0
+
 class WindIris:
     """
     WindIris class:
@@ -52,10 +65,24 @@ class WindIris:
         self.forecasts_time = []
         self.realisations = []
 
-        self.north_mean = []
-        self.east_mean = []
-        self.north = []
-        self.east = []
+        # Wind data is read per forecast time (slab) with readslab(t), and
+        # only the slabs around the current simulation time are kept
+        self.readslab = None
+        self.store = None
+        self.readlock = Lock()
+        self.slabs = dict()
+        self.means = dict()
+        self.prefetching = None
+        self.discarded = []
+
+        # Interpolation data: north and east wind of the two forecast times
+        # around the simulation time (window) stacked in one contiguous array,
+        # and the cached time index of the current simulation time
+        self.wind = np.zeros((1, 1, 1, 1, 2))
+        self.window = None
+        self.time_utc = None
+        self.time_i = 0.0
+        self.time_w = 0.0
 
         self.current_ensemble = None
         self.ensemble_loaded = False
@@ -63,7 +90,8 @@ class WindIris:
 
     def load_file(self, filename):
         """
-         Load netCDF file into memory.
+         Open netCDF file. The wind data is read from file per forecast time,
+         when it is needed in the simulation.
         :param filename: The location of the netCDF file to be loaded.
         :return:
         """
@@ -72,6 +100,8 @@ class WindIris:
         # load cubes, first the northward wind, then the eastward wind
         if self.filename != filename or self.filename is None:
 
+            # Prefetches still read from the old cubes
+            self.close()
             self.filename = filename
 
             self.cubes = iris.load(self.filename.lower(), ['northward_wind', 'eastward_wind'])
@@ -94,26 +124,19 @@ class WindIris:
 
             if self.cubes[0].coords('ensemble_member'):
 
-                # Save the ensemble members
+                # Save the ensemble members. The wind is only available
+                # once a member is selected with load_ensemble
                 self.realisations = self.cubes[0].coord('ensemble_member').points
-
-                # mean value of wind over all ensemble members (assumed to be included in the GS)
-                # ignore the warning that it generates because it just means there is a gap in the data
-                # This can happen with a bounded coordinate if the bounds don't "touch".
-                # For example if the bound values were (0 to 10), (10 to 20), and (25 to 35),
-                # then there is a gap between 20 and 25. But the post-collapse coordinate would
-                # just have bounds of (0, 35) which wouldn't capture the gap.
-
-                self.north_mean = self.cubes[0].collapsed('ensemble_member', iris.analysis.MEAN).data # [m/s]
-                self.east_mean = self.cubes[1].collapsed('ensemble_member', iris.analysis.MEAN).data  # [m/s]
+                self.set_source(None)
 
             else:
 
                 self.realisations = np.array([])
-                self.north = self.cubes[0].data # [m/s]
-                self.east = self.cubes[1].data  # [m/s]
+                self.set_source(self.__readcubes)
+                self.__share()
 
             self.current_ensemble = None
+            self.means = dict()
 
             txt = "WIND LOADED FROM {}".format(self.filename)
 
@@ -134,10 +157,9 @@ class WindIris:
 
             if self.current_ensemble is not ensemble:
 
-                self.north = self.cubes[0].extract(iris.Constraint(ensemble_member=ensemble)).data - \
-                             self.north_mean
-                self.east = self.cubes[1].extract(iris.Constraint(ensemble_member=ensemble)).data - \
-                            self.east_mean
+                member = np.flatnonzero(self.realisations == ensemble)[0]
+                self.set_source(lambda t: self.__readcubes(t, member))
+                self.__share(ensemble)
 
                 self.current_ensemble = ensemble
 
@@ -153,6 +175,212 @@ class WindIris:
             self.ensemble_loaded = False
             return False, "MEMBER NOT IN ENSEBLE"
 
+    def set_source(self, readslab):
+        """
+        Set the source of the windfield.
+        :param readslab: function readslab(t) that returns the north and east
+            component of the wind [m/s] at forecast time index t, both with
+            dimensions (pressure, latitude, longitude). None if there is no wind.
+        """
+        # Wait for the prefetches of the previous source that are still running
+        self.close()
+        self.readslab = readslab
+        self.store = None
+        self.slabs = dict()
+        self.prefetching = None
+        self.window = None
+        self.time_utc = None
+
+    def close(self):
+        """
+        Wait for the prefetches that are still running, also the discarded
+        ones, so no thread reads from the wind source after this.
+        """
+        if self.prefetching is not None:
+            self.discarded.append(self.prefetching[1])
+            self.prefetching = None
+        for thread in self.discarded:
+            thread.join()
+        self.discarded = []
+
+    def set_wind(self, north, east):
+        """
+        Set the windfield from the north and east component for all
+        forecast times, both with dimensions (time, pressure, latitude, longitude).
+        :param north: north component of the wind [m/s]
+        :param east: east component of the wind [m/s]
+        """
+        self.set_source(lambda t: (north[t], east[t]))
+
+    def __share(self, ensemble=None):
+        """
+        Use the wind of the current file (and ensemble member) from the shared
+        cache. The cache is a .npy file under settings.cache_path, which
+        contains the interpolation array of all forecast times. It is
+        memory-mapped, so all simulation nodes on a host share one copy of
+        the wind in memory. The first node that uses the wind writes the file,
+        while other nodes read the wind from file until the cache is complete.
+        Only the wind_cachefiles most recently used cache files are kept.
+        """
+        if not settings.wind_sharedcache:
+            return
+        stat = os.stat(self.filename)
+        key = '{} {} {} {}'.format(os.path.abspath(self.filename), stat.st_size,
+                                   stat.st_mtime, ensemble)
+        fname = os.path.join(settings.cache_path,
+                             'wind_' + hashlib.md5(key.encode()).hexdigest() + '.npy')
+        try:
+            if os.path.isfile(fname):
+                # Mark the cache file as recently used
+                os.utime(fname)
+            elif not self.__writecache(fname):
+                return
+            self.store = np.load(fname, mmap_mode='r')
+        except OSError as e:
+            print("Wind cache not available, reading wind from file: {}".format(e))
+
+    def __writecache(self, fname):
+        """
+        Write the shared cache file fname, unless another node is already
+        writing it. Returns True when the cache file is written.
+        """
+        os.makedirs(settings.cache_path, exist_ok=True)
+        lockname = fname + '.lock'
+        try:
+            os.close(os.open(lockname, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            if time.time() - os.path.getmtime(lockname) > LOCK_TIMEOUT:
+                os.remove(lockname)
+            return False
+
+        # Write to a temporary file first, so other nodes never see
+        # an incomplete cache file
+        tmpname = '{}.{}.tmp'.format(fname, os.getpid())
+        try:
+            print("Writing cache: " + fname)
+            slabs = dict()
+            self.__readslab(slabs, 0)
+            store = np.lib.format.open_memmap(tmpname, mode='w+', dtype=slabs[0].dtype,
+                shape=(len(self.forecasts_time),) + slabs[0].shape)
+            store[0] = slabs.pop(0)
+            for t in range(1, len(store)):
+                self.__readslab(slabs, t)
+                store[t] = slabs.pop(t)
+                self.means.pop(t - 1, None)
+            store.flush()
+            del store
+            os.replace(tmpname, fname)
+        finally:
+            if os.path.isfile(tmpname):
+                os.remove(tmpname)
+            os.remove(lockname)
+
+        # Remove the least recently used cache files. Nodes that still use
+        # a removed file keep their memory map of it.
+        cached = sorted(glob.glob(os.path.join(settings.cache_path, 'wind_*.npy')),
+                        key=os.path.getmtime, reverse=True)
+        for oldname in cached[max(1, settings.wind_cachefiles):]:
+            if oldname != fname:
+                try:
+                    os.remove(oldname)
+                except OSError:
+                    pass
+        return True
+
+    def __readcubes(self, t, member=None):
+        """
+        Read the north and east wind at forecast time index t from the cubes.
+        For an ensemble, the wind of ensemble member (index) member relative
+        to the ensemble mean is returned.
+        """
+        north, east = [cubeslab(cube, t, member).data for cube in self.cubes[:2]]
+        if member is not None:
+            # mean value of wind over all ensemble members (assumed to be included in the GS)
+            # ignore the warning that it generates because it just means there is a gap in the data
+            # This can happen with a bounded coordinate if the bounds don't "touch".
+            # For example if the bound values were (0 to 10), (10 to 20), and (25 to 35),
+            # then there is a gap between 20 and 25. But the post-collapse coordinate would
+            # just have bounds of (0, 35) which wouldn't capture the gap.
+            if t not in self.means:
+                self.means[t] = [cubeslab(cube, t).collapsed('ensemble_member', iris.analysis.MEAN).data
+                                 for cube in self.cubes[:2]]
+            north = north - self.means[t][0]
+            east = east - self.means[t][1]
+        return north, east
+
+    def __readslab(self, slabs, t):
+        """
+        Read the wind at forecast time index t into slabs, with both
+        components stacked, and the first longitude repeated at the end,
+        so the grid points around each position are always at the same
+        offsets in the interpolation array.
+        """
+        with self.readlock:
+            north, east = self.readslab(t)
+        wind = np.stack((np.asarray(north), np.asarray(east)), axis=-1)
+        slabs[t] = np.concatenate((wind, wind[:, :, :1]), axis=2)
+
+    def __slab(self, t):
+        """
+        Wind slab at forecast time index t, waiting for the prefetch or
+        reading it when it is not in the cache yet.
+        """
+        if self.prefetching is not None and self.prefetching[0] == t:
+            self.prefetching[1].join()
+            self.slabs.update(self.prefetching[2])
+            self.prefetching = None
+        if t not in self.slabs:
+            self.__readslab(self.slabs, t)
+        return self.slabs[t]
+
+    def __prefetch(self, t):
+        """
+        Read the slab at forecast time index t in a background thread. The
+        slab is only added to the kept slabs when it is needed (see __slab),
+        so a prefetch that is discarded never adds a stale slab.
+        """
+        if t >= len(self.forecasts_time) or t in self.slabs or self.prefetching is not None:
+            return
+        result = dict()
+        thread = Thread(target=self.__readslab, args=(result, t), daemon=True)
+        thread.start()
+        self.prefetching = (t, thread, result)
+
+    def __set_window(self, it):
+        """
+        Make the interpolation array of the forecast times it and it + 1,
+        and prefetch the next forecast time when the wind is read from file.
+        """
+        self.window = it
+        if self.store is not None:
+            # The window of the shared cache is a view of the memory-mapped file
+            self.wind = self.store[it:it + 2]
+        else:
+            # A prefetch that is not around the new window (after a jump in
+            # time, or a reset) is discarded
+            # (its thread is joined in close)
+            if self.prefetching is not None and not it <= self.prefetching[0] <= it + 2:
+                self.discarded = [thread for thread in self.discarded if thread.is_alive()]
+                self.discarded.append(self.prefetching[1])
+                self.prefetching = None
+            times = range(it, min(it + 2, len(self.forecasts_time)))
+            self.wind = np.ascontiguousarray(np.stack([self.__slab(t) for t in times]))
+
+            # Only the slabs of the window and the prefetched slab are kept
+            for t in list(self.slabs):
+                if not it <= t <= it + 2:
+                    del self.slabs[t]
+            for t in list(self.means):
+                if not it <= t <= it + 2:
+                    del self.means[t]
+            self.__prefetch(it + 2)
+
+        # Offsets in the flattened array of the 16 grid points around a position
+        # (lower/upper time, pressure, latitude and longitude)
+        shape = np.array(self.wind.shape[:4])
+        stride = np.append(np.cumprod(shape[:0:-1])[::-1], 1) * (shape > 1)
+        self.corners = np.array(np.meshgrid(*[(0, s) for s in stride], indexing='ij')).sum(axis=0).ravel()
+
     def getdata(self, userlat, userlon, useralt):
         """
         Retrieve the north and south component of the windfield, interpolated at a given positions.
@@ -163,13 +391,11 @@ class WindIris:
         """
 
         if self.filename:
-            # TODO: find a faster alternative to date2num
 
-            if self.ensemble_loaded:
+            if self.ensemble_loaded and self.readslab is not None:
 
                 pressure = vatmos(useralt)[0]
-                time = date2num(bs.sim.utc, units='hours since 1900-01-01 00:00:0.0', calendar='gregorian')
-                return self.__interpolate(userlat, userlon, pressure, time)
+                return self.__interpolate(userlat, userlon, pressure, self.__time_index())
 
             else:
                 return 0,0
@@ -177,41 +403,69 @@ class WindIris:
         else:
             return 0, 0
 
-
-    def __interpolate(self, lat, lon, pressure, time):
+    def __time_index(self):
+        """
+        Index of the current simulation time in the interpolation array of
+        the two forecast times around it. The index is only recalculated when
+        the simulation time has changed, and the forecast times in the
+        interpolation array are moved along with the simulation time.
+        """
+        if self.time_utc != bs.sim.utc:
+            self.time_utc = bs.sim.utc
+            # Time in hours since 1900-01-01 00:00:0.0, as in the netCDF files
+            time = (self.time_utc - datetime(1900, 1, 1)).total_seconds() / 3600.0
+            if not self.forecasts_time[0] <= time <= self.forecasts_time[-1]:
+                raise ValueError("Simulation time is outside of the wind forecast times.")
+            self.time_i = np.interp(time, self.forecasts_time,
+                                    np.arange(len(self.forecasts_time)))
+            it = min(int(self.time_i), max(len(self.forecasts_time) - 2, 0))
+            if it != self.window:
+                self.__set_window(it)
+            self.time_w = self.time_i - it
+
+        return self.time_w
+
+    def __interpolate(self, lat, lon, pressure, time_i):
 
         # BlueSky longitude definition: an angular measurement ranging from 0° at the Prime Meridian to +180°
         #  eastward and −180° westward / ECMFW longitude definition: an angular measurement ranging from 0° at
         # the Prime Meridian to +359.5° eastward
 
-        lon = (lon + 360) % 360 # Make longitude periodic for interpolation
+        lon = (np.atleast_1d(lon) + 360) % 360 # Make longitude periodic for interpolation
 
         # Find coordinates array index which are used to find, for each point in the output time,pressure,lat,lon
         #  the corresponding coordinates in the input. The value of the input at those coordinates is determined by
-        # spline interpolation of the first order
+        # linear interpolation between the surrounding grid points
 
         lon_i = lon / self.grid_lon_spacing         # longitude index in wind array
-        lat_i = (90. - lat) / self.grid_lat_spacing  # latitude index in wind array
-
+        lat_i = (90. - np.atleast_1d(lat)) / self.grid_lat_spacing  # latitude index in wind array
 
         # If pressure is outside of forecast range pick the minimum or maximum
-
         pressure = np.clip(pressure, self.pressure[0], self.pressure[-1])
-        pressure_to_index = interpolate.interp1d(self.pressure, range(len(self.pressure)),
-                                 bounds_error=True, assume_sorted=True)
-        pressure_i = pressure_to_index(pressure)         # pressure index
-
-
-        time_to_index = interpolate.interp1d(self.forecasts_time, range(len(self.forecasts_time)),
-                                 bounds_error=True, assume_sorted=True)
-        time_i = time_to_index(time)         # time index
-
-
-        coord = np.vstack((time_i, pressure_i, lat_i, lon_i))
-
-        # Interpolation
-        north = ndimage.map_coordinates(self.north, coord, order=1, mode='wrap')
-        east = ndimage.map_coordinates(self.east, coord, order=1, mode='wrap')
+        pressure_i = np.interp(pressure, self.pressure, np.arange(len(self.pressure)))  # pressure index
+        lat_i, lon_i, pressure_i = np.broadcast_arrays(lat_i, lon_i, pressure_i)
+
+        # Lower grid index and weight of the upper grid point along each axis.
+        # Longitude is periodic, the other axes are limited to the grid
+        ntime, npres, nlat, nlon = self.wind.shape[:4]
+        it, wt = gridindex(time_i, ntime)
+        ip, wp = gridindex(pressure_i, npres)
+        ilat, wlat = gridindex(lat_i, nlat)
+        ilon = np.floor(lon_i).astype(int)
+        wlon = lon_i - ilon
+        ilon %= nlon - 1
+
+        # Flat index and weight of the 16 surrounding grid points
+        idx = ((it * npres + ip) * nlat + ilat) * nlon + ilon
+        idx = self.corners[:, np.newaxis] + idx
+        weight = np.array((1.0 - wt, wt))[:, None, None, None, None] * \
+            np.array((1.0 - wp, wp))[None, :, None, None] * \
+            np.array((1.0 - wlat, wlat))[None, None, :, None] * \
+            np.array((1.0 - wlon, wlon))[None, None, None, :]
+
+        # Interpolate both components in one pass
+        wind = np.take(self.wind.reshape(-1, 2), idx, axis=0)
+        north, east = np.einsum('cn,cnk->kn', weight.reshape(16, -1).astype(wind.dtype), wind)
 
         return north, east
 
@@ -247,5 +501,30 @@ class WindIris:
         pass
 
     def clear(self):
-        # not used
-        pass
\ No newline at end of file
+        # Called at a traffic reset: only wait for the running prefetches
+        self.close()
+
+
+def gridindex(x, n):
+    """
+    Lower grid index and interpolation weight of the upper grid point of
+    (fractional) index x on an axis with n grid points.
+    """
+    x = np.clip(x, 0.0, n - 1.0)
+    i = np.minimum(np.floor(x).astype(int), max(n - 2, 0))
+    return i, x - i
+
+
+def cubeslab(cube, t, member=None):
+    """
+    Cube with the data of forecast time index t (and ensemble member index
+    member) of cube. The data of the returned cube is only read from file
+    when it is accessed.
+    """
+    index = [slice(None)] * cube.ndim
+    for dim in cube.coord_dims('time'):
+        index[dim] = t
+    if member is not None:
+        for dim in cube.coord_dims('ensemble_member'):
+            index[dim] = member
+    return cube[tuple(index)]
@@ -0,0 +1,119 @@
+''' Vectorised construction of the aircraft label texts of the radar screen.
+
+    Labels consist of 3 lines of 8 characters per aircraft:
+        ACID
+        ALT  ARROW  (altitude or flight level, and vertical speed arrow)
+        CAS
+    Labels are built for all aircraft at once, as rows of a (n, 24) array of
+    bytes. The previous labels are kept, so that only the rows that changed
+    need to be sent to the GPU. '''
+import numpy as np
+from bluesky.tools.aero import ft, kts
+
+# Number of characters per label
+LBLSIZE = 24
+
+SPACE, MINUS, ZERO = ord(' '), ord('-'), ord('0')
+
+# Characters of the vertical speed arrows in the font texture
+VSUP, VSDOWN, VSLEVEL = 30, 31, 32
+
+
+def textfield(strings, width):
+    ''' Left-aligned, space-padded fixed-width fields of (ascii) strings.
+        Strings that are longer than width are truncated. '''
+    chars = np.array(strings, dtype='S{}'.format(width)).view(np.uint8)
+    chars = chars.reshape(-1, width).copy()
+    chars[chars == 0] = SPACE
+    return chars
+
+
+def intfield(values, width):
+    ''' Left-aligned fixed-width fields of integers (like '%-<width>d').
+        Values are truncated to integers, and clipped to values that fit. '''
+    values = np.clip(np.trunc(values), 1 - 10 ** (width - 1), 10 ** width - 1)
+    values = values.astype(np.int64)
+    neg = values < 0
+    mag = np.abs(values)
+    ndigits = np.ones(len(values), dtype=np.int64)
+    for exponent in range(1, width):
+        ndigits += mag >= 10 ** exponent
+
+    # Exponent of the digit in each column, after the minus sign
+    exponent = ndigits[:, np.newaxis] - 1 + neg[:, np.newaxis] - np.arange(width)
+    valid = exponent >= 0
+    exponent[~valid] = 0
+    digits = mag[:, np.newaxis] // 10 ** exponent % 10 + ZERO
+    field = np.where(valid, digits, SPACE).astype(np.uint8)
+    field[neg, 0] = MINUS
+    return field
+
+
+def zerofield(values, width):
+    ''' Zero-padded fixed-width fields of positive integers (like '%0<width>d').
+        Values are truncated to integers, and clipped to values that fit. '''
+    values = np.clip(np.trunc(values), 0, 10 ** width - 1).astype(np.int64)
+    pow10 = 10 ** np.arange(width - 1, -1, -1, dtype=np.int64)
+    return (values[:, np.newaxis] // pow10 % 10 + ZERO).astype(np.uint8)
+
+
+def dirtyranges(dirty, maxranges):
+    ''' Merge the rows that are marked dirty into at most maxranges
+        (start, stop) ranges. The smallest gaps between runs of dirty rows
+        are merged first. '''
+    idx = np.flatnonzero(dirty)
+    if len(idx) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(idx) > 1)
+    starts = np.append(idx[0], idx[breaks + 1])
+    stops = np.append(idx[breaks] + 1, idx[-1] + 1)
+    if len(starts) > maxranges:
+        gaps = starts[1:] - stops[:-1]
+        # Keep the largest gaps as breaks between the ranges
+        keep = np.sort(np.argsort(gaps, kind='stable')[len(gaps) - maxranges + 1:])
+        starts = np.append(starts[0], starts[1:][keep])
+        stops = np.append(stops[:-1][keep], stops[-1])
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+class ACLabels:
+    ''' Label texts of the aircraft, with the rows that changed since the
+        previous update.
+        Arguments:
+        - maxranges: maximum number of separate row ranges per update '''
+    def __init__(self, maxranges=16):
+        self.maxranges = maxranges
+        self.ids = []
+        self.idfield = textfield([], 8)
+        self.labels = np.zeros((0, LBLSIZE), dtype=np.uint8)
+
+    def reset(self):
+        ''' Forget the previous labels: the next update changes all rows. '''
+        self.labels = np.zeros((0, LBLSIZE), dtype=np.uint8)
+
+    def update(self, ids, alt, cas, vs, translvl, show_lbl=2):
+        ''' Make the labels of all aircraft.
+            Returns the (start, stop) row ranges that changed. '''
+        # The ids only change when aircraft are created or deleted
+        if ids is not self.ids and list(ids) != list(self.ids):
+            self.idfield = textfield(ids, 8)
+        self.ids = ids
+
+        labels = np.full((len(self.idfield), LBLSIZE), SPACE, dtype=np.uint8)
+        labels[:, :8] = self.idfield
+        if show_lbl == 2:
+            alt = np.asarray(alt)
+            vs = np.asarray(vs)
+            below = alt <= translvl
+            labels[below, 8:13] = intfield(alt[below] / ft + 0.5, 5)
+            labels[~below, 8:10] = np.frombuffer(b'FL', dtype=np.uint8)
+            labels[~below, 10:13] = zerofield(alt[~below] / ft / 100.0 + 0.5, 3)
+            labels[:, 13] = np.where(vs > 0.25, VSUP, np.where(vs < -0.25, VSDOWN, VSLEVEL))
+            labels[:, 16:] = intfield(np.asarray(cas) / kts + 0.5, 8)
+
+        if labels.shape != self.labels.shape:
+            changed = [(0, len(labels))] if len(labels) else []
+        else:
+            changed = dirtyranges(np.any(labels != self.labels, axis=1), self.maxranges)
+        self.labels = labels
+        return changed
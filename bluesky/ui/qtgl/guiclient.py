@@ -5,12 +5,13 @@ import numpy as np
 from bluesky.ui import palette
 from bluesky.ui.polytools import PolygonSet
 from bluesky.network import Client
+from bluesky.network.acdata import ACDataDecoder, ALL_FIELDS
 from bluesky.tools import Signal
 from bluesky.tools.aero import ft
 
 # Globals
-UPDATE_ALL = ['SHAPE', 'TRAILS', 'CUSTWPT', 'PANZOOM', 'ECHOTEXT']
-ACTNODE_TOPICS = [b'ACDATA', b'PLOT*', b'ROUTEDATA*']
+UPDATE_ALL = ['SHAPE', 'TRAILS', 'CUSTWPT', 'PANZOOM', 'ECHOTEXT', 'ACDATA']
+ACTNODE_TOPICS = [b'PLOT*', b'ROUTEDATA*']
 
 
 class GuiClient(Client):
@@ -27,6 +28,11 @@ class GuiClient(Client):
         self.subscribe(b'PLOT' + self.client_id)
         self.subscribe(b'ROUTEDATA' + self.client_id)
 
+        # Aircraft data is culled to the region of interest of this client,
+        # which is derived from its pan/zoom state by the active node
+        self.subscribe(b'ROIDATA' + self.client_id)
+        self.roinode = None
+
         # Signals
         self.actnodedata_changed = Signal()
 
@@ -74,7 +80,27 @@ class GuiClient(Client):
         if sender_id == self.act and data_changed:
             self.actnodedata_changed.emit(sender_id, sender_data, data_changed)
 
+    def stream(self, name, data, sender_id):
+        if name == b'ROIDATA' + self.client_id:
+            if sender_id != self.act:
+                return
+            name = b'ACDATA'
+        if name == b'ACDATA':
+            # Complete the aircraft data with the fields that are only sent
+            # when they change
+            data = self.get_nodedata(sender_id).acdecoder.decode(data)
+            if data is None:
+                return
+        super(GuiClient, self).stream(name, data, sender_id)
+
     def actnode_changed(self, newact):
+        # Select the aircraft data fields that are shown in the gui, and
+        # only receive aircraft data of the active node
+        self.send_event(b'ACFIELDS', ALL_FIELDS)
+        if self.roinode and self.roinode != newact:
+            self.send_event(b'ACROI', False, target=self.roinode)
+        self.send_event(b'ACROI', True)
+        self.roinode = newact
         self.actnodedata_changed.emit(newact, self.get_nodedata(newact), UPDATE_ALL)
 
     def get_nodedata(self, nodeid=None):
@@ -109,6 +135,9 @@ class nodeData(object):
         # Network route to this node
         self._route = route
 
+        # Static fields of the aircraft data stream
+        self.acdecoder = ACDataDecoder()
+
     def clear_scen_data(self):
         # Clear all scenario-specific data for sender node
         self.polys = dict()
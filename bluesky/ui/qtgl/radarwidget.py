@@ -9,6 +9,7 @@ import bluesky as bs
 from bluesky import settings
 from bluesky.ui import palette
 from bluesky.ui.radarclick import radarclick
+from bluesky.ui.aclabels import ACLabels, LBLSIZE
 from bluesky.ui.qtgl import console
 from bluesky.ui.qtgl.customevents import ACDataEvent, RouteDataEvent
 from bluesky.tools.aero import ft, nm, kts
@@ -176,6 +177,11 @@ class RadarWidget(QGLWidget):
                 self.allpolys.set_vertex_count(0)
                 self.allpfill.set_vertex_count(0)
 
+        # Aircraft data of another node, or after a reset: the labels on the
+        # GPU are no longer those of the previous update, so send all rows
+        if 'ACDATA' in changed_elems:
+            self.aclbltext.reset()
+
         # Trail data change
         if 'TRAILS' in changed_elems:
             if len(nodedata.traillat0):
@@ -230,7 +236,8 @@ class RadarWidget(QGLWidget):
         self.acaltbuf = GLBuffer(MAX_NAIRCRAFT * 4, usage=gl.GL_STREAM_DRAW)
         self.actasbuf = GLBuffer(MAX_NAIRCRAFT * 4, usage=gl.GL_STREAM_DRAW)
         self.accolorbuf = GLBuffer(MAX_NAIRCRAFT * 4, usage=gl.GL_STREAM_DRAW)
-        self.aclblbuf = GLBuffer(MAX_NAIRCRAFT * 24, usage=gl.GL_STREAM_DRAW)
+        self.aclblbuf = GLBuffer(MAX_NAIRCRAFT * LBLSIZE, usage=gl.GL_STREAM_DRAW)
+        self.aclbltext = ACLabels()
         self.confcpabuf = GLBuffer(MAX_NCONFLICTS * 16, usage=gl.GL_STREAM_DRAW)
         self.asasnbuf = GLBuffer(MAX_NAIRCRAFT * 4, usage=gl.GL_STREAM_DRAW)
         self.asasebuf = GLBuffer(MAX_NAIRCRAFT * 4, usage=gl.GL_STREAM_DRAW)
@@ -578,6 +585,12 @@ class RadarWidget(QGLWidget):
 
     def on_simstream_received(self, streamname, data, sender_id):
         if streamname == b'ACDATA':
+            # Keep the region of interest in the simulation up to date while
+            # panning and zooming, as the aircraft data is culled to it
+            if self.panzoomchanged:
+                self.panzoomchanged = False
+                bs.net.send_event(b'PANZOOM', dict(pan=(self.panlat, self.panlon),
+                                               zoom=self.zoom, ar=self.ar, absolute=True))
             self.acdata = ACDataEvent(data)
             self.update_aircraft_data(self.acdata)
         elif streamname[:9] == b'ROUTEDATA':
@@ -643,13 +656,11 @@ class RadarWidget(QGLWidget):
         self.makeCurrent()
         actdata = bs.net.get_nodedata()
         if actdata.filteralt:
-            idx = np.where((data.alt >= actdata.filteralt[0]) * (data.alt <= actdata.filteralt[1]))
-            data.lat = data.lat[idx]
-            data.lon = data.lon[idx]
-            data.trk = data.trk[idx]
-            data.alt = data.alt[idx]
-            data.tas = data.tas[idx]
-            data.vs  = data.vs[idx]
+            idx = np.where((data.alt >= actdata.filteralt[0]) * (data.alt <= actdata.filteralt[1]))[0]
+            for name in ('lat', 'lon', 'trk', 'alt', 'tas', 'vs', 'gs', 'cas',
+                         'tcpamax', 'asasn', 'asase', 'inconf', 'ingroup'):
+                setattr(data, name, np.asarray(getattr(data, name))[idx])
+            data.id = [data.id[i] for i in idx]
         self.naircraft = len(data.lat)
         actdata.translvl = data.translvl
         self.asas_vmin = data.vmin
@@ -658,73 +669,65 @@ class RadarWidget(QGLWidget):
             self.cpalines.set_vertex_count(0)
         else:
             # Update data in GPU buffers
-            self.aclatbuf.update(np.array(data.lat, dtype=np.float32))
-            self.aclonbuf.update(np.array(data.lon, dtype=np.float32))
-            self.achdgbuf.update(np.array(data.trk, dtype=np.float32))
-            self.acaltbuf.update(np.array(data.alt, dtype=np.float32))
-            self.actasbuf.update(np.array(data.tas, dtype=np.float32))
-            self.asasnbuf.update(np.array(data.asasn, dtype=np.float32))
-            self.asasebuf.update(np.array(data.asase, dtype=np.float32))
+            # (the aircraft data is already sent in single precision)
+            self.aclatbuf.update(np.asarray(data.lat, dtype=np.float32))
+            self.aclonbuf.update(np.asarray(data.lon, dtype=np.float32))
+            self.achdgbuf.update(np.asarray(data.trk, dtype=np.float32))
+            self.acaltbuf.update(np.asarray(data.alt, dtype=np.float32))
+            self.actasbuf.update(np.asarray(data.tas, dtype=np.float32))
+            self.asasnbuf.update(np.asarray(data.asasn, dtype=np.float32))
+            self.asasebuf.update(np.asarray(data.asase, dtype=np.float32))
+
+            nac = min(self.naircraft, MAX_NAIRCRAFT)
+            ids = data.id[:nac]
+            inconf = np.asarray(data.inconf[:nac], dtype=bool)
 
             # CPA lines to indicate conflicts
-            ncpalines = np.count_nonzero(data.inconf)
-
-            cpalines  = np.zeros(4 * ncpalines, dtype=np.float32)
+            ncpalines = np.count_nonzero(inconf)
+            lat, lon = data.lat[:nac][inconf], data.lon[:nac][inconf]
+            dist = np.asarray(data.tcpamax[:nac])[inconf] * np.asarray(data.gs[:nac])[inconf] / nm
+            lat1, lon1 = geo.qdrpos(lat, lon, data.trk[:nac][inconf], dist)
+            cpalines = np.column_stack((lat, lon, lat1, lon1)).astype(np.float32).ravel()
             self.cpalines.set_vertex_count(2 * ncpalines)
 
-            # Labels and colors
-            rawlabel = ''
-            color = np.empty((min(self.naircraft, MAX_NAIRCRAFT), 4), dtype=np.uint8)
+            # Colors: conflict color, else custom (aircraft or group) color
+            # if available, else default
+            color = np.empty((nac, 4), dtype=np.uint8)
+            color[:] = tuple(palette.aircraft) + (255,)
+            if actdata.custgrclr:
+                ingroup = np.asarray(data.ingroup[:nac])
+                # The first matching group determines the color
+                for groupmask, groupcolor in reversed(list(actdata.custgrclr.items())):
+                    color[ingroup & groupmask > 0, :3] = groupcolor
+            if actdata.custacclr:
+                for i, acid in enumerate(ids):
+                    if acid in actdata.custacclr:
+                        color[i, :3] = actdata.custacclr[acid]
+            color[inconf, :3] = palette.conflict
+
+            #  Check which aircraft are selected to show SSD
             selssd = np.zeros(self.naircraft, dtype=np.uint8)
-            confidx = 0
-
-            zdata = zip(data.id, data.ingroup, data.inconf, data.tcpamax, data.trk, data.gs,
-                        data.cas, data.vs, data.alt, data.lat, data.lon)
-            for i, (acid, ingroup, inconf, tcpa, trk, gs, cas, vs, alt, lat, lon) in enumerate(zdata):
-                if i >= MAX_NAIRCRAFT:
-                    break
-
-                # Make label: 3 lines of 8 characters per aircraft
-                if actdata.show_lbl >= 1:
-                    rawlabel += '%-8s' % acid[:8]
-                    if actdata.show_lbl == 2:
-                        if alt <= data.translvl:
-                            rawlabel += '%-5d' % int(alt / ft  + 0.5)
-                        else:
-                            rawlabel += 'FL%03d' % int(alt / ft / 100. + 0.5)
-                        vsarrow = 30 if vs > 0.25 else 31 if vs < -0.25 else 32
-                        rawlabel += '%1s  %-8d' % (chr(vsarrow), int(cas / kts + 0.5))
-                    else:
-                        rawlabel += 16 * ' '
-
-                if inconf:
-                    if actdata.ssd_conflicts:
-                        selssd[i] = 255
-                    color[i, :] = palette.conflict + (255,)
-                    lat1, lon1 = geo.qdrpos(lat, lon, trk, tcpa * gs / nm)
-                    cpalines[4 * confidx : 4 * confidx + 4] = [lat, lon, lat1, lon1]
-                    confidx += 1
-                else:
-                    # Get custom color if available, else default
-                    rgb = palette.aircraft
-                    if ingroup:
-                        for groupmask, groupcolor in actdata.custgrclr.items():
-                            if ingroup & groupmask:
-                                rgb = groupcolor
-                                break
-                    rgb = actdata.custacclr.get(acid, rgb)
-                    color[i, :] = tuple(rgb) + (255,)
-
-                #  Check if aircraft is selected to show SSD
-                if actdata.ssd_all or acid in actdata.ssd_ownship:
-                    selssd[i] = 255
+            if actdata.ssd_all:
+                selssd[:] = 255
+            else:
+                if actdata.ssd_conflicts:
+                    selssd[:nac][inconf] = 255
+                if actdata.ssd_ownship:
+                    selssd[:nac][np.isin(ids, list(actdata.ssd_ownship))] = 255
 
             if len(actdata.ssd_ownship) > 0 or actdata.ssd_conflicts or actdata.ssd_all:
                 self.ssd.selssd.buf.update(selssd)
 
             self.confcpabuf.update(cpalines)
             self.accolorbuf.update(color)
-            self.aclblbuf.update(np.array(rawlabel.encode('utf8'), dtype=np.string_))
+
+            # Labels: only the rows that changed are sent to the GPU
+            if actdata.show_lbl >= 1:
+                changed = self.aclbltext.update(ids, data.alt[:nac], data.cas[:nac],
+                                                data.vs[:nac], data.translvl, actdata.show_lbl)
+                for start, stop in changed:
+                    self.aclblbuf.update(self.aclbltext.labels[start:stop],
+                                         offset=start * LBLSIZE)
 
             # If there is a visible route, update the start position
             if self.route_acid != "":
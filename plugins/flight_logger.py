@@ -17,7 +17,7 @@ class Logger:
 
     def log(self, acid, flag):
         # find if acid exists
-        if acid not in traf.id:
+        if acid not in traf.idindex:
             raise ValueError('acid not found')
 
         # Enable or disable logging for acid
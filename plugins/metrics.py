@@ -17,14 +17,14 @@ metrics = None
 class SectorData:
     def __init__(self):
         self.acid = list()
+        self.idindex = dict()
         self.lat0 = np.array([])
         self.lon0 = np.array([])
         self.dist0 = np.array([])
 
     def id2idx(self, acid):
         # Fast way of finding indices of all ACID's in a given list
-        tmp = dict((v, i) for i, v in enumerate(self.acid))
-        return [tmp.get(acidi, -1) for acidi in acid]
+        return [self.idindex.get(acidi, -1) for acidi in acid]
 
     def get(self, acid):
         idx = self.id2idx(acid)
@@ -36,12 +36,18 @@ class SectorData:
         self.lon0 = np.delete(self.lon0, idx)
         self.dist0 = np.delete(self.dist0, idx)
         for i in reversed(idx):
+            del self.idindex[self.acid[i]]
             del self.acid[i]
+        # Update the indices of the aircraft after the first deleted one
+        if len(idx):
+            first = max(idx[0], 0)
+            self.idindex.update(zip(self.acid[first:], range(first, len(self.acid))))
 
     def extend(self, acid, lat0, lon0, dist0):
         self.lat0 = np.append(self.lat0, lat0)
         self.lon0 = np.append(self.lon0, lon0)
         self.dist0 = np.append(self.dist0, dist0)
+        self.idindex.update(zip(acid, range(len(self.acid), len(self.acid) + len(acid))))
         self.acid.extend(acid)
 
 class Metrics(TrafficArrays):
@@ -107,7 +113,7 @@ class Metrics(TrafficArrays):
             left = previds - ids
 
             # Split left aircraft in deleted and not deleted
-            left_intraf = left.intersection(traf.id)
+            left_intraf = set(acid for acid in left if acid in traf.idindex)
             left_del = list(left - left_intraf)
             left_intraf = list(left_intraf)
 
@@ -134,8 +140,8 @@ class Metrics(TrafficArrays):
                 sectoreff = list((leftdist[mask] - leftdist0[mask]) / d[mask] / nm)
 
                 names = np.array(left_del + left_intraf)[mask]
-                for name, eff in zip(names, sectoreff):
-                    self.feff.write('{}, {}, {}\n'.format(sim.simt, name, eff))
+                datalog.writequeue.put(self.feff.write, str.join('', (
+                    '{}, {}, {}\n'.format(sim.simt, name, eff) for name, eff in zip(names, sectoreff))))
                 sendeff = True
                 # print('{} aircraft left sector {}, distance flown (acid:dist):'.format(len(left), sector))
                 # for a, d0, d1, e in zip(left, leftdist0, leftdist, sectoreff):
@@ -158,19 +164,20 @@ class Metrics(TrafficArrays):
             else:
                 self.sectorconv[idx] = 0
 
-            self.fconv.write('{}, {}\n'.format(sim.simt, self.sectorconv[idx]))
-            self.fsd.write('{}, {}\n'.format(sim.simt, self.sectorsd[idx]))
+            # Write from the log writer thread
+            datalog.writequeue.put(self.fconv.write, '{}, {}\n'.format(sim.simt, self.sectorconv[idx]))
+            datalog.writequeue.put(self.fsd.write, '{}, {}\n'.format(sim.simt, self.sectorsd[idx]))
         if sendeff:
             self.effplot.send()
 
 
     def reset(self):
         if self.fconv:
-            self.fconv.close()
+            datalog.writequeue.put(self.fconv.close)
         if self.fsd:
-            self.fsd.close()
+            datalog.writequeue.put(self.fsd.close)
         if self.feff:
-            self.feff.close()
+            datalog.writequeue.put(self.feff.close)
 
     def stackio(self, cmd, name):
         if cmd == 'LIST':
@@ -733,7 +733,7 @@ def randacname(orig,dest):
 
     # Make flight number or Dutch call sign for VFR traffic
     firstx =  True
-    while firstx or (acname in traf.id):
+    while firstx or (acname in traf.idindex):
         if not (company=="PH"):
             fltnr = str(int(random.random()*900+100))
         else:
@@ -105,9 +105,9 @@ class logWpt(TrafficArrays):
     def log_data(self,idx):
 
         self.logger.log(
-            np.array(traf.id)[idx],
+            [traf.id[i] for i in idx],
             traf.wind.current_ensemble,
-            np.array(traf.type)[idx],
+            [traf.type[i] for i in idx],
             traf.lat[idx],
             traf.lon[idx],
             traf.alt[idx],
@@ -123,7 +123,7 @@ class logWpt(TrafficArrays):
             pass
         else:
 
-            self.actwp_in_route_update[-1:] = [traf.ap.route[idx].iactwp for idx, st in enumerate(traf.id)]
+            self.actwp_in_route_update[-1:] = [route.iactwp for route in traf.ap.route]
             switch_wpt     = np.equal(self.actwp_in_route_preupdate,self.actwp_in_route_update)
             switch_wpt_idx = np.where(switch_wpt == False)[0]
 
@@ -134,7 +134,7 @@ class logWpt(TrafficArrays):
                 # delete all aicraft in self.delidx
 
             # Determine the last wpt number
-            self.last_wpt_in_route[-1:] = [len(traf.ap.route[idx].wplat)-1 for idx, st in enumerate(traf.id)]
+            self.last_wpt_in_route[-1:] = [len(route.wplat)-1 for route in traf.ap.route]
 
             acwpt_dest         = np.equal(self.last_wpt_in_route,self.actwp_in_route_update)
             acwpt_dest_idx     = np.where(acwpt_dest)[0]
@@ -159,7 +159,7 @@ class logWpt(TrafficArrays):
         if not self.active:
             pass
         else:
-            self.actwp_in_route_preupdate[-1:] = [traf.ap.route[idx].iactwp for idx, st in enumerate(traf.id)]
+            self.actwp_in_route_preupdate[-1:] = [route.iactwp for route in traf.ap.route]
 
     def reset(self):
         pass
@@ -179,8 +179,7 @@ class logWpt(TrafficArrays):
                 self.logger.start()
 
                 # Log the initial state of all the aircraft in the simulation
-                traffic_id = [idx for idx, st in enumerate(traf.id)]
-                self.log_data(traffic_id)
+                self.log_data(list(range(traf.ntraf)))
 
                 self.active = True
                 return True, "WPTLOG logging is : {}".format(self.active)
@@ -63,7 +63,7 @@ setup(
         ],
     },
 
-    scripts=['BlueSky_pygame.py'],
+    scripts=['BlueSky_pygame.py', 'BlueSky_batch.py'],
 
     project_urls={
         'Source': 'https://github.com/ProfHoekstra/bluesky',
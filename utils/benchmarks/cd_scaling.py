@@ -0,0 +1,68 @@
+""" Benchmark of the scaling of the ASAS conflict detection methods with the
+    number of aircraft.
+
+    Usage (from the BlueSky root folder):
+        python -m utils.benchmarks.cd_scaling [ntraf ntraf ...]
+
+    Random traffic is distributed over a European-sized area. The full-matrix
+    STATEBASED method is only run up to MAXN_STATEBASED aircraft, because of
+    its quadratic memory use. The block-wise TILED method is run in single
+    precision up to MAXN_TILED aircraft, because of its quadratic run time. """
+import sys
+import time
+from types import SimpleNamespace
+import numpy as np
+
+from bluesky.tools.aero import nm, ft, kts, fpm
+from bluesky import settings
+from bluesky.traffic.asas import StateBasedCD, SpatialCD, TiledCD
+
+RPZ = 5.0 * nm
+HPZ = 1000.0 * ft
+TLOOKAHEAD = 300.0
+MAXN_STATEBASED = 5000
+MAXN_TILED = 10000
+NREPEAT = 3
+
+
+def random_traffic(ntraf, seed=0):
+    rng = np.random.RandomState(seed)
+    return SimpleNamespace(
+        ntraf=ntraf,
+        id=['AC%05d' % i for i in range(ntraf)],
+        lat=rng.uniform(35.0, 70.0, ntraf),
+        lon=rng.uniform(-10.0, 30.0, ntraf),
+        trk=rng.uniform(0.0, 360.0, ntraf),
+        gs=rng.uniform(150.0, 480.0, ntraf) * kts,
+        alt=rng.uniform(2000.0, 41000.0, ntraf) * ft,
+        vs=rng.choice([-2000.0, 0.0, 0.0, 0.0, 2000.0], ntraf) * fpm)
+
+
+def timeit(method, traf):
+    tbest = 1e9
+    for _ in range(NREPEAT):
+        tstart = time.perf_counter()
+        result = method.detect(traf, traf, RPZ, HPZ, TLOOKAHEAD)
+        tbest = min(tbest, time.perf_counter() - tstart)
+    return tbest, len(result[0])
+
+
+def main(sizes):
+    settings.asas_cdfloat32 = True
+    print('%8s %14s %14s %14s %10s' % ('ntraf', 'STATEBASED [s]', 'TILED [s]',
+                                       'SPATIAL [s]', 'nconf'))
+    for ntraf in sizes:
+        traf = random_traffic(ntraf)
+        tspatial, nconf = timeit(SpatialCD, traf)
+        times = []
+        for method, maxn in ((StateBasedCD, MAXN_STATEBASED), (TiledCD, MAXN_TILED)):
+            if ntraf <= maxn:
+                times.append('%14.4f' % timeit(method, traf)[0])
+            else:
+                times.append('%14s' % '-')
+        print('%8d %s %s %14.4f %10d' % (ntraf, *times, tspatial, nconf))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or
+         [500, 1000, 2000, 5000, 10000, 20000])
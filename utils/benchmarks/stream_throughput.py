@@ -0,0 +1,85 @@
+""" Benchmark of the stream throughput between a Node and a Client.
+
+    Usage (from the BlueSky root folder):
+        python -m utils.benchmarks.stream_throughput [ntraf ntraf ...]
+
+    A Node sends ACDATA-like messages (eleven float arrays of ntraf elements)
+    to a Client over a localhost tcp connection, without a server in between.
+    Reports frames/s and MB/s for the frame-based encoding, with the array
+    data in separate frames, and for the previous encoding, with the array
+    data packed in the msgpack message. """
+import sys
+import time
+import msgpack
+import numpy as np
+import zmq
+
+from bluesky.network.node import Node
+from bluesky.network.client import Client
+from bluesky.network.npcodec import encode_ndarray
+
+PORT = 11901
+DURATION = 2.0
+FIELDS = ['lat', 'lon', 'alt', 'tas', 'cas', 'gs', 'trk', 'vs',
+          'tcpamax', 'asasn', 'asase']
+
+
+class PackedNode(Node):
+    ''' Node with the previous stream encoding. '''
+    def send_stream(self, name, data):
+        self.stream_out.send_multipart([name + self.node_id, msgpack.packb(
+            data, default=encode_ndarray, use_bin_type=True)])
+
+
+class CountingClient(Client):
+    def __init__(self):
+        super(CountingClient, self).__init__()
+        self.count = 0
+        self.nbytes = 0
+
+    def stream(self, name, data, sender_id):
+        self.count += 1
+        self.nbytes += sum(v.nbytes for v in data.values() if isinstance(v, np.ndarray))
+
+
+def run(nodetype, ntraf, port):
+    node = nodetype(0, 0)
+    node.stream_out.bind('tcp://127.0.0.1:{}'.format(port))
+    client = CountingClient()
+    client.stream_in.connect('tcp://127.0.0.1:{}'.format(port))
+    client.poller.register(client.stream_in, zmq.POLLIN)
+    client.subscribe(b'ACDATA')
+    time.sleep(0.2)
+
+    rng = np.random.RandomState(0)
+    data = {name: rng.rand(ntraf) for name in FIELDS}
+    data['simt'] = 0.0
+
+    t0 = time.time()
+    while time.time() - t0 < DURATION:
+        # Like the simulation: fresh (owned) arrays for each message
+        msg = {name: value.astype(np.float32) if isinstance(value, np.ndarray)
+               else value for name, value in data.items()}
+        node.send_stream(b'ACDATA', msg)
+        while client.stream_in.poll(0):
+            client.receive()
+    while client.stream_in.poll(100):
+        client.receive()
+    dt = time.time() - t0
+    node.stream_out.close(linger=0)
+    client.stream_in.close(linger=0)
+    return client.count / dt, client.nbytes / dt * 1e-6
+
+
+def main(sizes):
+    print('{:>8} {:>14} {:>10} {:>14} {:>10}'.format(
+        'ntraf', 'frames [1/s]', '[MB/s]', 'packed [1/s]', '[MB/s]'))
+    for i, ntraf in enumerate(sizes):
+        fps, mbps = run(Node, ntraf, PORT + 2 * i)
+        pfps, pmbps = run(PackedNode, ntraf, PORT + 2 * i + 1)
+        print('{:8d} {:14.0f} {:10.1f} {:14.0f} {:10.1f}'.format(
+            ntraf, fps, mbps, pfps, pmbps))
+
+
+if __name__ == '__main__':
+    main([int(n) for n in sys.argv[1:]] or [100, 1000, 10000, 100000])
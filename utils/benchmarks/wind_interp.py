@@ -0,0 +1,99 @@
+""" Benchmark of the WindIris wind field interpolation.
+
+    Usage (from the BlueSky root folder):
+        python -m utils.benchmarks.wind_interp [ntraf ntraf ...]
+
+    Compares WindIris.getdata with the previous implementation, which
+    converted the simulation time with netCDF4.date2num, constructed
+    interp1d objects for the pressure and time index, and interpolated the
+    north and east components in two map_coordinates passes. A random wind
+    field on a global 1 degree grid is used.
+
+    The previous implementation used the wrong grid cell for positions between
+    the last longitude of the grid and 360 degrees; these positions are left
+    out of the reported maximum difference. """
+import sys
+import time
+from datetime import datetime
+from types import SimpleNamespace
+import numpy as np
+from netCDF4 import date2num
+from scipy import ndimage, interpolate
+
+import bluesky as bs
+from bluesky.tools.aero import vatmos
+from bluesky.traffic.windiris import WindIris
+
+NREPEAT = 20
+
+
+def windfield():
+    rng = np.random.RandomState(0)
+    wind = WindIris()
+    wind.filename = 'random'
+    wind.ensemble_loaded = True
+    wind.grid_lat = np.arange(90.0, -90.5, -1.0)
+    wind.grid_lon = np.arange(0.0, 360.0, 1.0)
+    wind.grid_lat_spacing = wind.grid_lon_spacing = 1.0
+    wind.pressure = np.array([10000.0, 15000.0, 20000.0, 25000.0, 30000.0,
+                              40000.0, 50000.0, 70000.0, 85000.0, 100000.0])
+    wind.forecasts_time = date2num(datetime(2018, 1, 1), units='hours since 1900-01-01 00:00:0.0',
+                                   calendar='gregorian') + np.arange(0.0, 15.0, 3.0)
+    shape = (len(wind.forecasts_time), len(wind.pressure), len(wind.grid_lat), len(wind.grid_lon))
+    # Single precision, like the wind data in the netCDF files
+    north = rng.normal(0.0, 20.0, shape).astype(np.float32)
+    east = rng.normal(0.0, 20.0, shape).astype(np.float32)
+    wind.set_wind(north, east)
+    return wind, north, east
+
+
+def reference(wind, north, east, lat, lon, alt):
+    ''' The previous implementation of WindIris.getdata. '''
+    pressure = vatmos(alt)[0]
+    simtime = date2num(bs.sim.utc, units='hours since 1900-01-01 00:00:0.0', calendar='gregorian')
+    lon = (lon + 360) % 360
+    lon_i = lon / wind.grid_lon_spacing
+    lat_i = (90. - lat) / wind.grid_lat_spacing
+    pressure = np.clip(pressure, wind.pressure[0], wind.pressure[-1])
+    pressure_to_index = interpolate.interp1d(wind.pressure, range(len(wind.pressure)),
+                                             bounds_error=True, assume_sorted=True)
+    pressure_i = pressure_to_index(pressure)
+    time_to_index = interpolate.interp1d(wind.forecasts_time, range(len(wind.forecasts_time)),
+                                         bounds_error=True, assume_sorted=True)
+    time_i = np.full(len(lat), time_to_index(simtime))
+    coord = np.vstack((time_i, pressure_i, lat_i, lon_i))
+    return ndimage.map_coordinates(north, coord, order=1, mode='wrap'), \
+        ndimage.map_coordinates(east, coord, order=1, mode='wrap')
+
+
+def timeit(fun, *args):
+    tbest = 1e9
+    for i in range(NREPEAT):
+        # A new simulation time for each call, like in the simulation loop
+        bs.sim.utc = datetime(2018, 1, 1, 4, 30, i)
+        tstart = time.perf_counter()
+        result = fun(*args)
+        tbest = min(tbest, time.perf_counter() - tstart)
+    return tbest, result
+
+
+def main(sizes):
+    bs.sim = SimpleNamespace(utc=None)
+    wind, windnorth, windeast = windfield()
+    print('%8s %14s %14s %10s %14s' % ('ntraf', 'previous [ms]', 'WindIris [ms]',
+                                       'speedup', 'max diff [m/s]'))
+    for ntraf in sizes:
+        rng = np.random.RandomState(ntraf)
+        lat = rng.uniform(-89.0, 89.0, ntraf)
+        lon = rng.uniform(-179.0, 179.0, ntraf)
+        alt = rng.uniform(0.0, 13000.0, ntraf)
+        tref, (nref, eref) = timeit(reference, wind, windnorth, windeast, lat, lon, alt)
+        tnew, (north, east) = timeit(wind.getdata, lat, lon, alt)
+        inside = (lon + 360.0) % 360.0 < wind.grid_lon[-1]
+        diff = max(np.abs(north - nref)[inside].max(), np.abs(east - eref)[inside].max())
+        print('%8d %14.3f %14.3f %10.1f %14.2e' % (ntraf, 1e3 * tref, 1e3 * tnew,
+                                                  tref / tnew, diff))
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000])